@@ -0,0 +1,418 @@
+# apiControl/cache.py
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import codec, concurrency
+
+
+class ByteLRUCache:
+    """
+    Caché LRU en proceso limitada por el tamaño en bytes de los valores serializados
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, bytes, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, expires_at: float, payload: bytes, delta: float = 0.0) -> None:
+        size = len(key) + len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, payload, delta)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+    def _remove(self, key: str) -> None:
+        expires_at, payload, delta = self._entries.pop(key)
+        self._size -= len(key) + len(payload)
+
+
+class SingleFlight:
+    """
+    Agrupa las llamadas concurrentes con la misma clave: solo la primera ejecuta la
+    función y el resto esperan y comparten su resultado (o su excepción)
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls: Dict[str, "SingleFlight._Call"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+
+        if not leader:
+            _count('coalesced')
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+_local_cache = ByteLRUCache(settings.API_CACHE_L1_MAX_BYTES)
+_flights = SingleFlight()
+# Equivalente de SingleFlight para corrutinas: {clave: tarea en curso}. Las tareas viven en
+# el loop compartido de apiControl.concurrency, así que se agrupan las llamadas de todas las
+# peticiones del proceso y no solo las de una (con WSGI cada petición tiene su propio loop)
+_async_flights: Dict[str, asyncio.Future] = {}
+_counters = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'early_refreshes': 0, 'coalesced': 0, 'uncached': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(counter: str) -> None:
+    with _counters_lock:
+        _counters[counter] += 1
+
+
+def seconds_until_market_close(now: Optional[datetime] = None) -> int:
+    """
+    Segundos hasta el próximo cierre de mercado (día laborable), momento en que
+    aparecen nuevas barras diarias
+    """
+    tz = ZoneInfo(settings.API_CACHE_MARKET_TZ)
+    now = now.astimezone(tz) if now is not None else datetime.now(tz)
+    close = now.replace(
+        hour=settings.API_CACHE_MARKET_CLOSE.hour,
+        minute=settings.API_CACHE_MARKET_CLOSE.minute,
+        second=0,
+        microsecond=0,
+    )
+    if close <= now:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return max(int((close - now).total_seconds()), 1)
+
+
+def get_ttl(action: str, field: Optional[str]) -> int:
+    ttl = settings.API_CACHE_TTLS.get(field or action, 0)
+    if ttl == 'market_close':
+        return seconds_until_market_close()
+    return ttl
+
+
+def _normalize(params: Any) -> Any:
+    """
+    Símbolos sin espacios y en mayúsculas (' voo' y 'VOO' comparten entrada)
+    """
+    if isinstance(params, str):
+        return params.strip().upper()
+    if isinstance(params, tuple):
+        return tuple(_normalize(param) for param in params)
+    return params
+
+
+def make_key(action: str, field: Optional[str], params: Any) -> str:
+    digest = hashlib.sha1(repr(_normalize(params)).encode('utf-8')).hexdigest()
+    return f"api:v1:{action}:{field or '-'}:{digest}"
+
+
+def _backend():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _should_refresh_early(entry: Tuple[float, bytes, float]) -> bool:
+    """
+    Refresco anticipado probabilístico (XFetch): cuanto más cerca de caducar y más cara
+    de calcular es la entrada, más probable es que una petición la renueve antes de tiempo,
+    de modo que las caducidades no coinciden y no hay estampida al expirar
+    """
+    expires_at, payload, delta = entry
+    beta = settings.API_CACHE_EARLY_REFRESH_BETA
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def _lookup(key: str) -> Tuple[Optional[Tuple[float, bytes, float]], Optional[str]]:
+    entry = _local_cache.get(key)
+    if entry is not None:
+        return entry, 'l1_hits'
+
+    try:
+        entry = _backend().get(key)
+    except Exception as e:
+        print(f"[API] Error leyendo la caché compartida: {e}")
+        entry = None
+    # Las entradas escritas con otra versión del formato se tratan como fallos de caché
+    if entry is not None and entry[0] > time.time() and codec.is_current(entry[1]):
+        _local_cache.set(key, *entry)
+        return entry, 'l2_hits'
+    return None, None
+
+
+def _wait_for_other_worker(key: str) -> Optional[Tuple[float, bytes, float]]:
+    """
+    Si otro proceso ya está calculando la clave, espera a que publique el resultado
+    en la caché compartida (como mucho API_CACHE_LEASE_SECONDS)
+    """
+    deadline = time.monotonic() + settings.API_CACHE_LEASE_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        try:
+            entry = _backend().get(key)
+        except Exception:
+            return None
+        if entry is not None and entry[0] > time.time() and codec.is_current(entry[1]):
+            return entry
+    return None
+
+
+def _store(key: str, ttl: int, value: Any, delta: float) -> Optional[bytes]:
+    """
+    Guarda el valor en ambos niveles junto con lo que costó calcularlo (para XFetch).
+    Los resultados vacíos (None, lista o diccionario vacíos) se devuelven sin guardarse.
+    """
+    if value is None:
+        return None
+    payload = codec.dumps(value)
+    if isinstance(value, (list, tuple, dict)) and not value:
+        return payload
+    entry = (time.time() + ttl, payload, delta)
+    _local_cache.set(key, *entry)
+    try:
+        _backend().set(key, entry, timeout=ttl)
+    except Exception as e:
+        print(f"[API] Error escribiendo la caché compartida: {e}")
+    return payload
+
+
+def _compute_and_store(key: str, ttl: int, compute: Callable[[], Any],
+                       current: Optional[Tuple[float, bytes, float]]) -> Optional[bytes]:
+    lease_key = f"{key}:lease"
+    backend = _backend()
+    try:
+        leased = backend.add(lease_key, True, timeout=settings.API_CACHE_LEASE_SECONDS)
+    except Exception:
+        leased = True
+    if not leased:
+        # Otro worker ya está renovando la entrada: si aún es válida se sirve la actual
+        if current is not None:
+            return current[1]
+        entry = _wait_for_other_worker(key)
+        if entry is not None:
+            _local_cache.set(key, *entry)
+            return entry[1]
+
+    try:
+        started = time.monotonic()
+        value = compute()
+        return _store(key, ttl, value, time.monotonic() - started)
+    finally:
+        if leased:
+            try:
+                backend.delete(lease_key)
+            except Exception:
+                pass
+
+
+def cached_call(action: str, field: Optional[str], params: Any, compute: Callable[[], Any]) -> Any:
+    """
+    Devuelve el resultado de 'compute' pasando antes por la caché en proceso (nivel 1)
+    y por la caché compartida de Django (nivel 2). Las llamadas concurrentes con la misma
+    clave comparten una única llamada al proveedor. Los resultados vacíos no se guardan.
+    """
+    ttl = get_ttl(action, field)
+    if ttl <= 0:
+        _count('uncached')
+        return compute()
+
+    key = make_key(action, field, params)
+    entry, tier = _lookup(key)
+    refreshing = entry is not None and _should_refresh_early(entry)
+    if entry is not None and not refreshing:
+        _count(tier)
+        return codec.loads(entry[1])
+    _count('early_refreshes' if refreshing else 'misses')
+
+    payload = _flights.do(key, lambda: _compute_and_store(key, ttl, compute, entry))
+    return codec.loads(payload) if payload is not None else None
+
+
+def _fetch_batch(action: str, field: Optional[str], ttl: int, params_list: List[Any],
+                 compute_many: Callable[[List[Any]], Dict[Any, Any]]) -> Dict[Any, Any]:
+    """
+    Pide los parámetros a 'compute_many' y guarda cada resultado en su entrada. Las
+    llamadas concurrentes con el mismo conjunto de parámetros comparten una sola petición.
+    """
+    unique = list(dict.fromkeys(params_list))
+    group = tuple(sorted(unique, key=repr))
+
+    def fetch() -> Dict[Any, bytes]:
+        started = time.monotonic()
+        fetched = compute_many(unique) or {}
+        delta = (time.monotonic() - started) / len(unique)
+        payloads = {}
+        for params, value in fetched.items():
+            payload = _store(make_key(action, field, params), ttl, value, delta)
+            if payload is not None:
+                payloads[params] = payload
+        return payloads
+
+    payloads = _flights.do(make_key(f"{action}-batch", field, group), fetch)
+    return {params: codec.loads(payload) for params, payload in payloads.items()}
+
+
+def _refresh_batch(action: str, field: Optional[str], ttl: int, params_list: List[Any],
+                   compute_many: Callable[[List[Any]], Dict[Any, Any]]) -> None:
+    try:
+        _fetch_batch(action, field, ttl, params_list, compute_many)
+    except Exception as e:
+        print(f"[API] Error en el refresco anticipado del lote: {e}")
+
+
+def cached_batch_call(action: str, field: Optional[str], params_list: List[Any],
+                      compute_many: Callable[[List[Any]], Dict[Any, Any]]) -> Dict[Any, Any]:
+    """
+    Variante por lotes de cached_call: cada parámetro se guarda en la misma entrada que
+    usaría cached_call (así lo ya cacheado por un camino sirve al otro) y solo los que
+    faltan se piden, todos juntos, a 'compute_many' ({parámetro: resultado con el mismo
+    formato que la llamada individual}), agrupando las peticiones concurrentes.
+    Las entradas que XFetch marca para refresco anticipado se sirven tal cual y se
+    renuevan en segundo plano, en una sola petición para todas.
+    """
+    ttl = get_ttl(action, field)
+    if ttl <= 0:
+        _count('uncached')
+        return compute_many(list(params_list))
+
+    results: Dict[Any, Any] = {}
+    missing = []
+    refreshing = []
+    for params in params_list:
+        entry, tier = _lookup(make_key(action, field, params))
+        if entry is None:
+            _count('misses')
+            missing.append(params)
+            continue
+        results[params] = codec.loads(entry[1])
+        if _should_refresh_early(entry):
+            _count('early_refreshes')
+            refreshing.append(params)
+        else:
+            _count(tier)
+
+    if missing:
+        results.update(_fetch_batch(action, field, ttl, missing, compute_many))
+    if refreshing:
+        concurrency.submit(lambda: _refresh_batch(action, field, ttl, refreshing, compute_many))
+    return results
+
+
+async def _acompute_and_store(key: str, ttl: int, compute: Callable[[], Awaitable[Any]]) -> Optional[bytes]:
+    started = time.monotonic()
+    value = await compute()
+    delta = time.monotonic() - started
+    return await concurrency.arun(_store, key, ttl, value, delta)
+
+
+async def _join_flight(key: str, ttl: int, compute: Callable[[], Awaitable[Any]]) -> Optional[bytes]:
+    """
+    Se une a la llamada en curso con la misma clave o la lanza (siempre en el loop compartido)
+    """
+    task = _async_flights.get(key)
+    if task is None:
+        task = _async_flights[key] = asyncio.ensure_future(_acompute_and_store(key, ttl, compute))
+        task.add_done_callback(lambda _: _async_flights.pop(key, None))
+    else:
+        _count('coalesced')
+    # Si quien espera se cancela, la llamada sigue para el resto
+    return await asyncio.shield(task)
+
+
+async def acached_call(action: str, field: Optional[str], params: Any,
+                       compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Versión asíncrona de cached_call: las lecturas y escrituras en la caché compartida
+    se hacen en el pool y las corrutinas concurrentes con la misma clave comparten una
+    única llamada al proveedor, aunque vengan de peticiones con loops distintos
+    """
+    ttl = get_ttl(action, field)
+    if ttl <= 0:
+        _count('uncached')
+        return await compute()
+
+    key = make_key(action, field, params)
+    entry, tier = await concurrency.arun(_lookup, key)
+    refreshing = entry is not None and _should_refresh_early(entry)
+    if entry is not None and not refreshing:
+        _count(tier)
+        return codec.loads(entry[1])
+    _count('early_refreshes' if refreshing else 'misses')
+
+    payload = await concurrency.run_shared(_join_flight(key, ttl, compute))
+    return codec.loads(payload) if payload is not None else None
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _counters_lock:
+        counters = dict(_counters)
+    lookups = counters['l1_hits'] + counters['l2_hits'] + counters['misses']
+    counters['hit_ratio'] = (counters['l1_hits'] + counters['l2_hits']) / lookups if lookups else None
+    counters['l1'] = _local_cache.stats()
+    return counters
+
+
+def clear() -> None:
+    """
+    Vacía ambos niveles de caché y reinicia los contadores
+    """
+    _local_cache.clear()
+    _backend().clear()
+    with _counters_lock:
+        for counter in _counters:
+            _counters[counter] = 0
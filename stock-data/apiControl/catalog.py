@@ -0,0 +1,182 @@
+# apiControl/catalog.py
+import re
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import DatabaseError, connection
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import Fund
+
+# Campos que se actualizan cuando un símbolo ya está en el catálogo
+_SYNC_FIELDS = ['name', 'type', 'country', 'currency', 'isin', 'updated_at']
+_WORD_RE = re.compile(r"\w+")
+_trigram_available: Optional[bool] = None
+
+
+def _key(symbol: str) -> str:
+    return (symbol or '').strip().upper()
+
+
+def _exchange_rank(exchange: str) -> int:
+    preferred = [e.upper() for e in settings.SEARCH_PREFERRED_EXCHANGES]
+    exchange = (exchange or '').upper()
+    return preferred.index(exchange) if exchange in preferred else len(preferred)
+
+
+def resolve(symbol: str) -> Optional[Fund]:
+    """
+    Busca el símbolo en el catálogo local (si cotiza en varias bolsas, la preferida).
+    Devuelve None si no está o si el catálogo no está disponible.
+    """
+    key = _key(symbol)
+    if not key:
+        return None
+    try:
+        matches = list(Fund.objects.filter(symbol=key))
+    except DatabaseError as e:
+        print(f"[API] Catálogo no disponible: {e}")
+        return None
+    if not matches:
+        return None
+    return min(matches, key=lambda fund: _exchange_rank(fund.exchange))
+
+
+def resolve_many(symbols: Iterable[str]) -> Dict[str, Fund]:
+    """
+    resolve para varios símbolos con una sola consulta ({símbolo: Fund}, solo los encontrados)
+    """
+    keys = {_key(symbol) for symbol in symbols} - {''}
+    if not keys:
+        return {}
+    try:
+        matches = list(Fund.objects.filter(symbol__in=keys))
+    except DatabaseError as e:
+        print(f"[API] Catálogo no disponible: {e}")
+        return {}
+    resolved: Dict[str, Fund] = {}
+    for fund in sorted(matches, key=lambda fund: _exchange_rank(fund.exchange)):
+        resolved.setdefault(fund.symbol, fund)
+    return resolved
+
+
+def to_search_result(fund: Fund, score: float = 0) -> Dict[str, Any]:
+    """
+    Mismo formato que los resultados básicos de EODHD (EODHDService._formatSearchResults)
+    """
+    return {
+        'symbol': fund.symbol,
+        'shortname': fund.name,
+        'longname': fund.name,
+        'exchange': fund.exchange,
+        'type': fund.type,
+        'score': score,
+    }
+
+
+def trigram_available() -> bool:
+    """
+    True si la extensión pg_trgm está instalada (se comprueba una vez por proceso)
+    """
+    global _trigram_available
+    if _trigram_available is None:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigram_available = cursor.fetchone() is not None
+        except DatabaseError:
+            return False
+    return _trigram_available
+
+
+def _ts_query(query: str) -> Optional[SearchQuery]:
+    # Cada palabra como prefijo ('vang tot' -> 'vang:* & tot:*') para que funcione al escribir
+    words = _WORD_RE.findall(query.lower())
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f"{word}:*" for word in words), search_type='raw', config='simple')
+
+
+def search(query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Búsqueda por nombre en el catálogo local con el índice de texto completo (nombre,
+    categoría y bolsa, ordenado por relevancia) y, si pg_trgm está disponible, también
+    por similitud de trigramas para tolerar erratas
+    """
+    query = (query or '').strip()
+    ts_query = _ts_query(query)
+    if ts_query is None:
+        return []
+    limit = limit or settings.CATALOG_SEARCH_LIMIT
+
+    try:
+        funds = Fund.objects.annotate(rank=SearchRank(F('search_vector'), ts_query))
+        matches = Q(search_vector=ts_query) | Q(symbol=_key(query))
+        if trigram_available():
+            funds = funds.annotate(similarity=TrigramWordSimilarity(query, 'name'))
+            matches |= Q(name__trigram_word_similar=query)
+            order = (F('rank') + F('similarity')).desc()
+        else:
+            order = F('rank').desc()
+        funds = list(funds.filter(matches).order_by(order, 'symbol')[:limit])
+    except DatabaseError as e:
+        print(f"[API] Catálogo no disponible: {e}")
+        return []
+
+    results = []
+    for fund in funds:
+        # El símbolo exacto siempre por delante
+        score = fund.rank + getattr(fund, 'similarity', 0) + (1 if fund.symbol == _key(query) else 0)
+        results.append(to_search_result(fund, round(score, 4)))
+    return sorted(results, key=lambda r: -r['score'])
+
+
+def upsert(exchange: str, rows: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+    """
+    Inserta o actualiza en bloque los símbolos de una bolsa a partir del listado de EODHD
+    """
+    now = timezone.now()
+    funds = {}
+    for row in rows:
+        symbol = _key(row.get('Code'))
+        if not symbol or len(symbol) > 20:
+            continue
+        funds[symbol] = Fund(
+            symbol=symbol,
+            exchange=exchange.upper(),
+            name=(row.get('Name') or '')[:200],
+            type=(row.get('Type') or '')[:50],
+            country=(row.get('Country') or '')[:50],
+            currency=(row.get('Currency') or '')[:10],
+            isin=(row.get('Isin') or '')[:12],
+            updated_at=now,
+        )
+    Fund.objects.bulk_create(
+        funds.values(),
+        batch_size=batch_size or settings.CATALOG_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['symbol', 'exchange'],
+        update_fields=_SYNC_FIELDS,
+    )
+    return len(funds)
+
+
+def prune(exchange: str, synced_at) -> int:
+    """
+    Borra los símbolos de la bolsa que no aparecieron en la sincronización empezada en
+    'synced_at' (upsert renueva updated_at de todos los que sí venían en el listado), para
+    que los que dejan de cotizar no sigan dándose por válidos. Devuelve cuántos se borran.
+    """
+    deleted, _ = Fund.objects.filter(exchange=exchange.upper(), updated_at__lt=synced_at).delete()
+    return deleted
+
+
+def is_stale(exchange: str) -> bool:
+    """
+    True si la bolsa no se ha sincronizado nunca o hace más de CATALOG_REFRESH_SECONDS
+    """
+    last = Fund.objects.filter(exchange=exchange.upper()).aggregate(last=Max('updated_at'))['last']
+    return last is None or timezone.now() - last > timedelta(seconds=settings.CATALOG_REFRESH_SECONDS)
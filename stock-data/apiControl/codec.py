@@ -0,0 +1,277 @@
+# apiControl/codec.py
+import pickle
+import struct
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .history import HistorySeries
+
+# Cabecera común: firma, versión del formato y tipo de contenido
+MAGIC = b'SDC'
+VERSION = 1
+KIND_SERIES = b'S'    # HistorySeries como buffers de numpy
+KIND_PACKED = b'M'    # Valores básicos (dicts, listas, números...) en formato msgpack
+KIND_PICKLE = b'P'    # Cualquier otro objeto
+_HEADER = len(MAGIC) + 2
+
+# Columnas opcionales de la serie, en el orden en que se escriben tras dates y close
+_SERIES_COLUMNS = ('open', 'high', 'low', 'volume')
+# Máscara de columnas (1) + relleno (2) + barras (4) + relleno (4): con los 5 bytes de la
+# cabecera común los arrays empiezan en el byte 16 y quedan alineados
+_SERIES_HEAD = struct.Struct('<B2xI4x')
+
+# Tipos de extensión msgpack propios de la aplicación
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+_EXT_TIMESTAMP = 3
+_EXT_TUPLE = 4
+_EXT_SERIES = 5
+_EXT_DECIMAL = 6
+
+
+class CodecError(ValueError):
+    pass
+
+
+class _Unsupported(Exception):
+    pass
+
+
+# --- Series ---
+
+def _series_body(series: HistorySeries) -> bytes:
+    mask = 0
+    buffers = [series.dates.astype('datetime64[D]', copy=False).view('<i8'), series.close]
+    for bit, name in enumerate(_SERIES_COLUMNS):
+        values = getattr(series, name)
+        if values is not None:
+            mask |= 1 << bit
+            buffers.append(values)
+    head = _SERIES_HEAD.pack(mask, len(series))
+    return head + b''.join(np.ascontiguousarray(values).tobytes() for values in buffers)
+
+
+def _read_series(buffer: memoryview) -> HistorySeries:
+    mask, size = _SERIES_HEAD.unpack_from(buffer)
+    offset = _SERIES_HEAD.size
+    expected = offset + 8 * size * (2 + bin(mask).count('1'))
+    if len(buffer) != expected:
+        raise CodecError(f"Serie truncada: {len(buffer)} bytes, se esperaban {expected}")
+
+    def take(dtype: str) -> np.ndarray:
+        nonlocal offset
+        values = np.frombuffer(buffer, dtype=dtype, count=size, offset=offset)
+        offset += 8 * size
+        # Dentro de un dict los buffers pueden quedar desalineados: entonces se copian
+        return values if values.flags.aligned else values.copy()
+
+    dates = take('<i8').view('datetime64[D]')
+    close = take('<f8')
+    optional = {name: take('<f8') if mask & (1 << bit) else None for bit, name in enumerate(_SERIES_COLUMNS)}
+    return HistorySeries._wrap(dates, close, optional['open'], optional['high'], optional['low'], optional['volume'])
+
+
+# --- Formato msgpack (subconjunto: nil, bool, int, float64, str, bin, array, map, ext) ---
+
+def _pack_length(out: bytearray, size: int, fix: int, fix_max: int, codes: Tuple[int, int, int]) -> None:
+    if fix is not None and size <= fix_max:
+        out.append(fix | size)
+    elif size < 0x100 and codes[0] is not None:
+        out += struct.pack('>BB', codes[0], size)
+    elif size < 0x10000:
+        out += struct.pack('>BH', codes[1], size)
+    else:
+        out += struct.pack('>BI', codes[2], size)
+
+
+def _pack_ext(out: bytearray, code: int, data: bytes) -> None:
+    _pack_length(out, len(data), None, 0, (0xc7, 0xc8, 0xc9))
+    out.append(code)
+    out += data
+
+
+def _pack(value: Any, out: bytearray) -> None:
+    if value is None:
+        out.append(0xc0)
+    elif value is True:
+        out.append(0xc3)
+    elif value is False:
+        out.append(0xc2)
+    elif isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        value = int(value)
+        if 0 <= value < 0x80:
+            out.append(value)
+        elif -32 <= value < 0:
+            out.append(value & 0xff)
+        elif -(1 << 63) <= value < 0:
+            out += struct.pack('>Bq', 0xd3, value)
+        elif value < (1 << 64):
+            out += struct.pack('>BQ', 0xcf, value)
+        else:
+            raise _Unsupported(value)
+    elif isinstance(value, (float, np.floating)):
+        out += struct.pack('>Bd', 0xcb, float(value))
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        _pack_length(out, len(data), 0xa0, 31, (0xd9, 0xda, 0xdb))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        _pack_length(out, len(value), None, 0, (0xc4, 0xc5, 0xc6))
+        out += value
+    elif isinstance(value, dict):
+        _pack_length(out, len(value), 0x80, 15, (None, 0xde, 0xdf))
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    elif isinstance(value, list):
+        _pack_length(out, len(value), 0x90, 15, (None, 0xdc, 0xdd))
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, tuple):
+        _pack_ext(out, _EXT_TUPLE, _packb(list(value)))
+    elif isinstance(value, HistorySeries):
+        _pack_ext(out, _EXT_SERIES, _series_body(value))
+    elif isinstance(value, pd.Timestamp):
+        _pack_ext(out, _EXT_TIMESTAMP, value.isoformat().encode('ascii'))
+    elif isinstance(value, datetime):
+        _pack_ext(out, _EXT_DATETIME, value.isoformat().encode('ascii'))
+    elif isinstance(value, date):
+        _pack_ext(out, _EXT_DATE, value.isoformat().encode('ascii'))
+    elif isinstance(value, Decimal):
+        _pack_ext(out, _EXT_DECIMAL, str(value).encode('ascii'))
+    elif isinstance(value, np.bool_):
+        out.append(0xc3 if value else 0xc2)
+    else:
+        raise _Unsupported(type(value).__name__)
+
+
+def _packb(value: Any) -> bytes:
+    out = bytearray()
+    _pack(value, out)
+    return bytes(out)
+
+
+_EXT_DECODERS: Dict[int, Callable[[memoryview], Any]] = {
+    _EXT_DATETIME: lambda data: datetime.fromisoformat(bytes(data).decode('ascii')),
+    _EXT_DATE: lambda data: date.fromisoformat(bytes(data).decode('ascii')),
+    _EXT_TIMESTAMP: lambda data: pd.Timestamp(bytes(data).decode('ascii')),
+    _EXT_TUPLE: lambda data: tuple(_unpackb(data)),
+    _EXT_SERIES: _read_series,
+    _EXT_DECIMAL: lambda data: Decimal(bytes(data).decode('ascii')),
+}
+
+# Códigos de longitud variable: código -> (formato de la longitud, tipo)
+_SIZED = {
+    0xc4: ('>B', 'bin'), 0xc5: ('>H', 'bin'), 0xc6: ('>I', 'bin'),
+    0xd9: ('>B', 'str'), 0xda: ('>H', 'str'), 0xdb: ('>I', 'str'),
+    0xdc: ('>H', 'array'), 0xdd: ('>I', 'array'),
+    0xde: ('>H', 'map'), 0xdf: ('>I', 'map'),
+    0xc7: ('>B', 'ext'), 0xc8: ('>H', 'ext'), 0xc9: ('>I', 'ext'),
+}
+_SCALARS = {0xcb: '>d', 0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q',
+            0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q', 0xca: '>f'}
+
+
+def _unpack(buffer: memoryview, offset: int) -> Tuple[Any, int]:
+    code = buffer[offset]
+    offset += 1
+    if code < 0x80:
+        return code, offset
+    if code >= 0xe0:
+        return code - 0x100, offset
+    if code == 0xc0:
+        return None, offset
+    if code in (0xc2, 0xc3):
+        return code == 0xc3, offset
+    if code in _SCALARS:
+        fmt = _SCALARS[code]
+        return struct.unpack_from(fmt, buffer, offset)[0], offset + struct.calcsize(fmt)
+
+    if 0xa0 <= code <= 0xbf:
+        kind, size = 'str', code & 0x1f
+    elif 0x90 <= code <= 0x9f:
+        kind, size = 'array', code & 0x0f
+    elif 0x80 <= code <= 0x8f:
+        kind, size = 'map', code & 0x0f
+    elif code in _SIZED:
+        fmt, kind = _SIZED[code]
+        size = struct.unpack_from(fmt, buffer, offset)[0]
+        offset += struct.calcsize(fmt)
+    else:
+        raise CodecError(f"Código msgpack no soportado: {code:#x}")
+
+    if kind == 'str':
+        return str(buffer[offset:offset + size], 'utf-8'), offset + size
+    if kind == 'bin':
+        return bytes(buffer[offset:offset + size]), offset + size
+    if kind == 'array':
+        items = []
+        for _ in range(size):
+            item, offset = _unpack(buffer, offset)
+            items.append(item)
+        return items, offset
+    if kind == 'map':
+        result = {}
+        for _ in range(size):
+            key, offset = _unpack(buffer, offset)
+            result[key], offset = _unpack(buffer, offset)
+        return result, offset
+    ext_type = buffer[offset]
+    decoder = _EXT_DECODERS.get(ext_type)
+    if decoder is None:
+        raise CodecError(f"Extensión desconocida: {ext_type}")
+    return decoder(buffer[offset + 1:offset + 1 + size]), offset + 1 + size
+
+
+def _unpackb(buffer: memoryview) -> Any:
+    value, offset = _unpack(buffer, 0)
+    if offset != len(buffer):
+        raise CodecError("Datos sobrantes tras el valor")
+    return value
+
+
+# --- API ---
+
+def dumps(value: Any) -> bytes:
+    """
+    Serializa un resultado de la API con cabecera versionada: las series como buffers
+    crudos de numpy, los valores básicos en formato msgpack y el resto con pickle
+    """
+    prefix = MAGIC + bytes([VERSION])
+    if isinstance(value, HistorySeries):
+        return prefix + KIND_SERIES + _series_body(value)
+    try:
+        return prefix + KIND_PACKED + _packb(value)
+    except _Unsupported:
+        return prefix + KIND_PICKLE + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def is_current(payload: Any) -> bool:
+    """
+    True si el payload tiene la cabecera de la versión actual del formato
+    """
+    return isinstance(payload, (bytes, bytearray)) and payload[:_HEADER - 1] == MAGIC + bytes([VERSION])
+
+
+def loads(payload: bytes) -> Any:
+    """
+    Inverso de dumps. Las series comparten memoria con el payload (arrays de solo lectura).
+    """
+    if not is_current(payload):
+        raise CodecError("Cabecera o versión de formato no reconocida")
+    kind = payload[_HEADER - 1:_HEADER]
+    body = memoryview(payload)[_HEADER:]
+    try:
+        if kind == KIND_SERIES:
+            return _read_series(body)
+        if kind == KIND_PACKED:
+            return _unpackb(body)
+        if kind == KIND_PICKLE:
+            return pickle.loads(body)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise CodecError(f"Payload corrupto: {e}") from e
+    raise CodecError(f"Tipo de contenido desconocido: {kind!r}")
@@ -0,0 +1,109 @@
+# apiControl/concurrency.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+from functools import partial
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+# Pool acotado compartido por todas las peticiones para las llamadas a proveedores
+_executor = ThreadPoolExecutor(max_workers=settings.API_MAX_WORKERS, thread_name_prefix='api')
+_worker = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def _run_task(fn: Callable[[], Any]) -> Any:
+    _worker.active = True
+    try:
+        return fn()
+    finally:
+        _worker.active = False
+        # Cada hilo del pool abre su propia conexión: se cierra al terminar la tarea
+        connections.close_all()
+
+
+def submit(fn: Callable[[], Any]):
+    """
+    Envía una tarea al pool conservando el contexto de la petición (instantáneas de tickers)
+    """
+    return _executor.submit(copy_context().run, _run_task, fn)
+
+
+async def arun(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Ejecuta una función bloqueante en el pool y la espera sin bloquear el event loop
+    """
+    return await asyncio.wrap_future(submit(partial(fn, *args, **kwargs)))
+
+
+def run_parallel(tasks: Dict[Hashable, Callable[[], Any]],
+                 timeout: Optional[float] = None) -> Tuple[Dict[Hashable, Any], Dict[Hashable, BaseException]]:
+    """
+    Ejecuta tareas independientes en el pool y devuelve (resultados, errores) por clave.
+    Las tareas que no terminan antes de 'timeout' se registran como DeadlineExceeded.
+    Desde un hilo del propio pool se ejecutan en serie para no bloquearlo.
+
+    Un hilo no se puede interrumpir: la tarea que supera 'timeout' sigue ocupando su
+    worker hasta que vence el tiempo de espera de su propia llamada HTTP
+    (HTTP_READ_TIMEOUT; el 'info' de yfinance usa su límite fijo de 30 s). Las tareas
+    deben hacer E/S con tiempo de espera, y API_MAX_WORKERS se dimensiona con ese margen.
+    """
+    results: Dict[Hashable, Any] = {}
+    errors: Dict[Hashable, BaseException] = {}
+
+    if getattr(_worker, 'active', False):
+        for key, fn in tasks.items():
+            try:
+                results[key] = fn()
+            except Exception as e:
+                errors[key] = e
+        return results, errors
+
+    futures = {key: submit(fn) for key, fn in tasks.items()}
+    done, _ = wait(futures.values(), timeout=timeout)
+    for key, future in futures.items():
+        if future not in done:
+            future.cancel()
+            errors[key] = DeadlineExceeded(f"Tiempo de espera agotado ({timeout}s)")
+            continue
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            errors[key] = e
+    return results, errors
+
+
+# Event loop de larga duración en un hilo propio, compartido por todas las peticiones.
+# Con runserver/WSGI asgiref crea un loop nuevo para cada vista asíncrona, así que lo que
+# dependa del loop (el cliente httpx y su pool de conexiones, las llamadas en curso de la
+# caché asíncrona) solo se reutiliza entre peticiones si vive en este loop.
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+_shared_loop_lock = threading.Lock()
+
+
+def get_shared_loop() -> asyncio.AbstractEventLoop:
+    global _shared_loop
+    if _shared_loop is None:
+        with _shared_loop_lock:
+            if _shared_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='api-loop', daemon=True).start()
+                _shared_loop = loop
+    return _shared_loop
+
+
+async def run_shared(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Ejecuta la corrutina en el loop compartido y la espera desde el loop actual.
+    Conserva el contexto de la petición y, si quien espera se cancela, se cancela también.
+    """
+    loop = get_shared_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
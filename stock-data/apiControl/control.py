@@ -3,9 +3,27 @@ from .services.fmp_service import FMPService
 from .services.eodhd_service import EODHDService
 from .services.alphavantage_service import AlphaVantageService
 from .exceptions.apiException import APIError
+from . import cache, catalog, concurrency
+from functools import partial
+import re
+
+
+# Forma de un ticker: una sola palabra corta, con sufijo de bolsa o clase opcional (VWRL.L, BRK-B, ^GSPC)
+TICKER_PATTERN = re.compile(r'^\^?[A-Za-z0-9]{1,6}([.\-=][A-Za-z0-9]{1,4})?$')
+
+
+def looks_like_ticker(query):
+    return bool(TICKER_PATTERN.match((query or '').strip()))
 
 
 def generic_search(query):
+    # Si el término no es un símbolo conocido, se busca por nombre en el catálogo local;
+    # si parece un ticker (puede no estar catalogado) se pregunta antes al proveedor
+    local_results = None
+    if catalog.resolve(query) is None:
+        local_results = catalog.search(query)
+        if local_results and not looks_like_ticker(query):
+            return local_results
     # Primero intenta buscar por símbolo con YFinance
     try:
         result = YFinanceService.getSearchData(query)
@@ -13,6 +31,8 @@ def generic_search(query):
             return result
     except Exception:
         pass
+    if local_results:
+        return local_results
     # Si falla, intenta buscar por nombre con EODHD
     try:
         eodhd = EODHDService()
@@ -23,9 +43,37 @@ def generic_search(query):
         pass
     return None
 
+async def ageneric_search(query):
+    """
+    Versión asíncrona de generic_search: yfinance es bloqueante y se ejecuta en el pool,
+    EODHD usa el cliente HTTP asíncrono compartido
+    """
+    local_results = None
+    if await concurrency.arun(catalog.resolve, query) is None:
+        local_results = await concurrency.arun(catalog.search, query)
+        if local_results and not looks_like_ticker(query):
+            return local_results
+    try:
+        result = await concurrency.arun(YFinanceService.getSearchData, query)
+        if result:
+            return result
+    except Exception:
+        pass
+    if local_results:
+        return local_results
+    try:
+        api_result = await EODHDService().agetSearchData(query)
+        if api_result and api_result.get('quotes'):
+            return api_result['quotes']
+    except Exception:
+        pass
+    return None
+
 API_MAPPING = {
     "search": {
         "primary": generic_search,
+        "aprimary": ageneric_search,
+        "batch": YFinanceService.getBatchSearchData,
         #"backup": lambda symbol: EODHDService().getSearchData(symbol),
     },
 
@@ -49,6 +97,7 @@ API_MAPPING = {
         },
         "categorySector": {
             "primary": lambda symbol: FMPService().getCategorySector(symbol),           # ACTUALMENTE NO FUNCIONA
+            "aprimary": lambda symbol: FMPService().agetCategorySector(symbol),
             "backup": YFinanceService.getCategorySector,                                # ACTUALMENTE FUNCIONA ESTA
         },
         #"rating": {
@@ -58,10 +107,27 @@ API_MAPPING = {
     }
 }
 
+def _call_services(config, action, params, field=None):
+    """
+    Llama al servicio primario y, si falla, al de backup
+    """
+    primary_service = config.get("primary")
+
+    try:
+        return primary_service(params)
+    except Exception as e:
+        print(f"[API] Error en primaria para action='{action}', field='{field}': {e}")
+        backup_service = config.get("backup")
+        if backup_service:
+            return backup_service(params)
+        else:
+            raise APIError(f"Error en API primaria y sin backup para action='{action}', field='{field}'")
+
 def perform_api_call(action, params, field=None):
     """
     Llama al método correspondiente dentro de la API (como .compare()).
     Si 'field' está presente, selecciona el API mapping por campo específico.
+    Los resultados pasan por la caché de dos niveles de apiControl.cache.
     """
     try:
         config = (
@@ -73,17 +139,91 @@ def perform_api_call(action, params, field=None):
         if not config:
             raise APIError(f"No hay configuración para action='{action}', field='{field}'")
 
-        primary_service = config.get("primary")
+        return cache.cached_call(action, field, params, lambda: _call_services(config, action, params, field))
+
+    except KeyError:
+        raise APIError(f"Acción o campo inválido: action='{action}', field='{field}'")
 
+
+def perform_batch_api_call(action, symbols, field=None):
+    """
+    Igual que perform_api_call pero para una lista de símbolos: si el proveedor admite
+    lotes ('batch') se hace una sola petición para todos los que no estén en caché.
+    Los que el lote no devuelva se piden uno a uno, en paralelo. Devuelve {símbolo: resultado},
+    con cada resultado igual que el de perform_api_call y en su misma entrada de caché.
+    """
+    try:
+        config = (
+            API_MAPPING[action].get(field)
+            if field
+            else API_MAPPING[action]
+        )
+    except KeyError:
+        raise APIError(f"Acción o campo inválido: action='{action}', field='{field}'")
+
+    if not config:
+        raise APIError(f"No hay configuración para action='{action}', field='{field}'")
+
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    results = {}
+    batch_service = config.get("batch")
+    if batch_service:
         try:
-            return primary_service(params)
+            # Cada fila del lote como la devuelve la llamada individual (lista con un
+            # resultado), para que ambos caminos compartan las entradas de caché
+            results = cache.cached_batch_call(
+                action, field, symbols,
+                lambda pending: {s: [row] for s, row in batch_service(pending).items()},
+            )
         except Exception as e:
-            print(f"[API] Error en primaria para action='{action}', field='{field}': {e}")
-            backup_service = config.get("backup")
-            if backup_service:
-                return backup_service(params)
-            else:
-                raise APIError(f"Error en API primaria y sin backup para action='{action}', field='{field}'")
+            print(f"[API] Error en lote para action='{action}', field='{field}': {e}")
+
+    pending = [s for s in symbols if s not in results]
+    if pending:
+        fetched, errors = concurrency.run_parallel(
+            {s: partial(perform_api_call, action, s, field) for s in pending}
+        )
+        for symbol, error in errors.items():
+            print(f"[API] Error para '{symbol}' en action='{action}', field='{field}': {error}")
+        results.update({s: v for s, v in fetched.items() if v})
+
+    return {s: results[s] for s in symbols if s in results}
+
+async def _acall_services(config, action, params, field=None):
+    """
+    Igual que _call_services, pero usa las variantes asíncronas ('aprimary'/'abackup')
+    cuando existen y ejecuta en el pool las que solo tienen versión síncrona
+    """
+    async def call(kind):
+        async_service = config.get(f"a{kind}")
+        if async_service:
+            return await async_service(params)
+        return await concurrency.arun(config[kind], params)
+
+    try:
+        return await call("primary")
+    except Exception as e:
+        print(f"[API] Error en primaria para action='{action}', field='{field}': {e}")
+        if config.get("backup") or config.get("abackup"):
+            return await call("backup")
+        else:
+            raise APIError(f"Error en API primaria y sin backup para action='{action}', field='{field}'")
 
+async def aperform_api_call(action, params, field=None):
+    """
+    Versión asíncrona de perform_api_call para las vistas asíncronas, con la misma
+    caché y los mismos errores
+    """
+    try:
+        config = (
+            API_MAPPING[action].get(field)
+            if field
+            else API_MAPPING[action]
+        )
     except KeyError:
         raise APIError(f"Acción o campo inválido: action='{action}', field='{field}'")
+
+    if not config:
+        raise APIError(f"No hay configuración para action='{action}', field='{field}'")
+
+    return await cache.acached_call(action, field, params, lambda: _acall_services(config, action, params, field))
@@ -0,0 +1,140 @@
+# apiControl/correlation.py
+import hashlib
+import math
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from . import codec
+from .history import DateLike, _to_day
+from .panel import TRADING_DAYS, PricePanel, build_panel
+
+
+def _backend():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _cache_key(symbols: List[str], start: Optional[DateLike], end: Optional[DateLike]) -> str:
+    bounds = [str(_to_day(value)) if value is not None else '-' for value in (start, end)]
+    digest = hashlib.sha1(repr((symbols, bounds)).encode('utf-8')).hexdigest()
+    return f"corr:v1:{digest}"
+
+
+def _sums(values: np.ndarray) -> Dict[str, Any]:
+    """
+    Sumas suficientes de las rentabilidades diarias de un tramo de precios: número de
+    observaciones, suma por símbolo y matriz de productos cruzados
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = values[1:] / values[:-1] - 1
+    returns = returns[~np.isnan(returns).any(axis=1)]  # Solo sesiones con todos los precios
+    return {'count': len(returns), 'sums': returns.sum(axis=0), 'products': returns.T @ returns}
+
+
+def _load(key: str) -> Optional[Dict[str, Any]]:
+    try:
+        payload = _backend().get(key)
+    except Exception as e:
+        print(f"[API] Error leyendo la caché de correlaciones: {e}")
+        return None
+    if not codec.is_current(payload):
+        return None
+    state = codec.loads(payload)
+    state['sums'] = np.asarray(state['sums'])
+    state['products'] = np.asarray(state['products'])
+    return state
+
+
+def _save(key: str, state: Dict[str, Any]) -> None:
+    stored = dict(state, sums=state['sums'].tolist(), products=state['products'].tolist())
+    try:
+        _backend().set(key, codec.dumps(stored), timeout=settings.CORRELATION_CACHE_TTL)
+    except Exception as e:
+        print(f"[API] Error escribiendo la caché de correlaciones: {e}")
+
+
+def _extend(state: Optional[Dict[str, Any]], common: PricePanel) -> Optional[Dict[str, Any]]:
+    """
+    Estado anterior ampliado con las sesiones nuevas del panel, o None si ya no sirve
+    (empieza en otra fecha o los precios del último día cambiaron por un ajuste)
+    """
+    if state is None or state['first_date'] != str(common.dates[0]):
+        return None
+    day = np.datetime64(state['last_date'], 'D')
+    pos = int(np.searchsorted(common.dates, day))
+    if pos >= len(common) or common.dates[pos] != day:
+        return None
+    if not np.allclose(common.values[pos], state['last_prices'], rtol=1e-9, atol=0):
+        return None
+    if pos == len(common) - 1:
+        return state
+    delta = _sums(common.values[pos:])
+    print(f"[DEBUG] Correlación: {len(common) - 1 - pos} sesiones nuevas para {len(common.symbols)} símbolos")
+    return dict(
+        state,
+        count=state['count'] + delta['count'],
+        sums=state['sums'] + delta['sums'],
+        products=state['products'] + delta['products'],
+    )
+
+
+def _matrix(values: np.ndarray) -> List[List[Optional[float]]]:
+    return [[value if math.isfinite(value) else None for value in row] for row in values.tolist()]
+
+
+def correlation_matrix(histories: Mapping[str, Any], start: Optional[DateLike] = None,
+                       end: Optional[DateLike] = None) -> Optional[Dict[str, Any]]:
+    """
+    Matrices de correlación y de covarianza (anualizada) de las rentabilidades diarias de
+    los símbolos sobre el tramo en el que todos cotizan dentro de [start, end], a partir
+    de su panel de precios alineado.
+
+    Se guardan en la caché compartida por conjunto de símbolos y rango de fechas como
+    sumas suficientes (observaciones, sumas y productos cruzados de las rentabilidades),
+    de modo que cuando llegan barras nuevas solo se suman las sesiones posteriores a la
+    última calculada. Los símbolos sin histórico se devuelven aparte en 'missing'; None
+    si quedan menos de dos.
+    """
+    available = {symbol: data for symbol, data in histories.items() if data is not None}
+    ordered = sorted(available)
+    panel = build_panel({symbol: available[symbol] for symbol in ordered})
+    if panel is None or len(panel.symbols) < 2:
+        return None
+    ordered = panel.symbols
+    common = panel.window(start, end).common()
+    if len(common) < 3:
+        return None
+
+    key = _cache_key(ordered, start, end)
+    cached = _load(key)
+    state = _extend(cached, common)
+    if state is None:
+        state = dict(_sums(common.values), first_date=str(common.dates[0]))
+    if state is not cached:
+        state['last_date'] = str(common.dates[-1])
+        state['last_prices'] = common.values[-1].tolist()
+        _save(key, state)
+
+    count = state['count']
+    if count < 2:
+        return None
+    sums, products = state['sums'], state['products']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = (products - np.outer(sums, sums) / count) / (count - 1)
+        deviation = np.sqrt(np.diag(covariance))
+        correlation = np.clip(covariance / np.outer(deviation, deviation), -1.0, 1.0)
+
+    # Mismo orden que se pidió
+    order = [ordered.index(symbol) for symbol in histories if symbol in ordered]
+    grid = np.ix_(order, order)
+    return {
+        'symbols': [ordered[i] for i in order],
+        'missing': [symbol for symbol in histories if symbol not in ordered],
+        'start_date': state['first_date'],
+        'end_date': state['last_date'],
+        'observations': count,
+        'correlation': _matrix(correlation[grid]),
+        'covariance': _matrix(covariance[grid] * TRADING_DAYS),
+    }
@@ -0,0 +1,227 @@
+# apiControl/history.py
+import math
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+DateLike = Union[str, date, pd.Timestamp, np.datetime64]
+
+# Claves del formato clásico de getHistoricalProfit (dict de listas) -> atributo
+_LEGACY_KEYS = {
+    'dates': 'dates',
+    'prices': 'close',
+    'open': 'open',
+    'high': 'high',
+    'low': 'low',
+    'close': 'close',
+    'volumes': 'volume',
+}
+
+
+def _to_dates(values: Any) -> np.ndarray:
+    if isinstance(values, np.ndarray) and values.dtype == np.dtype('datetime64[D]'):
+        return values
+    index = pd.DatetimeIndex(pd.to_datetime(values))
+    if index.tz is not None:
+        index = index.tz_localize(None)  # Fecha de la bolsa, sin zona horaria
+    return index.values.astype('datetime64[D]')
+
+
+def _to_day(value: DateLike) -> np.datetime64:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return np.datetime64(ts.date(), 'D')
+
+
+def _to_floats(values: Any) -> Optional[np.ndarray]:
+    if values is None:
+        return None
+    return np.asarray(values, dtype=np.float64)  # None -> NaN
+
+
+def _json_floats(values: np.ndarray) -> List[Optional[float]]:
+    # NaN no es JSON válido para el frontend
+    return [None if math.isnan(v) else v for v in values.tolist()]
+
+
+class HistorySeries:
+    """
+    Histórico diario de un símbolo como arrays contiguos de numpy: fechas datetime64[D]
+    y precios/volumen float64 (close hace también de 'prices', sin duplicarlo).
+
+    Las ventanas por fecha (window) son vistas sobre los mismos arrays, sin copias.
+    Se mantiene el acceso por claves del formato clásico (hist['dates'], hist['prices'],
+    hist['volumes'], ...) para el código que aún lo usa; esas claves devuelven listas nuevas.
+    """
+
+    __slots__ = ('dates', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, dates: Any, close: Any, open: Any = None, high: Any = None,
+                 low: Any = None, volume: Any = None):
+        columns = {
+            'dates': _to_dates(dates),
+            'close': _to_floats(close),
+            'open': _to_floats(open),
+            'high': _to_floats(high),
+            'low': _to_floats(low),
+            'volume': _to_floats(volume),
+        }
+        size = len(columns['dates'])
+        for name, values in columns.items():
+            if values is not None and len(values) != size:
+                raise ValueError(f"La columna '{name}' tiene {len(values)} valores y hay {size} fechas")
+
+        # Orden cronológico (las búsquedas por fecha son binarias)
+        dates = columns['dates']
+        if size > 1 and not (dates[1:] >= dates[:-1]).all():
+            order = np.argsort(dates, kind='stable')
+            columns = {name: values[order] if values is not None else None for name, values in columns.items()}
+
+        for name, values in columns.items():
+            setattr(self, name, values)
+
+    @classmethod
+    def _wrap(cls, dates, close, open, high, low, volume) -> "HistorySeries":
+        # Sin validar ni copiar: para vistas de una serie ya construida
+        series = object.__new__(cls)
+        series.dates, series.close, series.open = dates, close, open
+        series.high, series.low, series.volume = high, low, volume
+        return series
+
+    @classmethod
+    def from_frame(cls, hist: Optional[pd.DataFrame]) -> Optional["HistorySeries"]:
+        """
+        Serie a partir de un DataFrame de yfinance (Open/High/Low/Close/Volume por fecha)
+        """
+        if hist is None or hist.empty:
+            return None
+        column = lambda name: hist[name].to_numpy(dtype=np.float64) if name in hist.columns else None
+        return cls(hist.index, column('Close'), column('Open'), column('High'), column('Low'), column('Volume'))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> Optional["HistorySeries"]:
+        """
+        Serie a partir de filas (date, open, high, low, close, volume) ordenadas por fecha
+        """
+        rows = list(rows)
+        if not rows:
+            return None
+        dates, opens, highs, lows, closes, volumes = zip(*rows)
+        return cls(np.array(dates, dtype='datetime64[D]'), closes, opens, highs, lows, volumes)
+
+    @classmethod
+    def coerce(cls, data: Any) -> Optional["HistorySeries"]:
+        """
+        Acepta una HistorySeries o un dict del formato clásico; None si no hay precios
+        """
+        if isinstance(data, cls):
+            return data if len(data) else None
+        if not data or 'dates' not in data or 'prices' not in data or len(data['prices']) == 0:
+            return None
+        return cls(
+            data['dates'],
+            data.get('close', data['prices']),
+            data.get('open'),
+            data.get('high'),
+            data.get('low'),
+            data.get('volumes'),
+        )
+
+    # --- Acceso ---
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.close
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in (self.dates, self.open, self.high, self.low, self.close, self.volume)
+                   if values is not None)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "HistorySeries(vacía)"
+        return f"HistorySeries({len(self)} barras, {self.dates[0]} a {self.dates[-1]})"
+
+    def nearest(self, when: DateLike) -> int:
+        """
+        Posición de la barra más cercana a la fecha (la anterior en caso de empate)
+        """
+        target = _to_day(when)
+        i = int(np.searchsorted(self.dates, target))
+        if i >= len(self.dates):
+            return len(self.dates) - 1
+        if i > 0 and target - self.dates[i - 1] <= self.dates[i] - target:
+            return i - 1
+        return i
+
+    def window(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> "HistorySeries":
+        """
+        Barras entre start y end (ambas incluidas) como vista de los mismos arrays
+        """
+        lo = int(np.searchsorted(self.dates, _to_day(start), 'left')) if start is not None else 0
+        hi = int(np.searchsorted(self.dates, _to_day(end), 'right')) if end is not None else len(self.dates)
+        part = slice(lo, max(lo, hi))
+        column = lambda values: values[part] if values is not None else None
+        return self._wrap(column(self.dates), column(self.close), column(self.open),
+                          column(self.high), column(self.low), column(self.volume))
+
+    # --- Exportación ---
+
+    def date_strings(self) -> List[str]:
+        return np.datetime_as_string(self.dates, unit='D').tolist()
+
+    def to_chart(self) -> Dict[str, list]:
+        """
+        Serie de cierre para los gráficos de línea
+        """
+        return {'dates': self.date_strings(), 'prices': _json_floats(self.close)}
+
+    def to_candles(self) -> Optional[Dict[str, list]]:
+        """
+        Datos OHLCV para el gráfico de velas (None si la serie solo tiene cierres)
+        """
+        if any(values is None for values in (self.open, self.high, self.low, self.volume)):
+            return None
+        return {
+            'dates': self.date_strings(),
+            'open': _json_floats(self.open),
+            'high': _json_floats(self.high),
+            'low': _json_floats(self.low),
+            'close': _json_floats(self.close),
+            'volume': _json_floats(self.volume),
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        columns = {'Open': self.open, 'High': self.high, 'Low': self.low, 'Close': self.close, 'Volume': self.volume}
+        return pd.DataFrame(
+            {name: values for name, values in columns.items() if values is not None},
+            index=pd.DatetimeIndex(self.dates.astype('datetime64[ns]'), name='Date'),
+        )
+
+    # --- Compatibilidad con el formato clásico (dict de listas) ---
+
+    def keys(self) -> List[str]:
+        return [key for key, attr in _LEGACY_KEYS.items() if getattr(self, attr) is not None]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key: object) -> bool:
+        return key in _LEGACY_KEYS and getattr(self, _LEGACY_KEYS[key]) is not None
+
+    def __getitem__(self, key: str) -> list:
+        if key not in self:
+            raise KeyError(key)
+        if key == 'dates':
+            return list(pd.to_datetime(self.dates))
+        return getattr(self, _LEGACY_KEYS[key]).tolist()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self else default
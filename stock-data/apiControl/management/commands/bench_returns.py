@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from apiControl import returns
+from apiControl.history import HistorySeries
+
+
+def _legacy_annual_returns(series: HistorySeries) -> dict:
+    # Implementación anterior de calculateAnnualReturns (máscara por año e iloc), como referencia
+    df = pd.DataFrame({'date': series.dates.astype('datetime64[ns]'), 'price': series.close})
+    df['year'] = df['date'].dt.year
+    annual_returns = {}
+    for year in df['year'].unique():
+        year_data = df[df['year'] == year]
+        start_price = year_data.iloc[0]['price']
+        end_price = year_data.iloc[-1]['price']
+        if start_price > 0 and end_price > 0:
+            annual_returns[int(year)] = round(((end_price / start_price) - 1) * 100, 2)
+    return annual_returns
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el cálculo vectorizado de rentabilidades anuales con la implementación "
+        "anterior (bucle por año) sobre series diarias sintéticas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=20, help="Número de series")
+        parser.add_argument('--years', type=int, default=30, help="Años de datos diarios por serie")
+        parser.add_argument('--repeat', type=int, default=3, help="Repeticiones (se toma la mejor)")
+
+    def _best(self, fn, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        return best, result
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        dates = pd.bdate_range(end='2024-12-31', periods=options['years'] * 252)
+        histories = {
+            f"SYM{i}": HistorySeries(dates, 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.01, len(dates)))))
+            for i in range(options['symbols'])
+        }
+        self.stdout.write(f"{len(histories)} series de {len(dates)} barras ({options['years']} años)")
+
+        legacy_time, legacy = self._best(
+            lambda: {symbol: _legacy_annual_returns(series) for symbol, series in histories.items()},
+            options['repeat'],
+        )
+        single_time, _ = self._best(
+            lambda: {symbol: returns.annual_returns(series) for symbol, series in histories.items()},
+            options['repeat'],
+        )
+        batch_time, batch = self._best(lambda: returns.annual_returns_many(histories), options['repeat'])
+
+        for symbol, expected in legacy.items():
+            actual = {year: data['return'] for year, data in batch[symbol]['annual_returns'].items()}
+            if actual != expected:
+                self.stderr.write(f"{symbol}: los resultados no coinciden con la implementación anterior")
+
+        self.stdout.write(f"Bucle por año:          {legacy_time * 1000:9.2f} ms")
+        self.stdout.write(f"Vectorizado por símbolo: {single_time * 1000:8.2f} ms ({legacy_time / single_time:.0f}x)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Vectorizado en lote:     {batch_time * 1000:8.2f} ms ({legacy_time / batch_time:.0f}x)"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from apiControl import similarity
+from apiControl.services.yfinance_service import YFinanceService
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el índice de fondos similares del catálogo. Antes descarga el histórico "
+        "de los fondos catalogados que aún no lo tienen en el almacén de precios. "
+        "Pensado para ejecutarse periódicamente (cron), por ejemplo tras el cierre del mercado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours', type=int, default=None,
+            help="Vecinos guardados por fondo (por defecto SIMILARITY_NEIGHBOURS)",
+        )
+        parser.add_argument(
+            '--skip-backfill', action='store_true',
+            help="No descargar los históricos que faltan; indexar solo los ya almacenados",
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_backfill']:
+            saved = similarity.backfill_histories(YFinanceService.downloadHistory)
+            self.stdout.write(f"{saved} históricos descargados")
+        count = similarity.build_index(options['neighbours'])
+        total = similarity.catalogued_count()
+        self.stdout.write(self.style.SUCCESS(f"{count} de {total} fondos del catálogo indexados"))
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apiControl import catalog
+from apiControl.services.eodhd_service import EODHDService
+
+
+class Command(BaseCommand):
+    help = (
+        "Sincroniza el catálogo local de fondos con los listados de símbolos de EODHD. "
+        "Pensado para ejecutarse periódicamente (cron): solo descarga las bolsas cuyo "
+        "catálogo tiene más de CATALOG_REFRESH_SECONDS, salvo que se use --force."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'exchanges', nargs='*',
+            help="Bolsas a sincronizar (por defecto CATALOG_EXCHANGES)",
+        )
+        parser.add_argument('--force', action='store_true', help="Sincronizar aunque el catálogo sea reciente")
+
+    def handle(self, *args, **options):
+        exchanges = options['exchanges'] or settings.CATALOG_EXCHANGES
+        service = EODHDService()
+        failed = []
+
+        for exchange in exchanges:
+            if not options['force'] and not catalog.is_stale(exchange):
+                self.stdout.write(f"{exchange}: catálogo al día, se omite")
+                continue
+            try:
+                rows = service.getExchangeSymbols(exchange)
+            except Exception as e:
+                self.stderr.write(f"{exchange}: error descargando el listado: {e}")
+                failed.append(exchange)
+                continue
+            synced_at = timezone.now()
+            count = catalog.upsert(exchange, rows)
+            # Un listado vacío es más probablemente un fallo del proveedor que una bolsa sin símbolos
+            removed = catalog.prune(exchange, synced_at) if count else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"{exchange}: {count} símbolos sincronizados, {removed} retirados del listado"
+            ))
+
+        if failed:
+            raise CommandError(f"No se pudieron sincronizar: {', '.join(failed)}")
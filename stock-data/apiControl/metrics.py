@@ -0,0 +1,68 @@
+# apiControl/metrics.py
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from . import returns, risk
+from .history import HistorySeries
+from .services.yfinance_service import YFinanceService
+
+
+def _period_value(trailing: Optional[Dict[str, Any]], period: str, field: str) -> Optional[float]:
+    row = trailing['periods'][period] if trailing else None
+    return row[field] if row else None
+
+
+def _fund_metrics(series: HistorySeries, annual_returns: Optional[Dict[str, Any]], trailing: Optional[Dict[str, Any]],
+                  volatility: Optional[Dict[str, Any]], risk_metrics: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    base = series.close[0]
+    return {
+        'price_series': series.to_chart(),
+        'cumulative_return': float((series.close[-1] / base) - 1) * 100 if base != 0 else None,
+        'growth_last_year': _period_value(trailing, '1Y', 'return'),
+        'growth_5y_avg': _period_value(trailing, '5Y', 'annualized'),  # CAGR a 5 años
+        'trailing_returns': trailing,
+        'annual_returns': annual_returns,
+        'volatility': risk.volatility_summary(volatility),
+        'risk': risk_metrics,
+    }
+
+
+def compute_fund_metrics(hist_data: Any, now: Optional[pd.Timestamp] = None) -> Optional[Dict[str, Any]]:
+    """
+    Calcula todas las métricas derivadas de un fondo a partir de una única descarga
+    del histórico (HistorySeries o dict del formato clásico): serie para gráficos,
+    rentabilidad acumulada, tabla de rentabilidades por periodo (de la que salen el
+    crecimiento a 1 año y el CAGR a 5 años), rentabilidades anuales, volatilidad anual
+    y métricas de riesgo (apiControl.risk).
+    """
+    series = HistorySeries.coerce(hist_data)
+    if series is None:
+        return None
+    now = now if now is not None else pd.Timestamp.now()
+    return _fund_metrics(
+        series,
+        YFinanceService.calculateAnnualReturns(series),
+        returns.trailing_returns(series, now),
+        risk.risk_metrics(series, years=1, now=now),
+        risk.risk_metrics(series, now=now),
+    )
+
+
+def compute_fund_metrics_many(histories: Dict[str, Any], now: Optional[pd.Timestamp] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    compute_fund_metrics para varios fondos, con las rentabilidades anuales y por
+    periodo y las métricas de riesgo de todos calculadas en pasadas vectorizadas únicas
+    """
+    now = now if now is not None else pd.Timestamp.now()
+    series = {symbol: HistorySeries.coerce(data) for symbol, data in histories.items()}
+    available = {symbol: s for symbol, s in series.items() if s is not None}
+    annual = returns.annual_returns_many(available)
+    trailing = returns.trailing_returns_many(available, now)
+    volatility = risk.risk_metrics_many(available, years=1, now=now)
+    risk_metrics = risk.risk_metrics_many(available, now=now)
+    return {
+        symbol: _fund_metrics(s, annual[symbol], trailing[symbol], volatility[symbol], risk_metrics[symbol])
+        if s is not None else None
+        for symbol, s in series.items()
+    }
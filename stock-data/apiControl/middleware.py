@@ -0,0 +1,28 @@
+# apiControl/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import snapshot
+
+
+class TickerSnapshotMiddleware:
+    """
+    Abre un ámbito de instantáneas de tickers por petición, de modo que el 'info'
+    de cada símbolo se descarga una sola vez aunque lo usen varias vistas o servicios
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with snapshot.request_scope():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with snapshot.request_scope():
+            return await self.get_response(request)
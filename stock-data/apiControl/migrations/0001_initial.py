@@ -0,0 +1,65 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:13
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceSeriesState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("symbol", models.CharField(max_length=20, unique=True)),
+                ("first_date", models.DateField()),
+                ("last_date", models.DateField()),
+                ("last_refresh", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PriceBar",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("symbol", models.CharField(max_length=20)),
+                ("date", models.DateField()),
+                ("open", models.FloatField(blank=True, null=True)),
+                ("high", models.FloatField(blank=True, null=True)),
+                ("low", models.FloatField(blank=True, null=True)),
+                ("close", models.FloatField()),
+                ("volume", models.BigIntegerField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.BrinIndex(
+                        fields=["date"], name="pricebar_date_brin"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("symbol", "date"), name="pricebar_symbol_date_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiControl", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Fund",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("symbol", models.CharField(max_length=20)),
+                ("exchange", models.CharField(max_length=20)),
+                ("name", models.CharField(max_length=200)),
+                ("type", models.CharField(blank=True, max_length=50)),
+                ("country", models.CharField(blank=True, max_length=50)),
+                ("currency", models.CharField(blank=True, max_length=10)),
+                ("isin", models.CharField(blank=True, max_length=12)),
+                ("sector", models.CharField(blank=True, max_length=100)),
+                (
+                    "return1y",
+                    models.FloatField(
+                        blank=True, help_text="Rentabilidad en el último año", null=True
+                    ),
+                ),
+                (
+                    "fees",
+                    models.FloatField(
+                        blank=True, help_text="Comisiones anuales", null=True
+                    ),
+                ),
+                ("benchmark", models.CharField(blank=True, max_length=100)),
+                ("volatility", models.FloatField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("symbol", "exchange"), name="fund_symbol_exchange_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
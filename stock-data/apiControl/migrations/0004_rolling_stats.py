@@ -0,0 +1,97 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:52
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiControl", "0003_fund_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollingState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("symbol", models.CharField(max_length=20, unique=True)),
+                ("window", models.PositiveIntegerField()),
+                ("last_date", models.DateField()),
+                ("last_close", models.FloatField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("sum_returns", models.FloatField(default=0.0)),
+                ("sum_squares", models.FloatField(default=0.0)),
+                ("peak", models.FloatField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RollingStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("symbol", models.CharField(max_length=20)),
+                ("date", models.DateField()),
+                (
+                    "mean_return",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Rentabilidad diaria media de la ventana (%)",
+                        null=True,
+                    ),
+                ),
+                (
+                    "volatility",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Volatilidad anualizada de la ventana (%)",
+                        null=True,
+                    ),
+                ),
+                (
+                    "rolling_return",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Rentabilidad acumulada de la ventana (%)",
+                        null=True,
+                    ),
+                ),
+                (
+                    "drawdown",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Caída desde el máximo histórico (%)",
+                        null=True,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.BrinIndex(
+                        fields=["date"], name="rollingstat_date_brin"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("symbol", "date"), name="rollingstat_symbol_date_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:59
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("apiControl", "0004_rolling_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FundProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("symbol", models.CharField(max_length=20, unique=True)),
+                (
+                    "features",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.FloatField(),
+                        help_text="Vector de características normalizado",
+                        size=None,
+                    ),
+                ),
+                (
+                    "return1y",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Rentabilidad en el último año (%)",
+                        null=True,
+                    ),
+                ),
+                (
+                    "volatility",
+                    models.FloatField(
+                        blank=True, help_text="Volatilidad anualizada (%)", null=True
+                    ),
+                ),
+                (
+                    "neighbours",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=20),
+                        default=list,
+                        size=None,
+                    ),
+                ),
+                (
+                    "distances",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.FloatField(), default=list, size=None
+                    ),
+                ),
+                ("built_at", models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,3 +1,145 @@
 from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
-# Create your models here.
+
+class PriceBar(models.Model):
+    """
+    Barra diaria OHLCV almacenada localmente para un símbolo.
+    La clave natural es (symbol, date); el índice único sirve los rangos por símbolo
+    y el índice BRIN los rangos por fecha (tabla append-only ordenada por fecha).
+    """
+    symbol = models.CharField(max_length=20)
+    date = models.DateField()
+    open = models.FloatField(null=True, blank=True)
+    high = models.FloatField(null=True, blank=True)
+    low = models.FloatField(null=True, blank=True)
+    close = models.FloatField()
+    volume = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'date'], name='pricebar_symbol_date_uniq'),
+        ]
+        indexes = [
+            BrinIndex(fields=['date'], name='pricebar_date_brin'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} {self.date}: {self.close}"
+
+
+class PriceSeriesState(models.Model):
+    """
+    Estado de sincronización de la serie de precios de un símbolo
+    """
+    symbol = models.CharField(max_length=20, unique=True)
+    first_date = models.DateField()
+    last_date = models.DateField()
+    last_refresh = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.symbol} ({self.first_date} - {self.last_date})"
+
+
+class RollingState(models.Model):
+    """
+    Estado incremental de las estadísticas móviles de un símbolo: sumas de rentabilidades
+    diarias de la ventana y máximo histórico, suficientes para añadir una barra en O(1)
+    """
+    symbol = models.CharField(max_length=20, unique=True)
+    window = models.PositiveIntegerField()
+    last_date = models.DateField()
+    last_close = models.FloatField()
+    count = models.PositiveIntegerField(default=0)
+    sum_returns = models.FloatField(default=0.0)
+    sum_squares = models.FloatField(default=0.0)
+    peak = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.symbol} hasta {self.last_date} ({self.count}/{self.window})"
+
+
+class RollingStat(models.Model):
+    """
+    Estadísticas móviles de un símbolo al cierre de cada día (ventana de ROLLING_WINDOW barras)
+    """
+    symbol = models.CharField(max_length=20)
+    date = models.DateField()
+    mean_return = models.FloatField(null=True, blank=True, help_text="Rentabilidad diaria media de la ventana (%)")
+    volatility = models.FloatField(null=True, blank=True, help_text="Volatilidad anualizada de la ventana (%)")
+    rolling_return = models.FloatField(null=True, blank=True, help_text="Rentabilidad acumulada de la ventana (%)")
+    drawdown = models.FloatField(null=True, blank=True, help_text="Caída desde el máximo histórico (%)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'date'], name='rollingstat_symbol_date_uniq'),
+        ]
+        indexes = [
+            BrinIndex(fields=['date'], name='rollingstat_date_brin'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} {self.date}: vol {self.volatility}"
+
+
+class Fund(models.Model):
+    """
+    Catálogo local de fondos/símbolos, compartido por búsqueda y comparación.
+    Se rellena en bloque desde los listados de bolsas de EODHD (comando sync_catalog);
+    la clave natural es (symbol, exchange) porque un mismo código puede cotizar en varias bolsas.
+    """
+    symbol = models.CharField(max_length=20)
+    exchange = models.CharField(max_length=20)
+    name = models.CharField(max_length=200)
+    type = models.CharField(max_length=50, blank=True)
+    country = models.CharField(max_length=50, blank=True)
+    currency = models.CharField(max_length=10, blank=True)
+    isin = models.CharField(max_length=12, blank=True)
+    sector = models.CharField(max_length=100, blank=True)
+    return1y = models.FloatField(null=True, blank=True, help_text="Rentabilidad en el último año")
+    fees = models.FloatField(null=True, blank=True, help_text="Comisiones anuales")
+    benchmark = models.CharField(max_length=100, blank=True)
+    volatility = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+    # Documento de búsqueda a texto completo: nombre (peso A), categoría/tipo (B) y bolsa (C).
+    # El índice trigram sobre 'name' se crea en la migración 0003 si pg_trgm está disponible.
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config='simple')
+            + SearchVector('benchmark', 'sector', 'type', weight='B', config='simple')
+            + SearchVector('exchange', weight='C', config='simple')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['symbol', 'exchange'], name='fund_symbol_exchange_uniq'),
+        ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='fund_search_vector_gin'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} - {self.name}"
+
+
+class FundProfile(models.Model):
+    """
+    Perfil de rentabilidad/riesgo de un símbolo con histórico almacenado y sus vecinos más
+    cercanos, precalculados en lote por el comando build_similarity (apiControl.similarity)
+    """
+    symbol = models.CharField(max_length=20, unique=True)
+    features = ArrayField(models.FloatField(), help_text="Vector de características normalizado")
+    return1y = models.FloatField(null=True, blank=True, help_text="Rentabilidad en el último año (%)")
+    volatility = models.FloatField(null=True, blank=True, help_text="Volatilidad anualizada (%)")
+    neighbours = ArrayField(models.CharField(max_length=20), default=list)
+    distances = ArrayField(models.FloatField(), default=list)
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.symbol}: {', '.join(self.neighbours[:5])}"
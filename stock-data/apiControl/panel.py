@@ -0,0 +1,159 @@
+# apiControl/panel.py
+import math
+import warnings
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .history import DateLike, HistorySeries, _json_floats, _to_day
+
+TRADING_DAYS = 252
+
+
+class PricePanel:
+    """
+    Cierres de varios símbolos alineados por fecha: una fila por sesión de la unión de
+    todos los calendarios y una columna por símbolo.
+
+    Los festivos de cada bolsa se rellenan con el último cierre conocido (hasta
+    PANEL_FFILL_MAX_DAYS días); antes del primer dato o tras una serie que deja de
+    cotizar la celda queda a NaN.
+    """
+
+    __slots__ = ('dates', 'symbols', 'values')
+
+    def __init__(self, dates: np.ndarray, symbols: List[str], values: np.ndarray):
+        self.dates = dates
+        self.symbols = symbols
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __repr__(self) -> str:
+        return f"<PricePanel {len(self.symbols)} símbolos x {len(self)} sesiones>"
+
+    def column(self, symbol: str) -> np.ndarray:
+        return self.values[:, self.symbols.index(symbol)]
+
+    def window(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> "PricePanel":
+        """
+        Sesiones entre start y end (ambas incluidas) como vista del mismo panel
+        """
+        lo = int(np.searchsorted(self.dates, _to_day(start), 'left')) if start is not None else 0
+        hi = int(np.searchsorted(self.dates, _to_day(end), 'right')) if end is not None else len(self.dates)
+        part = slice(lo, max(lo, hi))
+        return PricePanel(self.dates[part], self.symbols, self.values[part])
+
+    def common(self) -> "PricePanel":
+        """
+        Tramo en el que todos los símbolos tienen precio (vacío si no se solapan)
+        """
+        complete = ~np.isnan(self.values).any(axis=1)
+        if not complete.any():
+            return PricePanel(self.dates[:0], self.symbols, self.values[:0])
+        first = int(np.argmax(complete))
+        last = len(complete) - int(np.argmax(complete[::-1]))
+        return PricePanel(self.dates[first:last], self.symbols, self.values[first:last])
+
+    def returns(self) -> np.ndarray:
+        """
+        Rentabilidades diarias simples (sesiones - 1 filas); NaN donde falta algún cierre
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.values[1:] / self.values[:-1] - 1
+
+    def date_strings(self) -> List[str]:
+        return np.datetime_as_string(self.dates, unit='D').tolist()
+
+    def to_chart(self, base: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Series para los gráficos sobre fechas comunes; con 'base' cada columna se
+        reescala para empezar en ese valor (comparación de evolución)
+        """
+        values = self.values
+        if base is not None and len(values):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                first = values[np.argmax(~np.isnan(values), axis=0), np.arange(values.shape[1])]
+                values = values / first * base
+        return {
+            'dates': self.date_strings(),
+            'series': {symbol: _json_floats(values[:, i]) for i, symbol in enumerate(self.symbols)},
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            self.values,
+            index=pd.DatetimeIndex(self.dates.astype('datetime64[ns]'), name='Date'),
+            columns=self.symbols,
+        )
+
+
+def build_panel(histories: Mapping[str, Any], max_gap_days: Optional[int] = None) -> Optional[PricePanel]:
+    """
+    Panel de cierres alineados a partir de los históricos (HistorySeries o dict clásico).
+    Cada columna se alinea con una búsqueda binaria del último cierre en o antes de cada
+    fecha, así que el relleno hacia delante no recorre las filas. Los símbolos sin
+    histórico no forman columna; None si ninguno lo tiene.
+    """
+    max_gap = np.timedelta64(max_gap_days if max_gap_days is not None else settings.PANEL_FFILL_MAX_DAYS, 'D')
+    series = {}
+    for symbol, data in histories.items():
+        coerced = HistorySeries.coerce(data)
+        if coerced is not None:
+            series[symbol] = coerced
+    if not series:
+        return None
+
+    dates = np.unique(np.concatenate([s.dates for s in series.values()]))
+    values = np.empty((len(dates), len(series)))
+    for i, s in enumerate(series.values()):
+        last = np.searchsorted(s.dates, dates, 'right') - 1
+        previous = np.maximum(last, 0)
+        column = s.close[previous]
+        stale = (last < 0) | (dates - s.dates[previous] > max_gap)
+        values[:, i] = np.where(stale, np.nan, column)
+    return PricePanel(dates, list(series), values)
+
+
+def _number(value: float) -> Optional[float]:
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def common_period_metrics(panel: Optional[PricePanel]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Métricas de todas las columnas sobre el tramo común del panel, de una vez y columna a
+    columna: rentabilidad acumulada y anualizada, volatilidad anualizada y máximo
+    drawdown (en %). Es la comparación justa entre fondos con historiales distintos.
+    """
+    if panel is None:
+        return {}
+    common = panel.common()
+    if len(common) < 2:
+        return {symbol: None for symbol in panel.symbols}
+
+    values = common.values
+    years = (common.dates[-1] - common.dates[0]) / np.timedelta64(1, 'D') / 365.25
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Columnas sin datos suficientes -> NaN
+        growth = values[-1] / values[0]
+        cumulative = (growth - 1) * 100
+        annualized = (growth ** (1 / years) - 1) * 100
+        volatility = np.nanstd(common.returns(), axis=0, ddof=1) * math.sqrt(TRADING_DAYS) * 100
+        max_drawdown = np.nanmin(values / np.fmax.accumulate(values, axis=0) - 1, axis=0) * 100
+
+    start, end = np.datetime_as_string(common.dates[[0, -1]], unit='D').tolist()
+    return {
+        symbol: {
+            'start_date': start,
+            'end_date': end,
+            'return': _number(cumulative[i]),
+            'annualized': _number(annualized[i]),
+            'volatility': _number(volatility[i]),
+            'max_drawdown': _number(max_drawdown[i]),
+        }
+        for i, symbol in enumerate(common.symbols)
+    }
@@ -0,0 +1,138 @@
+# apiControl/price_store.py
+from datetime import timedelta
+from typing import Callable, Optional
+
+import pandas as pd
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import rolling
+from .history import HistorySeries
+from .models import PriceBar, PriceSeriesState
+
+# fetch(symbol, start=None) -> DataFrame con columnas Open/High/Low/Close/Volume indexado por fecha
+HistoryFetcher = Callable[..., Optional[pd.DataFrame]]
+
+
+def _store_key(symbol: str) -> str:
+    return symbol.strip().upper()
+
+
+def _has_corporate_action(hist: pd.DataFrame) -> bool:
+    """
+    Un dividendo o split implica que yfinance reajusta todos los precios anteriores,
+    por lo que la serie almacenada deja de ser coherente con la nueva.
+    """
+    for column in ('Dividends', 'Stock Splits'):
+        if column in hist.columns and (hist[column].fillna(0) != 0).any():
+            return True
+    return False
+
+
+def _upsert_bars(key: str, hist: pd.DataFrame) -> None:
+    hist = hist.dropna(subset=['Close'])
+    bars = []
+    for ts, row in hist.iterrows():
+        volume = row.get('Volume')
+        bars.append(PriceBar(
+            symbol=key,
+            date=pd.Timestamp(ts).date(),
+            open=row.get('Open'),
+            high=row.get('High'),
+            low=row.get('Low'),
+            close=row['Close'],
+            volume=int(volume) if volume is not None and pd.notna(volume) else None,
+        ))
+    PriceBar.objects.bulk_create(
+        bars,
+        update_conflicts=True,
+        unique_fields=['symbol', 'date'],
+        update_fields=['open', 'high', 'low', 'close', 'volume'],
+        batch_size=1000,
+    )
+
+
+def _save_state(key: str) -> None:
+    dates = PriceBar.objects.filter(symbol=key).aggregate(
+        first=Min('date'), last=Max('date')
+    )
+    PriceSeriesState.objects.update_or_create(
+        symbol=key,
+        defaults={
+            'first_date': dates['first'],
+            'last_date': dates['last'],
+            'last_refresh': timezone.now(),
+        },
+    )
+
+
+def _backfill(symbol: str, key: str, fetch: HistoryFetcher) -> bool:
+    hist = fetch(symbol)
+    if hist is None or hist.empty:
+        return False
+    with transaction.atomic():
+        PriceBar.objects.filter(symbol=key).delete()
+        _upsert_bars(key, hist)
+        _save_state(key)
+    print(f"[DEBUG] PriceStore: backfill de {symbol} con {len(hist)} barras")
+    return True
+
+
+def _refresh(symbol: str, key: str, state: PriceSeriesState, fetch: HistoryFetcher) -> None:
+    # Se vuelve a pedir la última barra almacenada porque pudo guardarse con la sesión abierta
+    hist = fetch(symbol, start=state.last_date)
+    if hist is None or hist.empty:
+        PriceSeriesState.objects.filter(pk=state.pk).update(last_refresh=timezone.now())
+        return
+    if _has_corporate_action(hist):
+        print(f"[DEBUG] PriceStore: dividendo/split en {symbol}, se recarga la serie completa")
+        if _backfill(symbol, key, fetch):
+            return
+    with transaction.atomic():
+        _upsert_bars(key, hist)
+        _save_state(key)
+    print(f"[DEBUG] PriceStore: refresco incremental de {symbol} con {len(hist)} barras")
+
+
+def _load_history(key: str) -> Optional[HistorySeries]:
+    rows = (
+        PriceBar.objects.filter(symbol=key)
+        .order_by('date')
+        .values_list('date', 'open', 'high', 'low', 'close', 'volume')
+    )
+    return HistorySeries.from_rows(rows)
+
+
+def get_history(symbol: str, fetch: HistoryFetcher) -> Optional[HistorySeries]:
+    """
+    Devuelve el histórico diario del símbolo desde el almacén local.
+    La primera vez descarga la serie completa; después solo pide las barras
+    posteriores a la última almacenada, y nada si se refrescó hace poco.
+    Cuando llegan barras nuevas se actualizan también las estadísticas móviles.
+    """
+    key = _store_key(symbol)
+    try:
+        state = PriceSeriesState.objects.filter(symbol=key).first()
+        changed = False
+        if state is None:
+            if not _backfill(symbol, key, fetch):
+                return None
+            changed = True
+        elif timezone.now() - state.last_refresh >= timedelta(seconds=settings.PRICE_STORE_REFRESH_SECONDS):
+            _refresh(symbol, key, state, fetch)
+            changed = True
+        history = _load_history(key)
+    except DatabaseError as e:
+        # Si la base de datos no está disponible se sirve directamente del proveedor
+        print(f"[API] Error en el almacén de precios para {symbol}: {e}")
+        return HistorySeries.from_frame(fetch(symbol))
+
+    if changed and history is not None:
+        # Las estadísticas móviles solo avanzan con las barras nuevas; si fallan se sirve igual el histórico
+        try:
+            rolling.update(key, history)
+        except DatabaseError as e:
+            print(f"[API] Error actualizando estadísticas móviles de {symbol}: {e}")
+    return history
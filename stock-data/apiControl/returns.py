@@ -0,0 +1,213 @@
+# apiControl/returns.py
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .history import HistorySeries
+
+
+def _round(value: float) -> float:
+    return round(float(value), 2)
+
+
+def annual_returns_many(histories: Mapping[str, Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Rentabilidades por año natural y CAGR de varios símbolos en una sola pasada.
+
+    Todas las series se concatenan en un único array ordenado por (símbolo, fecha) y los
+    límites de cada grupo (símbolo, año) se localizan por búsqueda binaria, así que el
+    primer y el último precio de cada año salen de indexar con esos límites, sin recorrer
+    las filas en Python. Devuelve el mismo formato que calculateAnnualReturns (None para
+    los símbolos sin histórico).
+    """
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    series = {}
+    for symbol, data in histories.items():
+        coerced = HistorySeries.coerce(data)
+        if coerced is None:
+            results[symbol] = None
+        else:
+            series[symbol] = coerced
+    if not series:
+        return results
+
+    symbols = list(series)
+    lengths = np.fromiter((len(series[s]) for s in symbols), dtype=np.int64, count=len(symbols))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    dates = np.concatenate([series[s].dates for s in symbols])
+    prices = np.concatenate([series[s].close for s in symbols])
+
+    # Límites de grupo (símbolo, año): posición del primer dato de cada 1 de enero por
+    # búsqueda binaria, sin convertir cada fecha a año
+    bounds = []
+    for i, symbol in enumerate(symbols):
+        symbol_dates = series[symbol].dates
+        first_year, last_year = symbol_dates[[0, -1]].astype('datetime64[Y]')
+        new_years = np.arange(first_year + 1, last_year + 1).astype('datetime64[D]')
+        bounds.append(offsets[i] + np.searchsorted(symbol_dates, new_years))
+        bounds.append(offsets[i:i + 1])
+    starts = np.unique(np.concatenate(bounds))  # Un año sin datos no forma grupo
+    ends = np.concatenate((starts[1:], [len(prices)])) - 1
+    years = dates[starts].astype('datetime64[Y]').astype(np.int64) + 1970
+    first, last = prices[starts], prices[ends]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = (last / first - 1) * 100
+    valid = (first > 0) & (last > 0)  # Falso también para NaN
+    group_owner = np.searchsorted(offsets, starts, 'right') - 1
+    group_bounds = np.searchsorted(group_owner, np.arange(len(symbols) + 1))
+
+    # CAGR de todo el periodo: primer y último dato de cada símbolo
+    head, tail = offsets[:-1], offsets[1:] - 1
+    exact_years = (dates[tail] - dates[head]) / np.timedelta64(1, 'D') / 365.25
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        cagr = ((prices[tail] / prices[head]) ** (1 / exact_years) - 1) * 100
+    cagr_valid = (lengths >= 2) & (prices[head] > 0) & (prices[tail] > 0) & (exact_years > 0)
+
+    years_list, returns_list = years.tolist(), returns.tolist()
+    first_list, last_list = first.tolist(), last.tolist()
+    counts_list, valid_list = (ends - starts + 1).tolist(), valid.tolist()
+    date_strings = np.datetime_as_string(dates[np.concatenate((head, tail))], unit='D').tolist()
+
+    for i, symbol in enumerate(symbols):
+        annual = {}
+        for g in range(group_bounds[i], group_bounds[i + 1]):
+            if valid_list[g]:
+                annual[years_list[g]] = {
+                    'return': _round(returns_list[g]),
+                    'start_price': _round(first_list[g]),
+                    'end_price': _round(last_list[g]),
+                    'data_points': counts_list[g],
+                }
+        results[symbol] = {
+            'annual_returns': annual,
+            'cagr': _round(cagr[i]) if cagr_valid[i] else None,
+            'period_years': len(annual),
+            'total_data_points': int(lengths[i]),
+            'date_range': {
+                'start': date_strings[i],
+                'end': date_strings[len(symbols) + i],
+            },
+        }
+    return results
+
+
+def annual_returns(hist_data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Rentabilidades anuales y CAGR de un solo símbolo
+    """
+    return annual_returns_many({'': hist_data})['']
+
+
+# Periodos de la tabla de rentabilidades: etiqueta -> meses hacia atrás (None = desde el 1 de enero)
+TRAILING_PERIODS = {
+    '1M': 1,
+    '3M': 3,
+    '6M': 6,
+    'YTD': None,
+    '1Y': 12,
+    '3Y': 36,
+    '5Y': 60,
+    '10Y': 120,
+}
+# Si la serie empieza poco después del ancla (festivos), se toma su primer dato
+_ANCHOR_TOLERANCE = np.timedelta64(7, 'D')
+
+
+def _months_back(as_of: np.ndarray, months: int) -> np.ndarray:
+    """
+    Misma fecha 'months' meses antes (recortada al último día del mes, como DateOffset)
+    """
+    month = as_of.astype('datetime64[M]')
+    day = as_of - month.astype('datetime64[D]')
+    target_month = month - months
+    return np.minimum(target_month.astype('datetime64[D]') + day, (target_month + 1).astype('datetime64[D]') - 1)
+
+
+def trailing_returns_many(histories: Mapping[str, Any], now: Optional[Any] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Tabla de rentabilidades a 1M/3M/6M/YTD/1Y/3Y/5Y/10Y de varios símbolos.
+
+    El final es el último cierre de cada serie (o el último anterior a 'now') y el ancla
+    de cada periodo, el último cierre en o antes de la fecha objetivo (el 31 de diciembre
+    anterior para YTD). Todas las anclas de todos los símbolos se localizan con una única
+    búsqueda binaria sobre la clave (símbolo, fecha). Los periodos que la serie no cubre
+    quedan a None; a partir de un año se incluye además la rentabilidad anualizada.
+    """
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    series = {}
+    for symbol, data in histories.items():
+        coerced = HistorySeries.coerce(data)
+        if coerced is None:
+            results[symbol] = None
+        else:
+            series[symbol] = coerced
+    if not series:
+        return results
+
+    symbols = list(series)
+    lengths = np.fromiter((len(series[s]) for s in symbols), dtype=np.int64, count=len(symbols))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    dates = np.concatenate([series[s].dates for s in symbols])
+    prices = np.concatenate([series[s].close for s in symbols])
+
+    # Clave ordenada (símbolo, día): las series concatenadas quedan en orden creciente
+    owner = np.arange(len(symbols), dtype=np.int64)
+    key = lambda symbol_index, days: (symbol_index << 32) + days.astype(np.int64) + (1 << 31)
+    keys = key(np.repeat(owner, lengths), dates)
+
+    # Final de cada serie
+    if now is None:
+        end = offsets[1:] - 1
+    else:
+        cutoff = np.full(len(symbols), np.datetime64(pd.Timestamp(now).date(), 'D'))
+        end = np.searchsorted(keys, key(owner, cutoff), 'right') - 1
+    has_end = end >= offsets[:-1]
+    end = np.where(has_end, end, offsets[:-1])
+    as_of = dates[end]
+
+    # Fechas objetivo: una columna por periodo
+    labels = list(TRAILING_PERIODS)
+    targets = np.stack([
+        _months_back(as_of, months) if months is not None
+        else as_of.astype('datetime64[Y]').astype('datetime64[D]') - 1
+        for months in TRAILING_PERIODS.values()
+    ], axis=1)
+    anchor = np.searchsorted(keys, key(owner[:, None], targets).ravel(), 'right').reshape(targets.shape) - 1
+    first = offsets[:-1, None]
+    young = anchor < first
+    anchor = np.where(young, first, anchor)
+    covered = has_end[:, None] & (~young | (dates[first] - targets <= _ANCHOR_TOLERANCE)) & (anchor < end[:, None])
+
+    start_price, end_price = prices[anchor], prices[end][:, None]
+    days = (as_of[:, None] - dates[anchor]) / np.timedelta64(1, 'D')
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = end_price / start_price
+        cumulative = (growth - 1) * 100
+        annualized = (growth ** (365.25 / days) - 1) * 100
+    valid = covered & (start_price > 0) & (end_price > 0)
+    yearly = np.array([months is not None and months >= 12 for months in TRAILING_PERIODS.values()])
+
+    anchor_strings = np.datetime_as_string(dates[anchor], unit='D').tolist()
+    as_of_strings = np.datetime_as_string(as_of, unit='D').tolist()
+    cumulative, annualized, valid = cumulative.tolist(), annualized.tolist(), valid.tolist()
+    for i, symbol in enumerate(symbols):
+        if not has_end[i]:
+            results[symbol] = None
+            continue
+        periods = {}
+        for j, label in enumerate(labels):
+            periods[label] = {
+                'return': cumulative[i][j],
+                'annualized': annualized[i][j] if yearly[j] else None,
+                'start_date': anchor_strings[i][j],
+            } if valid[i][j] else None
+        results[symbol] = {'as_of': as_of_strings[i], 'periods': periods}
+    return results
+
+
+def trailing_returns(hist_data: Any, now: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+    """
+    Tabla de rentabilidades por periodo de un solo símbolo
+    """
+    return trailing_returns_many({'': hist_data}, now)['']
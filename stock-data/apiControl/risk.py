@@ -0,0 +1,122 @@
+# apiControl/risk.py
+import math
+import warnings
+from statistics import NormalDist
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .history import HistorySeries
+
+TRADING_DAYS = 252
+
+
+def _number(value: float, scale: float = 1.0) -> Optional[float]:
+    value = float(value) * scale
+    return value if math.isfinite(value) else None
+
+
+def risk_metrics_many(histories: Mapping[str, Any], years: Optional[float] = None,
+                      now: Optional[Any] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Métricas de riesgo de varios símbolos sobre los últimos 'years' años de cada serie
+    (RISK_LOOKBACK_YEARS por defecto), calculadas de una vez sobre una matriz
+    símbolos x barras (cada fila alineada a la izquierda y rellena con NaN):
+    volatilidad, desviación a la baja, Sharpe, Sortino, máximo drawdown y su duración,
+    y VaR diario histórico y paramétrico. Las rentabilidades y el VaR van en %.
+    """
+    years = years if years is not None else settings.RISK_LOOKBACK_YEARS
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    windows = {}
+    for symbol, data in histories.items():
+        series = HistorySeries.coerce(data)
+        if series is not None and now is not None:
+            series = series.window(end=now)
+        if series is None or len(series) < 3:
+            results[symbol] = None
+            continue
+        end = pd.Timestamp(series.dates[-1])
+        windows[symbol] = series.window(start=end - pd.DateOffset(years=years))
+    if not windows:
+        return results
+
+    symbols = list(windows)
+    width = max(len(series) for series in windows.values())
+    prices = np.full((len(symbols), width), np.nan)
+    days = np.full((len(symbols), width), np.nan)
+    for i, symbol in enumerate(symbols):
+        series = windows[symbol]
+        prices[i, :len(series)] = series.close
+        days[i, :len(series)] = series.dates.astype(np.int64)
+
+    rf_daily = (1 + settings.RISK_FREE_RATE) ** (1 / TRADING_DAYS) - 1
+    confidence = settings.RISK_VAR_CONFIDENCE
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Filas sin datos suficientes -> NaN
+
+        returns = prices[:, 1:] / prices[:, :-1] - 1
+        observations = np.count_nonzero(~np.isnan(returns), axis=1)
+        mean = np.nanmean(returns, axis=1)
+        std = np.nanstd(returns, axis=1, ddof=1)
+        downside = np.sqrt(np.nanmean(np.minimum(returns - rf_daily, 0) ** 2, axis=1))
+
+        annual_excess = (mean - rf_daily) * TRADING_DAYS
+        volatility = std * math.sqrt(TRADING_DAYS)
+        downside_deviation = downside * math.sqrt(TRADING_DAYS)
+        sharpe = annual_excess / volatility
+        sortino = annual_excess / downside_deviation
+
+        # Drawdown respecto al máximo previo y tiempo desde el último máximo
+        peaks = np.fmax.accumulate(prices, axis=1)
+        max_drawdown = np.nanmin(prices / peaks - 1, axis=1)
+        positions = np.where(prices >= peaks, np.arange(width), 0)
+        last_peak = np.maximum.accumulate(positions, axis=1)
+        underwater = days - np.take_along_axis(days, last_peak, axis=1)
+        max_drawdown_days = np.nanmax(underwater, axis=1)
+
+        var_historical = -np.nanpercentile(returns, (1 - confidence) * 100, axis=1)
+        var_parametric = -(mean + NormalDist().inv_cdf(1 - confidence) * std)
+
+    for i, symbol in enumerate(symbols):
+        if observations[i] < 2:
+            results[symbol] = None
+            continue
+        series = windows[symbol]
+        results[symbol] = {
+            'volatility': _number(volatility[i], 100),
+            'daily_volatility': _number(std[i], 100),
+            'downside_deviation': _number(downside_deviation[i], 100),
+            'sharpe': _number(sharpe[i]),
+            'sortino': _number(sortino[i]),
+            'max_drawdown': _number(max_drawdown[i], 100),
+            'max_drawdown_days': int(max_drawdown_days[i]),
+            'var_historical': _number(var_historical[i], 100),
+            'var_parametric': _number(var_parametric[i], 100),
+            'confidence': confidence,
+            'observations': int(observations[i]),
+            'data_points': len(series),
+            'start_date': str(series.dates[0]),
+            'end_date': str(series.dates[-1]),
+            'years': years,
+        }
+    return results
+
+
+def risk_metrics(hist_data: Any, years: Optional[float] = None, now: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+    return risk_metrics_many({'': hist_data}, years, now)['']
+
+
+def volatility_summary(metrics: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Formato clásico de getAnualVolatility a partir de las métricas de riesgo a un año
+    """
+    if not metrics or metrics['volatility'] is None:
+        return None
+    return {
+        'volatility': metrics['volatility'],
+        'daily_volatility': metrics['daily_volatility'],
+        'period': '1y',
+        'data_points': metrics['data_points'],
+    }
@@ -0,0 +1,145 @@
+# apiControl/rolling.py
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .history import HistorySeries
+from .models import RollingStat, RollingState
+
+# Rentabilidades mínimas en la ventana para guardar una fila
+MIN_PERIODS = 20
+TRADING_DAYS = 252
+
+
+def _finite(value: float) -> Optional[float]:
+    return value if math.isfinite(value) else None
+
+
+def _restore(state: Optional[RollingState], series: HistorySeries, window: int) -> Optional[int]:
+    """
+    Posición en la serie del punto de control guardado, o None si el estado no sirve:
+    otra ventana, la fecha ya no está o su cierre cambió (dividendo o split que
+    reajustó los precios anteriores)
+    """
+    if state is None or state.window != window:
+        return None
+    day = np.datetime64(state.last_date, 'D')
+    pos = int(np.searchsorted(series.dates, day))
+    if pos >= len(series) or series.dates[pos] != day:
+        return None
+    if not math.isclose(float(series.close[pos]), state.last_close, rel_tol=1e-9):
+        return None
+    return pos
+
+
+def update(symbol: str, series: HistorySeries) -> int:
+    """
+    Actualiza las estadísticas móviles guardadas del símbolo con las barras nuevas de
+    la serie: media y volatilidad anualizada de las rentabilidades diarias y
+    rentabilidad acumulada de las últimas ROLLING_WINDOW barras, y caída desde el
+    máximo histórico.
+
+    El estado guarda las sumas de rentabilidades y de sus cuadrados dentro de la
+    ventana, así que cada barra nueva cuesta O(1): se suma la rentabilidad que entra
+    y se resta la que sale. El punto de control es la penúltima barra, porque la
+    última se vuelve a pedir en cada refresco del almacén (pudo guardarse con la
+    sesión abierta) y por eso se recalcula siempre. Si la serie ya no coincide con
+    el punto de control se recalcula todo. Devuelve el número de barras procesadas.
+    """
+    window = settings.ROLLING_WINDOW
+    closes = series.close
+    size = len(series)
+    if size < 2:
+        return 0
+
+    state = RollingState.objects.filter(symbol=symbol).first()
+    checkpoint = _restore(state, series, window)
+    if checkpoint is None:
+        start, count, total, squares, peak = 0, 0, 0.0, 0.0, float(closes[0])
+    else:
+        start = checkpoint + 1
+        count, total, squares, peak = state.count, state.sum_returns, state.sum_squares, state.peak
+
+    rows = []
+    saved = None
+    for pos in range(start, size):
+        close = float(closes[pos])
+        if pos > 0:
+            change = close / float(closes[pos - 1]) - 1
+            total += change
+            squares += change * change
+            count += 1
+            if count > window:
+                # Sale de la ventana la rentabilidad de hace 'window' barras
+                leaving = float(closes[pos - window]) / float(closes[pos - window - 1]) - 1
+                total -= leaving
+                squares -= leaving * leaving
+                count = window
+        peak = max(peak, close)
+
+        if count >= MIN_PERIODS:
+            variance = max((squares - total * total / count) / (count - 1), 0.0)
+            rows.append(RollingStat(
+                symbol=symbol,
+                date=series.dates[pos].item(),
+                mean_return=_finite(total / count * 100),
+                volatility=_finite(math.sqrt(variance * TRADING_DAYS) * 100),
+                rolling_return=_finite((close / float(closes[pos - count]) - 1) * 100),
+                drawdown=_finite((close / peak - 1) * 100),
+            ))
+        if pos == size - 2:
+            saved = (pos, count, total, squares, peak)
+
+    with transaction.atomic():
+        if checkpoint is None:
+            RollingStat.objects.filter(symbol=symbol).delete()
+        RollingStat.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['symbol', 'date'],
+            update_fields=['mean_return', 'volatility', 'rolling_return', 'drawdown'],
+            batch_size=1000,
+        )
+        if saved is not None:
+            pos, count, total, squares, peak = saved
+            RollingState.objects.update_or_create(
+                symbol=symbol,
+                defaults={
+                    'window': window,
+                    'last_date': series.dates[pos].item(),
+                    'last_close': float(closes[pos]),
+                    'count': count,
+                    'sum_returns': total,
+                    'sum_squares': squares,
+                    'peak': peak,
+                },
+            )
+    processed = size - start
+    print(f"[DEBUG] Rolling: {symbol} {'recalculado' if checkpoint is None else 'actualizado'} con {processed} barras")
+    return processed
+
+
+def chart_series(symbol: str) -> Optional[Dict[str, Any]]:
+    """
+    Series guardadas de estadísticas móviles del símbolo para los gráficos
+    (None si todavía no hay ninguna)
+    """
+    rows = list(
+        RollingStat.objects.filter(symbol=symbol.strip().upper())
+        .order_by('date')
+        .values_list('date', 'mean_return', 'volatility', 'rolling_return', 'drawdown')
+    )
+    if not rows:
+        return None
+    dates, mean_return, volatility, rolling_return, drawdown = zip(*rows)
+    return {
+        'window': settings.ROLLING_WINDOW,
+        'dates': [d.isoformat() for d in dates],
+        'mean_return': list(mean_return),
+        'volatility': list(volatility),
+        'rolling_return': list(rolling_return),
+        'drawdown': list(drawdown),
+    }
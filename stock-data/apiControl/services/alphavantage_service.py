@@ -1,7 +1,7 @@
 # apiManager/services/alpha_vantage_service.py
-import requests
 from typing import Dict, Any
 from django.conf import settings
+from apiControl.services import http_client
 
 class AlphaVantageService:
     def __init__(self):
@@ -19,10 +19,24 @@ class AlphaVantageService:
                 'symbol': symbol,
                 'apikey': self.api_key
             }
-            response = requests.get(self.base_url, params=params)
+            response = http_client.get('alphavantage', self.base_url, params=params)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             # Log del error
             return {}
-        
\ No newline at end of file
+
+    async def agetHistoricalProfit(self, symbol: str, timeframe: str) -> Dict[str, Any]:
+        """
+        Obtiene datos históricos (backup de YFinance), versión asíncrona
+        """
+        try:
+            params = {
+                'function': 'TIME_SERIES_DAILY',
+                'symbol': symbol,
+                'apikey': self.api_key
+            }
+            return await http_client.aget_json(self.base_url, params=params)
+        except Exception as e:
+            # Log del error
+            return {}
@@ -1,43 +1,66 @@
 # apiManager/services/eodhd_service.py
-import requests
-from typing import Dict, Any
+from typing import Dict, Any, List
 from django.conf import settings
+from apiControl.services import http_client
 
 class EODHDService:
     def __init__(self):
         self.api_key = settings.EODHD_API_KEY
         self.base_url = "https://eodhd.com/api"
 
+    @staticmethod
+    def _formatSearchResults(data: Any) -> Dict[str, Any]:
+        # Convertimos la respuesta al mismo formato que YFinance
+        formatted_results = []
+        for item in data:
+            formatted_item = {
+                'symbol': item.get('Code', ''),
+                'shortname': item.get('Name', ''),
+                'longname': item.get('Name', ''),
+                'exchange': item.get('Exchange', ''),
+                'type': item.get('Type', ''),
+                'score': item.get('Score', 0)
+            }
+            formatted_results.append(formatted_item)
+        return {
+            'quotes': formatted_results,
+            'count': len(formatted_results)
+        }
+
     def getSearchData(self, query: str) -> Dict[str, Any]:
         """
         Búsqueda de fondos (backup)
         """
         try:
             url = f"{self.base_url}/search/{query}?api_token={self.api_key}"
-            response = requests.get(url)
+            response = http_client.get('eodhd', url)
             response.raise_for_status()
-            data = response.json()
-            
-            # Convertimos la respuesta al mismo formato que YFinance
-            formatted_results = []
-            for item in data:
-                formatted_item = {
-                    'symbol': item.get('Code', ''),
-                    'shortname': item.get('Name', ''),
-                    'longname': item.get('Name', ''),
-                    'exchange': item.get('Exchange', ''),
-                    'type': item.get('Type', ''),
-                    'score': item.get('Score', 0)
-                }
-                formatted_results.append(formatted_item)
-            return {
-                'quotes': formatted_results,
-                'count': len(formatted_results)
-            }
+            return self._formatSearchResults(response.json())
+        except Exception as e:
+            # Log del error
+            return {'quotes': [], 'count': 0}
+
+    async def agetSearchData(self, query: str) -> Dict[str, Any]:
+        """
+        Búsqueda de fondos (backup), versión asíncrona
+        """
+        try:
+            data = await http_client.aget_json(f"{self.base_url}/search/{query}", params={'api_token': self.api_key})
+            return self._formatSearchResults(data)
         except Exception as e:
             # Log del error
             return {'quotes': [], 'count': 0}
         
+    def getExchangeSymbols(self, exchange: str) -> List[Dict[str, Any]]:
+        """
+        Listado completo de símbolos de una bolsa (Code, Name, Country, Exchange,
+        Currency, Type, Isin) para sincronizar el catálogo local
+        """
+        url = f"{self.base_url}/exchange-symbol-list/{exchange}"
+        response = http_client.get('eodhd', url, params={'api_token': self.api_key, 'fmt': 'json'})
+        response.raise_for_status()
+        return response.json()
+
     def getCategorySector(self, symbol: str) -> Dict[str, Any]:
         # TODO: Implementar
         return None
@@ -48,7 +71,7 @@ class EODHDService:
         """
         try:
             url = f"{self.base_url}/compare/{symbol1},{symbol2}?api_token={self.api_key}"
-            response = requests.get(url)
+            response = http_client.get('eodhd', url)
             response.raise_for_status()
         except Exception as e:
             # Log del error
@@ -60,7 +83,7 @@ class EODHDService:
         """
         try:
             url = f"{self.base_url}/fund/{symbol}?api_token={self.api_key}"
-            response = requests.get(url)
+            response = http_client.get('eodhd', url)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -1,8 +1,8 @@
 # apiManager/services/fmp_service.py
-import requests
 from typing import Dict, List, Any
 from django.conf import settings
 from apiControl.exceptions.apiException import APIError
+from apiControl.services import http_client
 
 class FMPService:
     def __init__(self):
@@ -15,24 +15,45 @@ class FMPService:
         return None
     
 
+    @staticmethod
+    def _parseCommissions(data: Any) -> Dict[str, Any]:
+        if isinstance(data, list) and len(data) > 0:
+            fund_data = data[0]
+            return {
+                'expense_ratio': fund_data.get('expenseRatio'),
+                'total_assets': fund_data.get('totalAssets'),
+                'ytd_return': fund_data.get('ytd'),
+                'inception_date': fund_data.get('inceptionDate'),
+                'fund_family': fund_data.get('fundFamily')
+            }
+        return None
+
+    @staticmethod
+    def _parseCategorySector(symbol: str, data: Any) -> Dict[str, Any]:
+        if not data or "category" not in data[0]:
+            raise APIError("No se encontró categoría/sector en la respuesta de FMP")
+
+        return {
+            "symbol": symbol,
+            "category": data[0]["category"]
+        }
+
     def getCommissions(self, symbol: str) -> Dict[str, Any]:
         url = f"https://financialmodelingprep.com/api/v3/etf-info/{symbol}?apikey={self.api_key}"
     
         try:
-            response = requests.get(url)
+            response = http_client.get('fmp', url)
             response.raise_for_status()
-            data = response.json()
-            
-            if isinstance(data, list) and len(data) > 0:
-                fund_data = data[0]
-                return {
-                    'expense_ratio': fund_data.get('expenseRatio'),
-                    'total_assets': fund_data.get('totalAssets'),
-                    'ytd_return': fund_data.get('ytd'),
-                    'inception_date': fund_data.get('inceptionDate'),
-                    'fund_family': fund_data.get('fundFamily')
-                }
+            return self._parseCommissions(response.json())
+        except Exception as e:
+            print(f"Error al obtener comisiones: {e}")
             return None
+
+    async def agetCommissions(self, symbol: str) -> Dict[str, Any]:
+        url = f"{self.base_url}/etf-info/{symbol}"
+        try:
+            data = await http_client.aget_json(url, params={'apikey': self.api_key})
+            return self._parseCommissions(data)
         except Exception as e:
             print(f"Error al obtener comisiones: {e}")
             return None
@@ -41,17 +62,16 @@ class FMPService:
         try:
 
             url = f"https://financialmodelingprep.com/api/v3/etf-info?symbol={symbol}&apikey={self.api_key}"
-            response = requests.get(url)
-            data = response.json()
-
-            if not data or "category" not in data[0]:
-                raise APIError("No se encontró categoría/sector en la respuesta de FMP")
+            response = http_client.get('fmp', url)
+            return self._parseCategorySector(symbol, response.json())
 
-            return {
-                "symbol": symbol,
-                "category": data[0]["category"]
-            }
+        except Exception as e:
+            raise APIError(f"Error al obtener categoría/sector desde FMP: {e}")
 
+    async def agetCategorySector(self, symbol: str) -> Dict[str, Any]:
+        try:
+            response = await http_client.aget(f"{self.base_url}/etf-info", params={'symbol': symbol, 'apikey': self.api_key})
+            return self._parseCategorySector(symbol, response.json())
         except Exception as e:
             raise APIError(f"Error al obtener categoría/sector desde FMP: {e}")
 
@@ -0,0 +1,134 @@
+# apiControl/services/http_client.py
+import asyncio
+import random
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from apiControl import concurrency
+
+# Respuestas que se reintentan: límite de peticiones y errores del servidor
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Una sesión por proveedor ('fmp', 'eodhd', 'alphavantage'...) con su propio pool de conexiones
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+# Cliente asíncrono único; httpx no permite usarlo desde varios loops, así que vive en el
+# loop compartido de apiControl.concurrency y todas las peticiones pasan por él
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _timeout():
+    return (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """
+    Espera antes del reintento 'attempt' (empezando en 0): exponencial con jitter completo
+    """
+    ceiling = min(settings.HTTP_BACKOFF_MAX, settings.HTTP_BACKOFF_FACTOR * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=settings.HTTP_MAX_RETRIES,
+        connect=settings.HTTP_MAX_RETRIES,
+        read=settings.HTTP_MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+        backoff_jitter=settings.HTTP_BACKOFF_FACTOR,
+        backoff_max=settings.HTTP_BACKOFF_MAX,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(provider: str) -> requests.Session:
+    """
+    Sesión compartida del proveedor: mantiene las conexiones abiertas (keep-alive)
+    entre llamadas y limita cuántas hay a la vez
+    """
+    session = _sessions.get(provider)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _sessions[provider] = _build_session()
+    return session
+
+
+def get(provider: str, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> requests.Response:
+    """
+    GET sobre la sesión del proveedor con tiempos de espera de conexión y lectura, y
+    reintentos con espera exponencial ante 429/5xx, fallos de conexión y tiempos de
+    espera agotados (los GET son idempotentes)
+    """
+    kwargs.setdefault('timeout', _timeout())
+    return get_session(provider).get(url, params=params, **kwargs)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Cliente HTTP asíncrono compartido por todos los proveedores y todas las peticiones.
+    Solo debe usarse desde el loop compartido (aget ya se encarga de ello): con
+    runserver/WSGI cada vista asíncrona tiene su propio loop y un cliente por loop no
+    reutilizaría conexiones entre peticiones ni se cerraría nunca.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.ASYNC_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _async_client
+
+
+async def _aget(url: str, params: Optional[Dict[str, Any]]) -> httpx.Response:
+    client = get_async_client()
+    for attempt in range(settings.HTTP_MAX_RETRIES + 1):
+        last_attempt = attempt == settings.HTTP_MAX_RETRIES
+        try:
+            response = await client.get(url, params=params)
+        except httpx.TransportError:  # Conexión, lectura y tiempos de espera, como get()
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+        await asyncio.sleep(_backoff_delay(attempt))
+
+
+async def aget(url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+    """
+    GET asíncrono con la misma política de reintentos que get(), sobre el cliente
+    compartido del loop de larga duración (las conexiones se reutilizan entre peticiones
+    tanto con ASGI como con runserver/WSGI)
+    """
+    return await concurrency.run_shared(_aget(url, params))
+
+
+async def aget_json(url: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    response = await aget(url, params=params)
+    response.raise_for_status()
+    return response.json()
@@ -3,33 +3,50 @@ import yfinance as yf
 import pandas as pd
 from typing import Dict, Optional, Any, List
 from datetime import datetime
+from django.conf import settings
+
+from apiControl import catalog, price_store, returns, risk, snapshot
+from apiControl.history import HistorySeries
+from apiControl.services import yfinance_session
 
 class YFinanceService:
+    # Campos de Yahoo que se devuelven en las búsquedas y su nombre en la aplicación
+    SEARCH_COLUMNS = {
+        'symbol': 'symbol',
+        'longName': 'name',
+        'sector': 'sector',
+        '52WeekChange': 'return1y',
+        'expenseRatio': 'fees',
+        'category': 'benchmark',
+        'regularMarketPrice': 'price',
+        'regularMarketChangePercent': 'change_percent',
+        'regularMarketVolume': 'volume'
+    }
+    QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+
     def __init__(self):
         # Configuración inicial si es necesaria
         pass
 
+    @staticmethod
+    def getInfo(symbol: str) -> Dict[str, Any]:
+        """
+        Obtiene el 'info' del ticker desde la instantánea compartida (una descarga por
+        petición y, entre peticiones, mientras no caduque el TTL)
+        """
+        return snapshot.get_info(symbol, lambda: yfinance_session.call(lambda: yfinance_session.ticker(symbol).info))
+
     @staticmethod
     def getSearchData(symbol: str) -> List[Dict[str, Any]]:
         try:
             # Obtener datos usando yfinance
-            fund = yf.Ticker(symbol)
+            info = YFinanceService.getInfo(symbol)
             
             # Convertir la información a DataFrame
-            info_df = pd.DataFrame([fund.info])
+            info_df = pd.DataFrame([info])
             
             # Definir las columnas que queremos y sus valores por defecto
-            columns_mapping = {
-                'symbol': 'symbol',
-                'longName': 'name',
-                'sector': 'sector',
-                '52WeekChange': 'return1y',
-                'expenseRatio': 'fees',
-                'category': 'benchmark',
-                'regularMarketPrice': 'price',
-                'regularMarketChangePercent': 'change_percent',
-                'regularMarketVolume': 'volume'
-            }
+            columns_mapping = YFinanceService.SEARCH_COLUMNS
             
             # Crear un DataFrame con las columnas que existen
             available_columns = [col for col in columns_mapping.keys() if col in info_df.columns]
@@ -56,143 +73,102 @@ class YFinanceService:
             raise  # Re-lanzamos la excepción para manejarla en la vista
 
     @staticmethod
-    def getHistoricalProfit(symbol: str) -> Optional[Dict[str, Any]]:
-        print(f"[DEBUG] getHistoricalProfit llamado para: {symbol}")
+    def getBatchSearchData(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Datos de búsqueda de varios símbolos en una sola petición al endpoint de
+        cotizaciones de Yahoo. Devuelve {símbolo: datos} solo con los encontrados.
+
+        Las cotizaciones no traen '52WeekChange', 'expenseRatio' ni 'category': la
+        rentabilidad a un año sale de 'fiftyTwoWeekChangePercent' (en la misma escala que
+        en getSearchData) y la categoría del catálogo local. Las comisiones no están en
+        el lote y esas filas se quedan sin ellas.
+        """
+        if not symbols:
+            return {}
+        data = yfinance_session.get_json(YFinanceService.QUOTE_URL, params={'symbols': ','.join(symbols)})
+        quotes = (data.get('quoteResponse') or {}).get('result') or []
+
+        results = {}
+        for quote in quotes:
+            result = {
+                name: quote[field]
+                for field, name in YFinanceService.SEARCH_COLUMNS.items()
+                if quote.get(field) is not None
+            }
+            if quote.get('fiftyTwoWeekChangePercent') is not None:
+                # En porcentaje; '52WeekChange' del 'info' es una fracción
+                result['return1y'] = quote['fiftyTwoWeekChangePercent'] / 100
+            if result.get('symbol'):
+                results[result['symbol']] = result
+
+        for symbol, fund in catalog.resolve_many(results).items():
+            if fund.benchmark and symbol in results:
+                results[symbol].setdefault('benchmark', fund.benchmark)
+        print(f"[DEBUG] getBatchSearchData: {len(results)}/{len(symbols)} símbolos en una petición")
+        return results
+
+    @staticmethod
+    def downloadHistory(symbol: str, start=None) -> Optional[pd.DataFrame]:
+        """
+        Descarga barras diarias desde yfinance: la serie completa o, si se indica 'start',
+        solo las barras a partir de esa fecha
+        """
+        if start is not None:
+            try:
+                return yfinance_session.call(lambda: yfinance_session.ticker(symbol).history(
+                    start=start, timeout=settings.HTTP_READ_TIMEOUT, raise_errors=True))
+            except Exception as e:
+                print(f"Error al obtener datos desde {start} para {symbol}: {str(e)}")
+                return None
+
         # Asignamos un timeframe por defecto (se probará con 10 y con 5 años)
         timeframes = ["10y", "5y"]
 
         for timeframe in timeframes:
             try:
-                fund = yf.Ticker(symbol)
-                hist = fund.history(period=timeframe)
-                # print(f"[DEBUG] getHistoricalProfit: timeframe={timeframe}, datos={len(hist)} filas")
+                fund = yfinance_session.ticker(symbol)
+                hist = yfinance_session.call(lambda: fund.history(
+                    period=timeframe, timeout=settings.HTTP_READ_TIMEOUT, raise_errors=True))
                 # Verificar que tenemos datos
                 if not hist.empty:
-                    return {
-                        'dates': hist.index.tolist(),
-                        'prices': hist['Close'].tolist(),
-                        'open': hist['Open'].tolist(),
-                        'high': hist['High'].tolist(),
-                        'low': hist['Low'].tolist(),
-                        'close': hist['Close'].tolist(),
-                        'volumes': hist['Volume'].tolist()
-                    }
+                    return hist
             except Exception as e:
                 print(f"Error al obtener datos con timeframe {timeframe}: {str(e)}")
                 continue
         print(f"No se pudieron obtener datos para {symbol} con ninguno de los timeframes: {timeframes}")
         return None
+
+    @staticmethod
+    def getHistoricalProfit(symbol: str) -> Optional[HistorySeries]:
+        print(f"[DEBUG] getHistoricalProfit llamado para: {symbol}")
+        # Se sirve desde el almacén local de precios, que solo descarga las barras que faltan
+        return price_store.get_history(symbol, YFinanceService.downloadHistory)
         
     @staticmethod
-    def calculateAnnualReturns(historical_data: Dict[str, Any]) -> Dict[str, Any]:
-        print(f"[DEBUG] calculateAnnualReturns llamado")
-        print(f"[DEBUG] calculateAnnualReturns recibió: {type(historical_data)}")
-        if historical_data:
-            print(f"[DEBUG] calculateAnnualReturns keys: {list(historical_data.keys()) if isinstance(historical_data, dict) else 'No es dict'}")
+    def calculateAnnualReturns(historical_data: Any) -> Optional[Dict[str, Any]]:
+        """
+        Rentabilidad de cada año natural (primer y último cierre del año) y CAGR del periodo
+        """
         try:
-            if not historical_data or 'dates' not in historical_data or 'prices' not in historical_data:
+            result = returns.annual_returns(historical_data)
+            if result is None:
                 print("[DEBUG] calculateAnnualReturns: datos históricos vacíos o incompletos")
                 return None
-            
-            # Crear DataFrame con los datos históricos
-            df = pd.DataFrame({
-                'date': pd.to_datetime(historical_data['dates']),
-                'price': historical_data['prices']
-            })
-            
-            # Ordenar por fecha
-            df = df.sort_values('date')
-            
-            # Calcular rentabilidades anuales
-            annual_returns = {}
-            
-            # Agrupar por año
-            df['year'] = df['date'].dt.year
-            years = df['year'].unique()
-            
-            for year in years:
-                year_data = df[df['year'] == year]
-                if len(year_data) > 0:
-                    start_price = year_data.iloc[0]['price']
-                    end_price = year_data.iloc[-1]['price']
-                    
-                    # Verificar que los precios son válidos
-                    if start_price > 0 and end_price > 0:
-                        annual_return = ((end_price / start_price) - 1) * 100
-                        annual_returns[year] = {
-                            'return': round(annual_return, 2),
-                            'start_price': round(start_price, 2),
-                            'end_price': round(end_price, 2),
-                            'data_points': len(year_data)
-                        }
-                        print(f"[DEBUG] Año {year}: start={start_price}, end={end_price}, return={annual_returns[year]['return']}%")
-            
-            # Calcular CAGR de todo el período
-            if len(df) >= 2:
-                start_price = df.iloc[0]['price']
-                end_price = df.iloc[-1]['price']
-                
-                if start_price > 0 and end_price > 0:
-                    # Calcular años exactos entre el primer y último dato
-                    days_between = (df.iloc[-1]['date'] - df.iloc[0]['date']).days
-                    exact_years = days_between / 365.25
-                    
-                    if exact_years > 0:
-                        cagr = ((end_price / start_price) ** (1/exact_years) - 1) * 100
-                    else:
-                        cagr = None
-                else:
-                    cagr = None
-            else:
-                cagr = None
-            print(f"[DEBUG] CAGR calculado: {round(cagr,2) if cagr is not None else None}%")
-            return {
-                'annual_returns': annual_returns,
-                'cagr': round(cagr, 2) if cagr is not None else None,
-                'period_years': len(annual_returns),
-                'total_data_points': len(df),
-                'date_range': {
-                    'start': df.iloc[0]['date'].strftime('%Y-%m-%d'),
-                    'end': df.iloc[-1]['date'].strftime('%Y-%m-%d')
-                }
-            }
-            
+            print(f"[DEBUG] calculateAnnualReturns: {result['period_years']} años, CAGR {result['cagr']}%")
+            return result
         except Exception as e:
             print(f"Error al calcular rentabilidades anuales: {str(e)}")
             return None
-        
+
     @staticmethod
     def getAnualVolatility(symbol: str) -> Optional[Dict[str, Any]]:
         """
-        Obtiene la volatilidad del fondo durante el último año
+        Obtiene la volatilidad del fondo durante el último año, sobre el histórico del
+        almacén local de precios (sin una descarga propia)
         """
         try:
-            fund = yf.Ticker(symbol)
-            
-            # Obtener datos históricos del último año
-            hist = fund.history(period="1y")
-            
-            if hist.empty:
-                return None
-            
-            # Calcular retornos diarios
-            hist['Returns'] = hist['Close'].pct_change()
-            
-            # Calcular volatilidad anual (desviación estándar de retornos * sqrt(252))
-            # 252 es el número aproximado de días de trading en un año
-            daily_volatility = hist['Returns'].std()
-            annual_volatility = daily_volatility * (252 ** 0.5)
-            
-            # Convertir a porcentaje
-            annual_volatility_percent = annual_volatility * 100
-            
-            return {
-                'volatility': annual_volatility_percent,
-                'daily_volatility': daily_volatility * 100,
-                'period': '1y',
-                'data_points': len(hist)
-            }
-            
+            history = YFinanceService.getHistoricalProfit(symbol)
+            return risk.volatility_summary(risk.risk_metrics(history, years=1))
         except Exception as e:
             print(f"Error al calcular volatilidad para {symbol}: {str(e)}")
             return None
@@ -201,8 +177,7 @@ class YFinanceService:
     def getCategorySector(symbol: str) -> Optional[Dict[str, str]]:
         
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            info = YFinanceService.getInfo(symbol)
 
             '''
             # Determinar si es ETF o acción
@@ -248,8 +223,7 @@ class YFinanceService:
         Obtiene la capitalización de mercado del fondo/empresa
         """
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            info = YFinanceService.getInfo(symbol)
             
             market_cap = info.get('marketCap')
             
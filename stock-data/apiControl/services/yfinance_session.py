@@ -0,0 +1,62 @@
+# apiControl/services/yfinance_session.py
+import threading
+from typing import Any, Callable, Optional
+
+import yfinance as yf
+from curl_cffi import requests as curl_requests
+from django.conf import settings
+from yfinance.data import YfData
+
+# Sesión curl_cffi compartida por todo el proceso: una sola cookie y un solo crumb
+_session: Optional[curl_requests.Session] = None
+_lock = threading.Lock()
+
+# Mensajes con los que yfinance informa de un crumb o una cookie caducados
+_AUTH_ERRORS = ('401', 'Unauthorized', 'Invalid Crumb', 'Invalid Cookie')
+
+
+def get_session() -> curl_requests.Session:
+    """
+    Devuelve la sesión compartida y la registra en YfData (el singleton de yfinance que
+    guarda cookie y crumb), de modo que todos los Ticker usan las mismas conexiones.
+    La renovación de la cookie y el crumb la hace el propio YfData cuando Yahoo los rechaza.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = curl_requests.Session(impersonate="chrome")
+                YfData(session=session)
+                _session = session
+    return _session
+
+
+def ticker(symbol: str) -> yf.Ticker:
+    """
+    Ticker de yfinance sobre la sesión compartida
+    """
+    return yf.Ticker(symbol, session=get_session())
+
+
+def get_json(url: str, params: Optional[dict] = None) -> Any:
+    """
+    Petición directa a la API de Yahoo con la sesión, la cookie y el crumb compartidos
+    (para los endpoints que yfinance no expone, como las cotizaciones de varios símbolos)
+    """
+    get_session()
+    return call(lambda: YfData().get_raw_json(url, params=params, timeout=settings.HTTP_READ_TIMEOUT))
+
+
+def call(fn: Callable[[], Any]) -> Any:
+    """
+    Ejecuta una llamada a yfinance y la repite una vez si falla por un crumb o cookie
+    caducados, cuando YfData ya ha renovado la sesión. .history() solo informa de esos
+    fallos con raise_errors=True; sin él devuelve un DataFrame vacío igual que sin datos.
+    """
+    try:
+        return fn()
+    except Exception as e:
+        if not any(marker in str(e) for marker in _AUTH_ERRORS):
+            raise
+        print(f"[API] Error de autenticación en yfinance, se repite la llamada: {e}")
+        return fn()
@@ -0,0 +1,202 @@
+# apiControl/similarity.py
+import math
+from functools import partial
+from itertools import groupby
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import concurrency, price_store, returns, risk
+from .history import HistorySeries
+from .models import Fund, FundProfile, PriceBar, PriceSeriesState
+
+# Características del perfil: (origen, periodo/clave, campo)
+FEATURES = (
+    ('trailing', '6M', 'return'),
+    ('trailing', '1Y', 'return'),
+    ('trailing', '3Y', 'annualized'),
+    ('risk', 'volatility', None),
+    ('risk', 'downside_deviation', None),
+    ('risk', 'max_drawdown', None),
+    ('risk', 'sharpe', None),
+)
+# Filas de la matriz de distancias que se calculan a la vez
+_BLOCK = 1024
+
+
+def _value(value: Optional[float]) -> float:
+    return value if value is not None else np.nan
+
+
+def profile_features(histories: Mapping[str, Any], now: Optional[Any] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Matriz símbolos x FEATURES a partir de los históricos, con las rentabilidades por
+    periodo y las métricas de riesgo de todos calculadas en pasadas vectorizadas únicas.
+    Quedan fuera los símbolos sin al menos un año de datos (NaN en lo que no cubren).
+    """
+    trailing = returns.trailing_returns_many(histories, now)
+    risk_metrics = risk.risk_metrics_many(histories, now=now)
+    symbols, rows = [], []
+    for symbol in histories:
+        periods = (trailing.get(symbol) or {}).get('periods') or {}
+        metrics = risk_metrics.get(symbol)
+        if not metrics or not periods.get('1Y'):
+            continue
+        row = []
+        for source, key, field in FEATURES:
+            if source == 'trailing':
+                row.append(_value(periods[key][field]) if periods.get(key) else np.nan)
+            else:
+                row.append(_value(metrics[key]))
+        symbols.append(symbol)
+        rows.append(row)
+    return symbols, np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURES))
+
+
+def normalize(features: np.ndarray) -> np.ndarray:
+    """
+    Puntuación z por columna para que ninguna característica domine la distancia; los
+    valores que faltan quedan en la media (0)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nanmean(features, axis=0) if len(features) else 0
+        std = np.nanstd(features, axis=0) if len(features) else 1
+        scaled = (features - mean) / np.where(std > 0, std, 1)
+    return np.nan_to_num(scaled, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def nearest_neighbours(matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Los k vecinos más cercanos (distancia euclídea) de cada fila, excluida ella misma:
+    (índices, distancias), ordenados de más a menos parecido. Búsqueda exacta por
+    bloques de filas para acotar la memoria de la matriz de distancias.
+    """
+    size = len(matrix)
+    k = min(k, size - 1)
+    if k <= 0:
+        return np.empty((size, 0), dtype=np.int64), np.empty((size, 0))
+    norms = np.einsum('ij,ij->i', matrix, matrix)
+    indices = np.empty((size, k), dtype=np.int64)
+    distances = np.empty((size, k))
+    for start in range(0, size, _BLOCK):
+        stop = min(start + _BLOCK, size)
+        squared = norms[start:stop, None] + norms[None, :] - 2 * matrix[start:stop] @ matrix.T
+        squared[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        nearest = np.argpartition(squared, k - 1, axis=1)[:, :k]
+        nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+        order = np.argsort(nearest_squared, axis=1, kind='stable')
+        indices[start:stop] = np.take_along_axis(nearest, order, axis=1)
+        distances[start:stop] = np.sqrt(np.maximum(np.take_along_axis(nearest_squared, order, axis=1), 0))
+    return indices, distances
+
+
+def catalogued_count() -> int:
+    return Fund.objects.values('symbol').distinct().count()
+
+
+def backfill_histories(fetch: price_store.HistoryFetcher, batch_size: Optional[int] = None) -> int:
+    """
+    Descarga al almacén de precios el histórico de los fondos del catálogo que todavía no
+    lo tienen, por lotes de SIMILARITY_BACKFILL_BATCH símbolos en paralelo en el pool.
+    Devuelve cuántos se han guardado (los que el proveedor no conoce se reintentan en la
+    siguiente ejecución).
+    """
+    batch_size = batch_size or settings.SIMILARITY_BACKFILL_BATCH
+    pending = list(
+        Fund.objects.exclude(symbol__in=PriceSeriesState.objects.values('symbol'))
+        .values_list('symbol', flat=True).distinct().order_by('symbol')
+    )
+    saved = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        histories, errors = concurrency.run_parallel({
+            symbol: partial(price_store.get_history, symbol, fetch) for symbol in batch
+        })
+        for symbol, error in errors.items():
+            print(f"[API] Similitud: no se pudo descargar el histórico de {symbol}: {error}")
+        saved += sum(history is not None for history in histories.values())
+        print(f"[DEBUG] Similitud: {start + len(batch)}/{len(pending)} históricos pendientes procesados")
+    return saved
+
+
+def _stored_histories(start) -> Dict[str, HistorySeries]:
+    """
+    Cierres almacenados desde 'start' de los símbolos del catálogo, en una sola consulta
+    """
+    rows = (
+        PriceBar.objects.filter(date__gte=start, symbol__in=Fund.objects.values('symbol'))
+        .order_by('symbol', 'date')
+        .values_list('symbol', 'date', 'close')
+        .iterator(chunk_size=10000)
+    )
+    histories = {}
+    for symbol, bars in groupby(rows, key=lambda row: row[0]):
+        dates, closes = zip(*((day, close) for _, day, close in bars))
+        histories[symbol] = HistorySeries(np.array(dates, dtype='datetime64[D]'), closes)
+    return histories
+
+
+def build_index(neighbours: Optional[int] = None, now: Optional[Any] = None) -> int:
+    """
+    Reconstruye en lote el índice de fondos similares del catálogo a partir de los
+    históricos almacenados (backfill_histories descarga antes los que faltan): perfil
+    normalizado de cada fondo y sus vecinos más cercanos. Devuelve el número de perfiles
+    guardados.
+    """
+    neighbours = neighbours or settings.SIMILARITY_NEIGHBOURS
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+    start = (now - pd.DateOffset(years=max(settings.RISK_LOOKBACK_YEARS, 3)) - pd.Timedelta(days=7)).date()
+    histories = _stored_histories(start)
+    symbols, raw = profile_features(histories, now)
+    matrix = normalize(raw)
+    indices, distances = nearest_neighbours(matrix, neighbours)
+
+    built_at = timezone.now()
+    volatility = FEATURES.index(('risk', 'volatility', None))
+    return1y = FEATURES.index(('trailing', '1Y', 'return'))
+    profiles = [
+        FundProfile(
+            symbol=symbol,
+            features=matrix[i].tolist(),
+            return1y=raw[i, return1y] if math.isfinite(raw[i, return1y]) else None,
+            volatility=raw[i, volatility] if math.isfinite(raw[i, volatility]) else None,
+            neighbours=[symbols[j] for j in indices[i]],
+            distances=distances[i].tolist(),
+            built_at=built_at,
+        )
+        for i, symbol in enumerate(symbols)
+    ]
+    with transaction.atomic():
+        FundProfile.objects.all().delete()
+        FundProfile.objects.bulk_create(profiles, batch_size=1000)
+    print(f"[DEBUG] Similitud: {len(profiles)} perfiles de {len(histories)} históricos almacenados")
+    return len(profiles)
+
+
+def similar_funds(symbol: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Fondos más parecidos al símbolo según el índice precalculado (una consulta por clave
+    única). Lista vacía si el símbolo no está indexado.
+    """
+    try:
+        profile = FundProfile.objects.filter(symbol=(symbol or '').strip().upper()).first()
+        if profile is None:
+            return []
+        peers = {p.symbol: p for p in FundProfile.objects.filter(symbol__in=profile.neighbours[:limit])}
+    except DatabaseError as e:
+        print(f"[API] Índice de similitud no disponible: {e}")
+        return []
+    return [
+        {
+            'symbol': neighbour,
+            'distance': distance,
+            'similarity': 1 / (1 + distance),
+            'return1y': peers[neighbour].return1y if neighbour in peers else None,
+            'volatility': peers[neighbour].volatility if neighbour in peers else None,
+        }
+        for neighbour, distance in list(zip(profile.neighbours, profile.distances))[:limit]
+    ]
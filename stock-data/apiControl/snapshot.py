@@ -0,0 +1,76 @@
+# apiControl/snapshot.py
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+# Instantáneas de la petición en curso: cada símbolo se descarga como mucho una vez por petición
+_request_snapshots: ContextVar[Optional[Dict[str, Dict[str, Any]]]] = ContextVar('ticker_snapshots', default=None)
+
+# Instantáneas compartidas entre peticiones: símbolo -> (expira_en, info), en orden LRU y
+# acotadas a TICKER_INFO_MAX_ENTRIES
+_shared_snapshots: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_shared_lock = threading.Lock()
+
+
+def _snapshot_key(symbol: str) -> str:
+    return symbol.strip().upper()
+
+
+@contextmanager
+def request_scope():
+    """
+    Abre un ámbito de petición en el que las instantáneas se reutilizan sin consultar el TTL
+    """
+    token = _request_snapshots.set({})
+    try:
+        yield
+    finally:
+        _request_snapshots.reset(token)
+
+
+def get_info(symbol: str, loader: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Devuelve el 'info' del símbolo desde la instantánea de la petición, desde la caché
+    compartida si no ha caducado o, en último caso, llamando a 'loader'
+    """
+    key = _snapshot_key(symbol)
+    scope = _request_snapshots.get()
+    if scope is not None and key in scope:
+        return scope[key]
+
+    now = time.monotonic()
+    with _shared_lock:
+        entry = _shared_snapshots.get(key)
+        if entry is not None and entry[0] <= now:
+            del _shared_snapshots[key]
+            entry = None
+        elif entry is not None:
+            _shared_snapshots.move_to_end(key)
+    if entry is not None:
+        info = entry[1]
+    else:
+        info = loader()
+        ttl = settings.TICKER_INFO_TTL
+        if ttl > 0:
+            with _shared_lock:
+                _shared_snapshots.pop(key, None)
+                _shared_snapshots[key] = (now + ttl, info)
+                while len(_shared_snapshots) > settings.TICKER_INFO_MAX_ENTRIES:
+                    _shared_snapshots.popitem(last=False)
+
+    if scope is not None:
+        scope[key] = info
+    return info
+
+
+def clear() -> None:
+    """
+    Vacía las instantáneas compartidas entre peticiones
+    """
+    with _shared_lock:
+        _shared_snapshots.clear()
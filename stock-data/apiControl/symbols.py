@@ -0,0 +1,148 @@
+# apiControl/symbols.py
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import catalog
+from .models import Fund
+from .services.yfinance_service import YFinanceService
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre un bytearray: sin falsos negativos y con una tasa de falsos
+    positivos acotada por 'error_rate' para 'capacity' elementos
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Doble hashing (Kirsch-Mitzenmacher): k posiciones a partir de dos hashes de 64 bits
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @classmethod
+    def from_items(cls, items: Iterable[str], error_rate: float) -> "BloomFilter":
+        items = list(items)
+        bloom = cls(len(items), error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+
+_filter: Optional[BloomFilter] = None
+_filter_built_at = 0.0
+_filter_lock = threading.Lock()
+
+# Símbolos comprobados contra el proveedor: símbolo -> (expira_en, existe), en orden LRU
+# y acotados a SYMBOL_CHECKED_MAX_ENTRIES (las erratas no hacen crecer la memoria)
+_checked: "OrderedDict[str, Tuple[float, bool]]" = OrderedDict()
+_checked_lock = threading.Lock()
+
+
+def _key(symbol: str) -> str:
+    return (symbol or '').strip().upper()
+
+
+def _known_symbols() -> BloomFilter:
+    """
+    Filtro de Bloom con los símbolos del catálogo local, reconstruido cada
+    SYMBOL_FILTER_REFRESH_SECONDS
+    """
+    global _filter, _filter_built_at
+    with _filter_lock:
+        if _filter is None or time.monotonic() - _filter_built_at > settings.SYMBOL_FILTER_REFRESH_SECONDS:
+            try:
+                symbols = Fund.objects.values_list('symbol', flat=True).distinct()
+                _filter = BloomFilter.from_items(symbols, settings.SYMBOL_FILTER_ERROR_RATE)
+            except DatabaseError as e:
+                print(f"[API] Catálogo no disponible para validar símbolos: {e}")
+                _filter = BloomFilter(1, settings.SYMBOL_FILTER_ERROR_RATE)
+            _filter_built_at = time.monotonic()
+        return _filter
+
+
+def _remember(symbol: str, exists: bool) -> None:
+    ttl = settings.SYMBOL_POSITIVE_TTL if exists else settings.SYMBOL_NEGATIVE_TTL
+    with _checked_lock:
+        _checked.pop(symbol, None)
+        _checked[symbol] = (time.monotonic() + ttl, exists)
+        while len(_checked) > settings.SYMBOL_CHECKED_MAX_ENTRIES:
+            _checked.popitem(last=False)
+
+
+def _recall(symbol: str) -> Optional[bool]:
+    with _checked_lock:
+        entry = _checked.get(symbol)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _checked[symbol]
+            return None
+        _checked.move_to_end(symbol)
+        return entry[1]
+
+
+def lookup(symbol: str) -> Optional[bool]:
+    """
+    Respuesta local, sin E/S de red: True si el filtro de Bloom lo da por conocido y el
+    catálogo lo confirma, el resultado guardado si ya se comprobó contra el proveedor y
+    no ha caducado, o None si hay que preguntar al proveedor
+    """
+    key = _key(symbol)
+    if not key:
+        return False
+    if key in _known_symbols() and catalog.resolve(key) is not None:
+        return True
+    remembered = _recall(key)
+    if remembered is not None:
+        print(f"[API] Validación de '{key}' servida desde caché: {remembered}")
+    return remembered
+
+
+def confirm(symbol: str) -> bool:
+    """
+    Pregunta a yfinance y guarda la respuesta (los inexistentes SYMBOL_NEGATIVE_TTL, así
+    una errata no se repite contra el proveedor). Los errores se propagan y no se guardan.
+    """
+    key = _key(symbol)
+    exists = bool(YFinanceService.getSearchData(key))
+    _remember(key, exists)
+    return exists
+
+
+def symbol_exists(symbol: str) -> bool:
+    known = lookup(symbol)
+    return known if known is not None else confirm(symbol)
+
+
+def clear() -> None:
+    """
+    Descarta el filtro y los símbolos comprobados
+    """
+    global _filter
+    with _filter_lock:
+        _filter = None
+    with _checked_lock:
+        _checked.clear()
@@ -23,8 +23,8 @@ class MockAPITestCase(TestCase):
         
         # Configurar mocks globales para APIs externas
         self.yfinance_patcher = patch('apiControl.services.yfinance_service.yf.Ticker')
-        self.requests_patcher = patch('apiControl.services.fmp_service.requests.get')
-        self.eodhd_requests_patcher = patch('apiControl.services.eodhd_service.requests.get')
+        self.requests_patcher = patch('apiControl.services.fmp_service.http_client.get')
+        self.eodhd_requests_patcher = patch('apiControl.services.eodhd_service.http_client.get')
         
         self.mock_yfinance = self.yfinance_patcher.start()
         self.mock_requests = self.requests_patcher.start()
@@ -1,20 +1,36 @@
 from django.test import TestCase
 from django.conf import settings
-from unittest.mock import patch, MagicMock
+from django.test import override_settings
+from unittest.mock import patch, MagicMock, PropertyMock, AsyncMock
+import asyncio
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+import time
+from django.utils import timezone
 import json
 
-from .control import perform_api_call, generic_search, API_MAPPING
+from .control import perform_api_call, aperform_api_call, perform_batch_api_call, generic_search, API_MAPPING
 from .services.yfinance_service import YFinanceService
 from .services.fmp_service import FMPService
 from .services.eodhd_service import EODHDService
 from .exceptions.apiException import APIError
+from .models import Fund, FundProfile, PriceBar, PriceSeriesState, RollingStat, RollingState
+from . import cache, catalog, codec, correlation, panel, price_store, returns, risk, rolling, similarity, snapshot, symbols
+from .concurrency import run_parallel, DeadlineExceeded
+from .metrics import compute_fund_metrics
+from .history import HistorySeries
 
 
 class YFinanceServiceTests(TestCase):
     """Tests unitarios para YFinanceService"""
 
+    def setUp(self):
+        """Cada test parte sin instantáneas de tickers"""
+        snapshot.clear()
+
     @patch('apiControl.services.yfinance_service.yf.Ticker')
     def test_get_search_data_success(self, mock_ticker):
         """Test para getSearchData con datos válidos"""
@@ -89,6 +105,17 @@ class YFinanceServiceTests(TestCase):
         self.assertIn('close', result)
         self.assertEqual(len(result['close']), 3)
 
+    @patch('apiControl.services.yfinance_service.yf.Ticker')
+    def test_download_history_uses_http_timeout(self, mock_ticker):
+        """Las descargas tienen el tiempo de espera del cliente HTTP (no retienen el pool)"""
+        mock_ticker.return_value.history.return_value = pd.DataFrame({'Close': [1.0]})
+        YFinanceService.downloadHistory('AAPL')
+        YFinanceService.downloadHistory('AAPL', start='2024-01-01')
+
+        for call in mock_ticker.return_value.history.call_args_list:
+            self.assertEqual(call.kwargs['timeout'], settings.HTTP_READ_TIMEOUT)
+            self.assertTrue(call.kwargs['raise_errors'])
+
     @patch('apiControl.services.yfinance_service.yf.Ticker')
     def test_get_historical_profit_no_data(self, mock_ticker):
         """Test para getHistoricalProfit cuando no hay datos"""
@@ -150,7 +177,7 @@ class FMPServiceTests(TestCase):
         """Configuración inicial para los tests"""
         self.fmp_service = FMPService()
 
-    @patch('apiControl.services.fmp_service.requests.get')
+    @patch('apiControl.services.fmp_service.http_client.get')
     def test_get_commissions_success(self, mock_get):
         """Test para getCommissions con datos válidos"""
         mock_response = MagicMock()
@@ -172,7 +199,7 @@ class FMPServiceTests(TestCase):
         self.assertEqual(result['ytd_return'], 0.15)
         self.assertEqual(result['fund_family'], 'Vanguard')
 
-    @patch('apiControl.services.fmp_service.requests.get')
+    @patch('apiControl.services.fmp_service.http_client.get')
     def test_get_commissions_empty_response(self, mock_get):
         """Test para getCommissions con respuesta vacía"""
         mock_response = MagicMock()
@@ -184,7 +211,7 @@ class FMPServiceTests(TestCase):
         
         self.assertIsNone(result)
 
-    @patch('apiControl.services.fmp_service.requests.get')
+    @patch('apiControl.services.fmp_service.http_client.get')
     def test_get_commissions_exception(self, mock_get):
         """Test para getCommissions cuando ocurre una excepción"""
         mock_get.side_effect = Exception("Network Error")
@@ -193,7 +220,7 @@ class FMPServiceTests(TestCase):
         
         self.assertIsNone(result)
 
-    @patch('apiControl.services.fmp_service.requests.get')
+    @patch('apiControl.services.fmp_service.http_client.get')
     def test_get_category_sector_success(self, mock_get):
         """Test para getCategorySector con datos válidos"""
         mock_response = MagicMock()
@@ -207,7 +234,7 @@ class FMPServiceTests(TestCase):
         self.assertEqual(result['symbol'], 'VTI')
         self.assertEqual(result['category'], 'Technology')
 
-    @patch('apiControl.services.fmp_service.requests.get')
+    @patch('apiControl.services.fmp_service.http_client.get')
     def test_get_category_sector_no_category(self, mock_get):
         """Test para getCategorySector cuando no hay categoría"""
         mock_response = MagicMock()
@@ -217,7 +244,7 @@ class FMPServiceTests(TestCase):
         with self.assertRaises(APIError):
             self.fmp_service.getCategorySector('VTI')
 
-    @patch('apiControl.services.fmp_service.requests.get')
+    @patch('apiControl.services.fmp_service.http_client.get')
     def test_get_category_sector_exception(self, mock_get):
         """Test para getCategorySector cuando ocurre una excepción"""
         mock_get.side_effect = Exception("Network Error")
@@ -233,7 +260,7 @@ class EODHDServiceTests(TestCase):
         """Configuración inicial para los tests"""
         self.eodhd_service = EODHDService()
 
-    @patch('apiControl.services.eodhd_service.requests.get')
+    @patch('apiControl.services.eodhd_service.http_client.get')
     def test_get_search_data_success(self, mock_get):
         """Test para getSearchData con datos válidos"""
         mock_response = MagicMock()
@@ -257,7 +284,7 @@ class EODHDServiceTests(TestCase):
         self.assertEqual(result['quotes'][0]['shortname'], 'Apple Inc.')
         self.assertEqual(result['count'], 1)
 
-    @patch('apiControl.services.eodhd_service.requests.get')
+    @patch('apiControl.services.eodhd_service.http_client.get')
     def test_get_search_data_empty_response(self, mock_get):
         """Test para getSearchData con respuesta vacía"""
         mock_response = MagicMock()
@@ -270,7 +297,7 @@ class EODHDServiceTests(TestCase):
         self.assertEqual(result['quotes'], [])
         self.assertEqual(result['count'], 0)
 
-    @patch('apiControl.services.eodhd_service.requests.get')
+    @patch('apiControl.services.eodhd_service.http_client.get')
     def test_get_search_data_exception(self, mock_get):
         """Test para getSearchData cuando ocurre una excepción"""
         mock_get.side_effect = Exception("Network Error")
@@ -284,6 +311,12 @@ class EODHDServiceTests(TestCase):
 class ControlModuleTests(TestCase):
     """Tests de integración para el módulo control"""
 
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
     @patch('apiControl.control.YFinanceService.getSearchData')
     def test_generic_search_yfinance_success(self, mock_yfinance):
         """Test para generic_search con éxito en YFinance"""
@@ -462,3 +495,1308 @@ class APIMappingTests(TestCase):
             if 'backup' in config:
                 backup_func = config['backup']
                 self.assertTrue(callable(backup_func))
+
+
+class PriceStoreTests(TestCase):
+    """Tests para el almacén local de precios con refresco incremental"""
+
+    def make_history(self, start, periods, **extra):
+        data = {
+            'Open': [100.0 + i for i in range(periods)],
+            'High': [105.0 + i for i in range(periods)],
+            'Low': [95.0 + i for i in range(periods)],
+            'Close': [102.0 + i for i in range(periods)],
+            'Volume': [1000 + i for i in range(periods)],
+        }
+        data.update(extra)
+        return pd.DataFrame(data, index=pd.date_range(start, periods=periods))
+
+    def test_backfill_then_incremental_refresh(self):
+        """La primera llamada descarga la serie completa y las siguientes solo el delta"""
+        fetch = MagicMock(return_value=self.make_history('2023-01-01', 5))
+
+        result = price_store.get_history('aapl', fetch)
+
+        fetch.assert_called_once_with('aapl')
+        self.assertEqual(len(result['prices']), 5)
+        self.assertEqual(PriceBar.objects.filter(symbol='AAPL').count(), 5)
+
+        # Serie recién refrescada: no se pide nada al proveedor
+        fetch.reset_mock()
+        price_store.get_history('AAPL', fetch)
+        fetch.assert_not_called()
+
+        # Serie caducada: solo se piden las barras desde la última almacenada
+        PriceSeriesState.objects.filter(symbol='AAPL').update(
+            last_refresh=timezone.now() - timedelta(days=1)
+        )
+        fetch.return_value = self.make_history('2023-01-05', 3)
+        result = price_store.get_history('AAPL', fetch)
+
+        fetch.assert_called_once()
+        self.assertEqual(str(fetch.call_args.kwargs['start']), '2023-01-05')
+        self.assertEqual(len(result['dates']), 7)
+        self.assertEqual(PriceSeriesState.objects.get(symbol='AAPL').last_date.isoformat(), '2023-01-07')
+
+    def test_corporate_action_triggers_full_reload(self):
+        """Un dividendo en el delta obliga a recargar la serie ajustada completa"""
+        fetch = MagicMock(return_value=self.make_history('2023-01-01', 5))
+        price_store.get_history('VTI', fetch)
+        PriceSeriesState.objects.filter(symbol='VTI').update(
+            last_refresh=timezone.now() - timedelta(days=1)
+        )
+
+        delta = self.make_history('2023-01-05', 2, Dividends=[0.0, 0.5])
+        full = self.make_history('2023-01-01', 6)
+        fetch.side_effect = [delta, full]
+        result = price_store.get_history('VTI', fetch)
+
+        self.assertEqual(fetch.call_count, 3)
+        self.assertEqual(len(result['prices']), 6)
+
+    def test_no_data_does_not_create_state(self):
+        """Si el proveedor no devuelve datos no se registra la serie"""
+        fetch = MagicMock(return_value=pd.DataFrame())
+
+        self.assertIsNone(price_store.get_history('INVALID', fetch))
+        self.assertFalse(PriceSeriesState.objects.filter(symbol='INVALID').exists())
+
+
+class FundMetricsTests(TestCase):
+    """Tests para el cálculo de métricas derivadas de un único histórico"""
+
+    def test_compute_fund_metrics(self):
+        """Todas las métricas se obtienen de la misma serie"""
+        now = pd.Timestamp('2024-01-01')
+        dates = pd.date_range('2018-01-01', '2024-01-01', freq='D')
+        prices = [100.0 * (1.0001 ** i) for i in range(len(dates))]
+
+        result = compute_fund_metrics({'dates': list(dates), 'prices': prices}, now=now)
+
+        self.assertAlmostEqual(result['cumulative_return'], (prices[-1] / prices[0] - 1) * 100)
+        self.assertAlmostEqual(result['growth_last_year'], (1.0001 ** 365 - 1) * 100, places=6)
+        self.assertGreater(result['growth_5y_avg'], 0)
+        self.assertIn(2020, result['annual_returns']['annual_returns'])
+        self.assertAlmostEqual(result['volatility']['daily_volatility'], 0.0, places=6)
+        self.assertEqual(len(result['price_series']['dates']), len(dates))
+
+    def test_compute_fund_metrics_empty(self):
+        """Sin histórico no hay métricas"""
+        self.assertIsNone(compute_fund_metrics(None))
+        self.assertIsNone(compute_fund_metrics({'dates': [], 'prices': []}))
+
+
+class TickerSnapshotTests(TestCase):
+    """Tests para las instantáneas de 'info' compartidas por YFinanceService"""
+
+    def setUp(self):
+        snapshot.clear()
+
+    @patch('apiControl.services.yfinance_service.yf.Ticker')
+    def test_info_fetched_once_for_all_accessors(self, mock_ticker):
+        """Búsqueda, sector y market cap reutilizan la misma descarga de 'info'"""
+        info = PropertyMock(return_value={
+            'symbol': 'AAPL', 'longName': 'Apple Inc.', 'category': 'Technology', 'marketCap': 3e12
+        })
+        type(mock_ticker.return_value).info = info
+
+        with snapshot.request_scope():
+            YFinanceService.getSearchData('AAPL')
+            self.assertEqual(YFinanceService.getCategorySector('AAPL'), 'Technology')
+            self.assertEqual(YFinanceService.getMarketCap('AAPL')['formatted_market_cap'], '$3.00T')
+
+        self.assertEqual(info.call_count, 1)
+
+    @override_settings(TICKER_INFO_TTL=0)
+    @patch('apiControl.services.yfinance_service.yf.Ticker')
+    def test_request_scope_without_ttl(self, mock_ticker):
+        """Sin TTL solo se reutiliza dentro de la misma petición"""
+        info = PropertyMock(return_value={'category': 'Technology'})
+        type(mock_ticker.return_value).info = info
+
+        with snapshot.request_scope():
+            YFinanceService.getCategorySector('AAPL')
+            YFinanceService.getCategorySector('AAPL')
+        with snapshot.request_scope():
+            YFinanceService.getCategorySector('AAPL')
+
+        self.assertEqual(info.call_count, 2)
+
+    @override_settings(TICKER_INFO_MAX_ENTRIES=2)
+    def test_shared_snapshots_are_bounded(self):
+        """La caché compartida expulsa el símbolo usado hace más tiempo"""
+        loader = MagicMock(return_value={'category': 'Technology'})
+        for symbol in ('AAA', 'BBB', 'AAA', 'CCC'):
+            snapshot.get_info(symbol, loader)
+        self.assertEqual(list(snapshot._shared_snapshots), ['AAA', 'CCC'])
+        self.assertEqual(loader.call_count, 3)
+
+
+class APICacheTests(TestCase):
+    """Tests para la caché de dos niveles de perform_api_call"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_second_call_served_from_cache(self):
+        """La segunda llamada idéntica no llega al proveedor"""
+        service = MagicMock(return_value={'market_cap': 1, 'formatted_market_cap': '$1', 'symbol': 'AAPL'})
+        with patch.dict(API_MAPPING['compare'], {'marketCap': {'primary': service}}):
+            first = perform_api_call('compare', 'AAPL', 'marketCap')
+            first['symbol'] = 'MODIFICADO'
+            second = perform_api_call('compare', 'AAPL', 'marketCap')
+
+        service.assert_called_once_with('AAPL')
+        self.assertEqual(second['symbol'], 'AAPL')
+        self.assertEqual(cache.cache_stats()['l1_hits'], 1)
+
+    def test_shared_tier_fills_local_tier(self):
+        """Un acierto en la caché compartida se copia a la caché en proceso"""
+        service = MagicMock(return_value='Technology')
+        with patch.dict(API_MAPPING['compare'], {'categorySector': {'primary': service}}):
+            perform_api_call('compare', 'AAPL', 'categorySector')
+            cache._local_cache.clear()
+            perform_api_call('compare', 'AAPL', 'categorySector')
+            perform_api_call('compare', 'AAPL', 'categorySector')
+
+        service.assert_called_once()
+        stats = cache.cache_stats()
+        self.assertEqual((stats['misses'], stats['l2_hits'], stats['l1_hits']), (1, 1, 1))
+
+    def test_empty_results_not_cached(self):
+        """Los resultados vacíos se vuelven a pedir"""
+        service = MagicMock(return_value=None)
+        with patch.dict(API_MAPPING['compare'], {'marketCap': {'primary': service}}):
+            perform_api_call('compare', 'AAPL', 'marketCap')
+            perform_api_call('compare', 'AAPL', 'marketCap')
+
+        self.assertEqual(service.call_count, 2)
+
+        service = MagicMock(return_value=[])
+        with patch.dict(API_MAPPING['search'], {'primary': service}):
+            self.assertEqual(perform_api_call('search', 'NOPE'), [])
+            self.assertEqual(perform_api_call('search', 'NOPE'), [])
+        self.assertEqual(service.call_count, 2)
+
+    def test_symbol_normalized_in_key(self):
+        """El mismo símbolo con otro formato comparte entrada de caché"""
+        self.assertEqual(cache.make_key('compare', 'marketCap', ' voo '), cache.make_key('compare', 'marketCap', 'VOO'))
+        self.assertEqual(cache.make_key('compare', None, ('voo',)), cache.make_key('compare', None, ('VOO',)))
+
+    def test_byte_bounded_lru_eviction(self):
+        """La caché en proceso expulsa las entradas menos usadas al superar su tamaño"""
+        lru = cache.ByteLRUCache(max_bytes=100)
+        expires_at = datetime.now().timestamp() + 60
+        lru.set('a', expires_at, b'x' * 40)
+        lru.set('b', expires_at, b'x' * 40)
+        lru.get('a')
+        lru.set('c', expires_at, b'x' * 40)
+
+        self.assertIsNotNone(lru.get('a'))
+        self.assertIsNone(lru.get('b'))
+        self.assertLessEqual(lru.stats()['bytes'], 100)
+
+    def test_market_close_ttl(self):
+        """Los históricos caducan en el próximo cierre de un día laborable"""
+        from zoneinfo import ZoneInfo
+        friday_evening = datetime(2024, 1, 5, 18, 0, tzinfo=ZoneInfo('America/New_York'))
+        seconds = cache.seconds_until_market_close(friday_evening)
+        # Próximo cierre: lunes 16:30
+        self.assertEqual(seconds, int(timedelta(days=2, hours=22, minutes=30).total_seconds()))
+
+
+@override_settings(API_CACHE_ALIAS='default')
+class SingleFlightTests(TestCase):
+    """Tests para la agrupación de llamadas concurrentes y el refresco anticipado"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        """Las peticiones simultáneas al mismo símbolo esperan a una única llamada"""
+        import threading
+        import time as time_module
+        calls = []
+
+        def slow_service():
+            calls.append(1)
+            time_module.sleep(0.2)
+            return {'symbol': 'AAPL'}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                cache.cached_call('compare', 'marketCap', 'AAPL', slow_service)
+            ))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'symbol': 'AAPL'}] * 8)
+        self.assertEqual(cache.cache_stats()['coalesced'], 7)
+
+    def test_errors_are_shared_by_waiting_callers(self):
+        """Si la llamada falla, el error llega a quien la lanzó"""
+        with self.assertRaises(APIError):
+            cache.cached_call('compare', 'marketCap', 'AAPL', MagicMock(side_effect=APIError('caído')))
+
+    def test_concurrent_batch_calls_share_one_upstream_call(self):
+        """Los lotes simultáneos con los mismos símbolos esperan a una única petición"""
+        import threading
+        import time as time_module
+        calls = []
+
+        def slow_batch(symbols):
+            calls.append(symbols)
+            time_module.sleep(0.2)
+            return {s: [{'symbol': s}] for s in symbols}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda order=order: results.append(
+                cache.cached_batch_call('search', None, order, slow_batch)
+            ))
+            for order in (['SPY', 'QQQ'], ['QQQ', 'SPY']) * 3
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'SPY': [{'symbol': 'SPY'}], 'QQQ': [{'symbol': 'QQQ'}]}] * 6)
+        self.assertEqual(cache.cache_stats()['coalesced'], 5)
+
+    def test_batch_early_refresh_serves_cached_value(self):
+        """Una entrada a punto de caducar se sirve y se renueva en segundo plano"""
+        batch = MagicMock(return_value={'SPY': [{'symbol': 'SPY', 'price': 1}]})
+        cache.cached_batch_call('search', None, ['SPY'], batch)
+        batch.return_value = {'SPY': [{'symbol': 'SPY', 'price': 2}]}
+
+        with patch.object(cache, '_should_refresh_early', return_value=True), \
+                patch.object(cache.concurrency, 'submit', side_effect=lambda fn: fn()) as mock_submit:
+            served = cache.cached_batch_call('search', None, ['SPY'], batch)
+
+        self.assertEqual(served, {'SPY': [{'symbol': 'SPY', 'price': 1}]})
+        mock_submit.assert_called_once()
+        self.assertEqual(cache.cached_batch_call('search', None, ['SPY'], batch)['SPY'][0]['price'], 2)
+        stats = cache.cache_stats()
+        self.assertEqual((stats['misses'], stats['early_refreshes']), (1, 1))
+        self.assertEqual(batch.call_count, 2)
+
+    def test_probabilistic_early_refresh(self):
+        """Solo las entradas a punto de caducar y caras de calcular se renuevan antes"""
+        now = datetime.now().timestamp()
+        self.assertFalse(cache._should_refresh_early((now + 3600, b'', 0.01)))
+        self.assertTrue(cache._should_refresh_early((now + 0.001, b'', 1000.0)))
+
+
+class ConcurrencyTests(TestCase):
+    """Tests para el reparto de llamadas independientes en el pool acotado"""
+
+    def test_run_parallel_latency_is_slowest_call(self):
+        """Las tareas se ejecutan a la vez y los errores quedan por clave"""
+        import time as time_module
+
+        def slow(value):
+            time_module.sleep(0.2)
+            return value
+
+        def failing():
+            raise APIError("caído")
+
+        started = time_module.monotonic()
+        results, errors = run_parallel({
+            'a': lambda: slow(1), 'b': lambda: slow(2), 'c': lambda: slow(3), 'd': failing,
+        })
+
+        self.assertLess(time_module.monotonic() - started, 0.5)
+        self.assertEqual(results, {'a': 1, 'b': 2, 'c': 3})
+        self.assertIsInstance(errors['d'], APIError)
+
+    def test_run_parallel_deadline(self):
+        """Las tareas que no terminan a tiempo se marcan como fuera de plazo"""
+        import time as time_module
+        results, errors = run_parallel({
+            'fast': lambda: 'ok',
+            'slow': lambda: time_module.sleep(1),
+        }, timeout=0.1)
+
+        self.assertEqual(results, {'fast': 'ok'})
+        self.assertIsInstance(errors['slow'], DeadlineExceeded)
+
+    @override_settings(TICKER_INFO_TTL=0)
+    def test_request_context_is_propagated(self):
+        """Las tareas ven las instantáneas de la petición que las lanza"""
+        with snapshot.request_scope():
+            snapshot.get_info('AAPL', lambda: {'symbol': 'AAPL'})
+            loader = MagicMock()
+            results, errors = run_parallel({'info': lambda: snapshot.get_info('AAPL', loader)})
+
+        loader.assert_not_called()
+        self.assertEqual(results['info'], {'symbol': 'AAPL'})
+
+
+
+@override_settings(API_CACHE_ALIAS='default')
+class AsyncAPITests(TestCase):
+    """Tests para los clientes asíncronos de proveedores y aperform_api_call"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_concurrent_coroutines_share_one_upstream_call(self):
+        """Las corrutinas simultáneas con la misma clave esperan a una única llamada"""
+        calls = []
+
+        async def slow_service():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return {'symbol': 'AAPL'}
+
+        async def run():
+            return await asyncio.gather(*(
+                cache.acached_call('compare', 'marketCap', 'AAPL', slow_service) for _ in range(5)
+            ))
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'symbol': 'AAPL'}] * 5)
+        self.assertEqual(cache.cache_stats()['coalesced'], 4)
+
+    def test_coroutines_from_different_loops_share_one_call(self):
+        """Con WSGI cada petición tiene su loop: las llamadas se agrupan igualmente"""
+        calls = []
+
+        async def slow_service():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return {'symbol': 'AAPL'}
+
+        def request():
+            return asyncio.run(cache.acached_call('compare', 'marketCap', 'AAPL', slow_service))
+
+        with ThreadPoolExecutor(max_workers=3) as requests:
+            results = list(requests.map(lambda _: request(), range(3)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'symbol': 'AAPL'}] * 3)
+
+    def test_async_variant_preferred_and_cached(self):
+        """Se usa 'aprimary' si existe y el resultado se comparte con perform_api_call"""
+        sync_service = MagicMock(return_value={'category': 'Sync'})
+        async_service = AsyncMock(return_value={'category': 'Technology'})
+        with patch.dict(API_MAPPING['compare'], {
+            'categorySector': {'primary': sync_service, 'aprimary': async_service},
+        }):
+            result = asyncio.run(aperform_api_call('compare', 'AAPL', 'categorySector'))
+            cached = perform_api_call('compare', 'AAPL', 'categorySector')
+
+        self.assertEqual(result, {'category': 'Technology'})
+        self.assertEqual(cached, result)
+        async_service.assert_awaited_once_with('AAPL')
+        sync_service.assert_not_called()
+
+    def test_sync_only_service_runs_in_pool_with_backup(self):
+        """Los servicios sin variante asíncrona se ejecutan en el pool, con su backup"""
+        failing = MagicMock(side_effect=Exception("caído"))
+        backup = MagicMock(return_value=1000)
+        with patch.dict(API_MAPPING['compare'], {'marketCap': {'primary': failing, 'backup': backup}}):
+            result = asyncio.run(aperform_api_call('compare', 'AAPL', 'marketCap'))
+
+        self.assertEqual(result, 1000)
+        backup.assert_called_once_with('AAPL')
+
+    def test_invalid_action(self):
+        with self.assertRaises(APIError):
+            asyncio.run(aperform_api_call('invalid', 'AAPL'))
+
+    @patch('apiControl.services.fmp_service.http_client.aget', new_callable=AsyncMock)
+    def test_fmp_async_category_sector(self, mock_aget):
+        """El cliente asíncrono de FMP interpreta la respuesta igual que el síncrono"""
+        mock_aget.return_value.json = MagicMock(return_value=[{'category': 'Technology'}])
+        result = asyncio.run(FMPService().agetCategorySector('AAPL'))
+        self.assertEqual(result, {'symbol': 'AAPL', 'category': 'Technology'})
+
+
+class HTTPClientTests(TestCase):
+    """Tests para las sesiones HTTP compartidas por proveedor"""
+
+    def test_session_reused_per_provider(self):
+        """Cada proveedor reutiliza su sesión (y sus conexiones abiertas)"""
+        from .services import http_client
+        self.assertIs(http_client.get_session('fmp'), http_client.get_session('fmp'))
+        self.assertIsNot(http_client.get_session('fmp'), http_client.get_session('eodhd'))
+
+    def test_session_pool_and_retry_policy(self):
+        """El pool está acotado y se reintenta ante 429/5xx"""
+        from .services import http_client
+        adapter = http_client.get_session('fmp').get_adapter('https://financialmodelingprep.com')
+        self.assertEqual(adapter._pool_maxsize, settings.HTTP_POOL_MAXSIZE)
+        self.assertEqual(adapter.max_retries.total, settings.HTTP_MAX_RETRIES)
+        self.assertEqual(adapter.max_retries.read, settings.HTTP_MAX_RETRIES)
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+
+    def test_default_timeouts(self):
+        """Todas las llamadas llevan tiempo de espera de conexión y de lectura"""
+        from .services import http_client
+        with patch.object(http_client.get_session('eodhd'), 'get') as mock_get:
+            http_client.get('eodhd', 'https://eodhd.com/api/search/AAPL')
+        self.assertEqual(
+            mock_get.call_args.kwargs['timeout'],
+            (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT),
+        )
+
+    @override_settings(HTTP_MAX_RETRIES=2, HTTP_BACKOFF_FACTOR=0)
+    def test_async_retry_on_server_error(self):
+        """El cliente asíncrono reintenta los 5xx y devuelve la primera respuesta válida"""
+        from .services import http_client
+        responses = [MagicMock(status_code=503), MagicMock(status_code=200)]
+        client = MagicMock()
+        client.get = AsyncMock(side_effect=responses)
+        with patch.object(http_client, 'get_async_client', return_value=client):
+            response = asyncio.run(http_client.aget('https://eodhd.com/api/search/AAPL'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get.await_count, 2)
+
+    @override_settings(HTTP_MAX_RETRIES=2, HTTP_BACKOFF_FACTOR=0)
+    def test_async_retry_on_timeout(self):
+        """Los tiempos de espera agotados se reintentan igual que en el cliente síncrono"""
+        from .services import http_client
+        client = MagicMock()
+        client.get = AsyncMock(side_effect=[httpx.ReadTimeout('lento'), MagicMock(status_code=200)])
+        with patch.object(http_client, 'get_async_client', return_value=client):
+            response = asyncio.run(http_client.aget('https://eodhd.com/api/search/AAPL'))
+        self.assertEqual(response.status_code, 200)
+
+        client.get = AsyncMock(side_effect=httpx.ConnectTimeout('sin conexión'))
+        with patch.object(http_client, 'get_async_client', return_value=client):
+            with self.assertRaises(httpx.TimeoutException):
+                asyncio.run(http_client.aget('https://eodhd.com/api/search/AAPL'))
+        self.assertEqual(client.get.await_count, 3)
+
+    def test_async_client_shared_across_request_loops(self):
+        """Un loop por petición (runserver/WSGI) no crea un cliente ni un pool nuevos"""
+        from .services import http_client
+        seen = []
+
+        async def fake_get(url, params=None):
+            seen.append(http_client.get_async_client())
+            return MagicMock(status_code=200)
+
+        with patch.object(httpx.AsyncClient, 'get', side_effect=fake_get):
+            asyncio.run(http_client.aget('https://eodhd.com/api/search/AAPL'))
+            asyncio.run(http_client.aget('https://eodhd.com/api/search/MSFT'))
+        self.assertIs(seen[0], seen[1])
+        self.assertFalse(seen[0].is_closed)
+
+
+class YFinanceSessionTests(TestCase):
+    """Tests para la sesión compartida de yfinance"""
+
+    @patch('apiControl.services.yfinance_service.yf.Ticker')
+    def test_tickers_share_one_session(self, mock_ticker):
+        """Todas las llamadas de YFinanceService usan la misma sesión"""
+        from .services import yfinance_session
+        snapshot.clear()
+        mock_ticker.return_value.info = {'symbol': 'AAPL', 'marketCap': 1000}
+        YFinanceService.getMarketCap('AAPL')
+        YFinanceService.getMarketCap('MSFT')
+
+        sessions = [call.kwargs['session'] for call in mock_ticker.call_args_list]
+        self.assertEqual(len(sessions), 2)
+        self.assertIs(sessions[0], yfinance_session.get_session())
+        self.assertIs(sessions[1], sessions[0])
+
+    def test_auth_error_is_retried_once(self):
+        """Un crumb caducado (que YfData ya ha renovado) hace repetir la llamada una vez"""
+        from .services import yfinance_session
+        fn = MagicMock(side_effect=[Exception('401 Client Error: Unauthorized'), {'symbol': 'AAPL'}])
+        result = yfinance_session.call(fn)
+
+        self.assertEqual(result, {'symbol': 'AAPL'})
+        self.assertEqual(fn.call_count, 2)
+
+    def test_empty_history_is_not_retried(self):
+        """Un histórico vacío es falta de datos, no un crumb caducado"""
+        from .services import yfinance_session
+        fn = MagicMock(return_value=pd.DataFrame())
+        self.assertTrue(yfinance_session.call(fn).empty)
+        fn.assert_called_once()
+
+    @patch('apiControl.services.yfinance_service.yf.Ticker')
+    def test_missing_symbol_history_tries_each_timeframe_once(self, mock_ticker):
+        """Sin datos solo se pide una vez cada periodo; un crumb rechazado sí se repite"""
+        mock_ticker.return_value.history.side_effect = Exception('NOPE: possibly delisted; no price data found')
+        self.assertIsNone(YFinanceService.downloadHistory('NOPE'))
+        self.assertEqual(mock_ticker.return_value.history.call_count, 2)
+
+        history = pd.DataFrame({'Close': [1.0]})
+        mock_ticker.return_value.history.reset_mock()
+        mock_ticker.return_value.history.side_effect = [Exception('Invalid Crumb'), history]
+        self.assertIs(YFinanceService.downloadHistory('AAPL'), history)
+        self.assertEqual(mock_ticker.return_value.history.call_count, 2)
+
+    def test_other_errors_are_not_retried(self):
+        from .services import yfinance_session
+        fn = MagicMock(side_effect=ValueError('sin datos'))
+        with self.assertRaises(ValueError):
+            yfinance_session.call(fn)
+        fn.assert_called_once()
+
+
+@override_settings(API_CACHE_ALIAS='default')
+class BatchAPICallTests(TestCase):
+    """Tests para las llamadas por lotes de varios símbolos"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_one_batch_request_then_cache(self):
+        """Los símbolos se piden juntos y después se sirven desde la caché"""
+        batch = MagicMock(side_effect=lambda symbols: {s: {'symbol': s} for s in symbols})
+        with patch.dict(API_MAPPING['search'], {'batch': batch}):
+            first = perform_batch_api_call('search', ['spy', 'QQQ', 'SPY'])
+            second = perform_batch_api_call('search', ['SPY', 'QQQ', 'DIA'])
+
+        self.assertEqual(first, {'SPY': [{'symbol': 'SPY'}], 'QQQ': [{'symbol': 'QQQ'}]})
+        self.assertEqual(list(second), ['SPY', 'QQQ', 'DIA'])
+        self.assertEqual(batch.call_args_list[0].args[0], ['SPY', 'QQQ'])
+        self.assertEqual(batch.call_args_list[1].args[0], ['DIA'])
+
+    def test_batch_and_single_calls_share_cache_entries(self):
+        """Lo cacheado por perform_api_call sirve al lote y al revés, con el mismo formato"""
+        batch = MagicMock(side_effect=lambda symbols: {s: {'symbol': s} for s in symbols})
+        single = MagicMock(side_effect=lambda symbol: [{'symbol': symbol}])
+        with patch.dict(API_MAPPING['search'], {'batch': batch, 'primary': single}):
+            perform_api_call('search', 'SPY')
+            batched = perform_batch_api_call('search', ['SPY', 'QQQ'])
+            self.assertEqual(perform_api_call('search', 'QQQ'), batched['QQQ'])
+
+        self.assertEqual(batched['SPY'], [{'symbol': 'SPY'}])
+        self.assertEqual(batch.call_args.args[0], ['QQQ'])
+        single.assert_called_once_with('SPY')
+
+    def test_symbols_missing_from_batch_use_single_calls(self):
+        """Los símbolos que el lote no devuelve se piden con el servicio individual"""
+        batch = MagicMock(return_value={'SPY': {'symbol': 'SPY'}})
+        single = MagicMock(return_value=[{'symbol': 'VFINX'}])
+        with patch.dict(API_MAPPING['search'], {'batch': batch, 'primary': single}):
+            results = perform_batch_api_call('search', ['SPY', 'VFINX'])
+
+        self.assertEqual(results['VFINX'], [{'symbol': 'VFINX'}])
+        single.assert_called_once_with('VFINX')
+
+    @patch('apiControl.services.yfinance_service.yfinance_session.get_json')
+    def test_yfinance_batch_quotes(self, mock_get_json):
+        """Las cotizaciones de varios símbolos llegan en una sola petición"""
+        mock_get_json.return_value = {'quoteResponse': {'result': [
+            {'symbol': 'SPY', 'longName': 'SPDR S&P 500', 'regularMarketPrice': 500.0},
+            {'symbol': 'QQQ', 'longName': 'Invesco QQQ', 'regularMarketVolume': 1000},
+        ]}}
+        results = YFinanceService.getBatchSearchData(['SPY', 'QQQ'])
+
+        mock_get_json.assert_called_once()
+        self.assertEqual(mock_get_json.call_args.kwargs['params'], {'symbols': 'SPY,QQQ'})
+        self.assertEqual(results['SPY'], {'symbol': 'SPY', 'name': 'SPDR S&P 500', 'price': 500.0})
+        self.assertEqual(results['QQQ']['volume'], 1000)
+
+    @patch('apiControl.services.yfinance_service.YFinanceService.getInfo')
+    @patch('apiControl.services.yfinance_service.yfinance_session.get_json')
+    def test_yfinance_batch_profile_fields_without_extra_calls(self, mock_get_json, mock_info):
+        """Rentabilidad a un año desde la cotización y categoría desde el catálogo, sin pedir 'info'"""
+        catalog.upsert('US', [{'Code': 'SPY'}, {'Code': 'QQQ'}])
+        Fund.objects.filter(symbol='SPY').update(benchmark='Large Blend')
+        mock_get_json.return_value = {'quoteResponse': {'result': [
+            {'symbol': 'SPY', 'regularMarketPrice': 500.0, 'fiftyTwoWeekChangePercent': 25.0},
+            {'symbol': 'QQQ', 'regularMarketPrice': 400.0},
+        ]}}
+        results = YFinanceService.getBatchSearchData(['SPY', 'QQQ'])
+
+        self.assertEqual(results['SPY'], {
+            'symbol': 'SPY', 'price': 500.0, 'return1y': 0.25, 'benchmark': 'Large Blend'
+        })
+        self.assertEqual(results['QQQ'], {'symbol': 'QQQ', 'price': 400.0})
+        mock_get_json.assert_called_once()
+        mock_info.assert_not_called()
+
+
+class CatalogTests(TestCase):
+    """Tests para el catálogo local de símbolos"""
+
+    LISTING = [
+        {'Code': 'VOO', 'Name': 'Vanguard S&P 500 ETF', 'Country': 'USA', 'Exchange': 'NYSE ARCA',
+         'Currency': 'USD', 'Type': 'ETF', 'Isin': 'US9229083632'},
+        {'Code': 'VTI', 'Name': 'Vanguard Total Stock Market ETF', 'Country': 'USA', 'Exchange': 'NYSE ARCA',
+         'Currency': 'USD', 'Type': 'ETF', 'Isin': 'US9229087690'},
+    ]
+
+    def test_upsert_inserts_then_updates(self):
+        """La sincronización es idempotente y actualiza los nombres"""
+        self.assertEqual(catalog.upsert('US', self.LISTING), 2)
+        renamed = [dict(self.LISTING[0], Name='Vanguard 500 Index ETF')]
+        catalog.upsert('US', renamed)
+
+        self.assertEqual(Fund.objects.count(), 2)
+        self.assertEqual(Fund.objects.get(symbol='VOO').name, 'Vanguard 500 Index ETF')
+
+    def test_resolve_prefers_configured_exchange(self):
+        catalog.upsert('LSE', [{'Code': 'VOO', 'Name': 'Otro VOO'}])
+        catalog.upsert('US', self.LISTING)
+        self.assertEqual(catalog.resolve(' voo ').exchange, 'US')
+        self.assertIsNone(catalog.resolve('NOPE'))
+
+    def test_search_returns_basic_results(self):
+        catalog.upsert('US', self.LISTING)
+        results = catalog.search('vanguard')
+        self.assertEqual({r['symbol'] for r in results}, {'VOO', 'VTI'})
+        self.assertEqual(set(results[0]), {'symbol', 'shortname', 'longname', 'exchange', 'type', 'score'})
+
+    def test_full_text_search_prefixes_and_ranking(self):
+        """Las palabras se buscan como prefijos y el nombre pesa más que la categoría"""
+        catalog.upsert('US', self.LISTING + [{'Code': 'BND', 'Name': 'Total Bond Market Fund'}])
+        Fund.objects.filter(symbol='VOO').update(benchmark='Large Blend total')
+
+        self.assertEqual([r['symbol'] for r in catalog.search('vang tot')], ['VTI', 'VOO'])
+        self.assertEqual([r['symbol'] for r in catalog.search('vang tot stock')], ['VTI'])
+        ranked = [r['symbol'] for r in catalog.search('total')]
+        self.assertEqual(set(ranked), {'VTI', 'BND', 'VOO'})
+        self.assertEqual(ranked[-1], 'VOO')
+        self.assertEqual(catalog.search('!!!'), [])
+
+    @patch('apiControl.control.EODHDService')
+    @patch('apiControl.control.YFinanceService.getSearchData')
+    def test_generic_search_uses_local_catalog(self, mock_yfinance, mock_eodhd):
+        """Una búsqueda por nombre se resuelve sin llamadas a proveedores"""
+        catalog.upsert('US', self.LISTING)
+        result = generic_search('Total Stock')
+
+        self.assertEqual([r['symbol'] for r in result], ['VTI'])
+        mock_yfinance.assert_not_called()
+        mock_eodhd.assert_not_called()
+
+    @patch('apiControl.control.EODHDService')
+    @patch('apiControl.control.YFinanceService.getSearchData')
+    def test_generic_search_uncatalogued_ticker_asks_provider(self, mock_yfinance, mock_eodhd):
+        """Un ticker que no está en el catálogo no se responde con coincidencias por nombre"""
+        catalog.upsert('US', self.LISTING)
+        mock_yfinance.return_value = [{'symbol': 'TOTL', 'name': 'SPDR DoubleLine Total Return'}]
+        self.assertEqual(generic_search('totl'), mock_yfinance.return_value)
+
+        # Si el proveedor no lo conoce, se devuelven las coincidencias del catálogo
+        mock_yfinance.return_value = None
+        self.assertEqual([r['symbol'] for r in generic_search('total')], ['VTI'])
+        self.assertEqual(mock_yfinance.call_count, 2)
+        mock_eodhd.assert_not_called()
+
+    @patch('apiControl.management.commands.sync_catalog.EODHDService')
+    def test_sync_catalog_command(self, mock_eodhd):
+        """El comando sincroniza las bolsas pendientes y omite las recientes"""
+        from django.core.management import call_command
+        from io import StringIO
+        mock_eodhd.return_value.getExchangeSymbols.return_value = self.LISTING
+
+        call_command('sync_catalog', 'US', stdout=StringIO())
+        call_command('sync_catalog', 'US', stdout=StringIO())
+
+        mock_eodhd.return_value.getExchangeSymbols.assert_called_once_with('US')
+        self.assertEqual(Fund.objects.filter(exchange='US').count(), 2)
+
+
+    @patch('apiControl.management.commands.sync_catalog.EODHDService')
+    def test_sync_catalog_removes_delisted_symbols(self, mock_eodhd):
+        """Los símbolos que ya no vienen en el listado de la bolsa salen del catálogo"""
+        from django.core.management import call_command
+        from io import StringIO
+        catalog.upsert('US', self.LISTING)
+        catalog.upsert('LSE', [{'Code': 'VUSA', 'Name': 'Vanguard S&P 500 UCITS ETF'}])
+        Fund.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        mock_eodhd.return_value.getExchangeSymbols.return_value = self.LISTING[:1]
+
+        out = StringIO()
+        call_command('sync_catalog', 'US', stdout=out)
+
+        self.assertEqual(list(Fund.objects.filter(exchange='US').values_list('symbol', flat=True)), ['VOO'])
+        self.assertTrue(Fund.objects.filter(symbol='VUSA').exists())
+        self.assertIn("1 retirados", out.getvalue())
+
+        # Un listado vacío no vacía la bolsa
+        mock_eodhd.return_value.getExchangeSymbols.return_value = []
+        call_command('sync_catalog', 'US', '--force', stdout=StringIO())
+        self.assertTrue(Fund.objects.filter(symbol='VOO').exists())
+
+
+class SymbolValidationTests(TestCase):
+    """Tests para la validación de símbolos con filtro de Bloom y caché negativa"""
+
+    def setUp(self):
+        symbols.clear()
+
+    def tearDown(self):
+        symbols.clear()
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        items = [f"SYM{i}" for i in range(2000)]
+        bloom = symbols.BloomFilter.from_items(items, 0.01)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f"OTHER{i}" in bloom for i in range(2000))
+        self.assertLess(false_positives, 100)
+
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
+    def test_catalog_symbol_validated_without_provider(self, mock_search):
+        catalog.upsert('US', [{'Code': 'VOO', 'Name': 'Vanguard S&P 500 ETF'}])
+        self.assertTrue(symbols.symbol_exists(' voo '))
+        mock_search.assert_not_called()
+
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
+    def test_missing_symbol_is_negatively_cached(self, mock_search):
+        """Un símbolo inexistente solo se consulta una vez al proveedor mientras no caduque"""
+        mock_search.return_value = None
+        self.assertFalse(symbols.symbol_exists('NOPE'))
+        self.assertFalse(symbols.symbol_exists('nope'))
+        mock_search.assert_called_once_with('NOPE')
+
+        with override_settings(SYMBOL_NEGATIVE_TTL=0):
+            symbols.clear()
+            symbols.symbol_exists('NOPE')
+            symbols.symbol_exists('NOPE')
+        self.assertEqual(mock_search.call_count, 3)
+
+    @override_settings(SYMBOL_CHECKED_MAX_ENTRIES=2)
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
+    def test_checked_symbols_are_bounded(self, mock_search):
+        """Las comprobaciones guardadas se acotan con LRU y las caducadas se descartan al leer"""
+        mock_search.return_value = None
+        for symbol in ('AAA', 'BBB', 'CCC'):
+            symbols.symbol_exists(symbol)
+        self.assertEqual(list(symbols._checked), ['BBB', 'CCC'])
+
+        with override_settings(SYMBOL_NEGATIVE_TTL=0):
+            symbols.symbol_exists('DDD')
+        self.assertIsNone(symbols._recall('DDD'))
+        self.assertNotIn('DDD', symbols._checked)
+
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
+    def test_provider_errors_are_not_cached(self, mock_search):
+        mock_search.side_effect = [Exception("timeout"), {'symbol': 'QQQ'}]
+        with self.assertRaises(Exception):
+            symbols.symbol_exists('QQQ')
+        self.assertTrue(symbols.symbol_exists('QQQ'))
+        self.assertTrue(symbols.symbol_exists('QQQ'))
+        self.assertEqual(mock_search.call_count, 2)
+
+
+class HistorySeriesTests(TestCase):
+    """Tests para la serie histórica sobre arrays de numpy"""
+
+    def make_series(self):
+        frame = pd.DataFrame({
+            'Open': [10.0, 11.0, 12.0, 13.0],
+            'High': [11.0, 12.0, 13.0, 14.0],
+            'Low': [9.0, 10.0, 11.0, 12.0],
+            'Close': [10.5, 11.5, float('nan'), 13.5],
+            'Volume': [100, 200, 300, 400],
+        }, index=pd.date_range('2024-01-01', periods=4, tz='America/New_York'))
+        return HistorySeries.from_frame(frame)
+
+    def test_arrays_and_legacy_keys(self):
+        """Arrays contiguos y compatibilidad con el dict de listas clásico"""
+        series = self.make_series()
+        self.assertEqual(series.dates.dtype, np.dtype('datetime64[D]'))
+        self.assertEqual(series.close.dtype, np.float64)
+        self.assertIs(series.prices, series.close)
+        self.assertEqual(set(series.keys()), {'dates', 'prices', 'open', 'high', 'low', 'close', 'volumes'})
+        self.assertIsInstance(series['dates'], list)
+        self.assertEqual(series['dates'][0], pd.Timestamp('2024-01-01'))
+        self.assertEqual(series['volumes'], [100.0, 200.0, 300.0, 400.0])
+        self.assertNotIn('foo', series)
+
+    def test_window_is_zero_copy_view(self):
+        series = self.make_series()
+        part = series.window('2024-01-02', '2024-01-03')
+        self.assertEqual(len(part), 2)
+        self.assertTrue(np.shares_memory(part.close, series.close))
+        self.assertEqual(len(series.window(start='2025-01-01')), 0)
+        self.assertEqual(series.nearest('2023-06-01'), 0)
+        self.assertEqual(series.nearest('2024-01-03 18:00'), 2)
+
+    def test_chart_export_and_coerce(self):
+        """Los NaN se exportan como null y los dicts clásicos se convierten ordenados"""
+        series = self.make_series()
+        chart = series.to_chart()
+        self.assertEqual(chart['dates'][0], '2024-01-01')
+        self.assertIsNone(chart['prices'][2])
+        self.assertEqual(series.to_candles()['volume'], [100.0, 200.0, 300.0, 400.0])
+
+        legacy = HistorySeries.coerce({'dates': ['2024-01-02', '2024-01-01'], 'prices': [2.0, 1.0]})
+        self.assertEqual(legacy.close.tolist(), [1.0, 2.0])
+        self.assertIsNone(legacy.to_candles())
+        self.assertIsNone(HistorySeries.coerce({'dates': [], 'prices': []}))
+
+    def test_pickle_roundtrip(self):
+        """La serie también se puede serializar con pickle"""
+        import pickle
+        series = self.make_series()
+        restored = pickle.loads(pickle.dumps(series.window('2024-01-02'), protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(restored.date_strings(), ['2024-01-02', '2024-01-03', '2024-01-04'])
+        self.assertEqual(restored.volume.tolist(), [200.0, 300.0, 400.0])
+
+
+class CodecTests(TestCase):
+    """Tests para la serialización binaria de los resultados cacheados"""
+
+    def make_series(self, periods=300):
+        frame = pd.DataFrame({
+            column: np.linspace(1, 2, periods) for column in ('Open', 'High', 'Low', 'Close', 'Volume')
+        }, index=pd.date_range('2020-01-01', periods=periods))
+        return HistorySeries.from_frame(frame)
+
+    def test_series_roundtrip_as_raw_buffers(self):
+        """La serie ocupa prácticamente lo mismo que sus arrays y se lee sin copias"""
+        series = self.make_series()
+        payload = codec.dumps(series)
+        self.assertLess(len(payload), series.nbytes + 32)
+
+        restored = codec.loads(payload)
+        self.assertEqual(restored.date_strings(), series.date_strings())
+        np.testing.assert_array_equal(restored.volume, series.volume)
+        self.assertTrue(restored.close.flags.aligned)
+        self.assertFalse(restored.close.flags.writeable)
+
+    def test_info_dict_roundtrip(self):
+        """Los dicts de información conservan tipos, claves numéricas y fechas"""
+        info = {
+            'symbol': 'VOO', 'price': 412.5, 'change': -3, 'marketCap': 2 ** 40, 'etf': True,
+            'sector': None, 'tags': ['a', 'b'], 'pair': (1, 'x'), 'years': {2020: {'return': 1.5}},
+            'updated': datetime(2024, 1, 2, 15, 30), 'listed': pd.Timestamp('2010-09-07', tz='UTC'),
+            'name': 'ñ' * 40, 'history': self.make_series(10),
+        }
+        restored = codec.loads(codec.dumps(info))
+        series = restored.pop('history')
+        info.pop('history')
+        self.assertEqual(restored, info)
+        self.assertEqual(len(series), 10)
+
+    def test_unsupported_values_fall_back_to_pickle(self):
+        frame = pd.DataFrame({'a': [1, 2]})
+        pd.testing.assert_frame_equal(codec.loads(codec.dumps(frame)), frame)
+
+    def test_unknown_version_is_rejected(self):
+        """Las entradas de otra versión del formato no se leen y cuentan como fallo de caché"""
+        payload = codec.dumps({'a': 1})
+        stale = payload[:3] + bytes([codec.VERSION + 1]) + payload[4:]
+        self.assertFalse(codec.is_current(stale))
+        with self.assertRaises(codec.CodecError):
+            codec.loads(stale)
+
+        with override_settings(API_CACHE_ALIAS='default'):
+            cache.clear()
+            key = cache.make_key('compare', 'marketCap', ('VOO',))
+            cache._backend().set(key, (time.time() + 60, stale, 0.0), timeout=60)
+            self.assertEqual(cache._lookup(key), (None, None))
+            cache.clear()
+
+
+class AnnualReturnsTests(TestCase):
+    """Tests para el cálculo vectorizado de rentabilidades anuales"""
+
+    def test_first_and_last_price_of_each_year(self):
+        hist = {
+            'dates': ['2021-03-01', '2021-12-30', '2022-01-03', '2022-06-01', '2022-12-30', '2024-01-02', '2024-05-01'],
+            'prices': [100.0, 110.0, 112.0, 90.0, 99.0, 120.0, 126.0],
+        }
+        result = returns.annual_returns(hist)
+
+        self.assertEqual(list(result['annual_returns']), [2021, 2022, 2024])
+        self.assertEqual(result['annual_returns'][2021], {'return': 10.0, 'start_price': 100.0, 'end_price': 110.0, 'data_points': 2})
+        self.assertEqual(result['annual_returns'][2022]['return'], round((99 / 112 - 1) * 100, 2))
+        self.assertEqual(result['annual_returns'][2024]['data_points'], 2)
+        self.assertEqual(result['date_range'], {'start': '2021-03-01', 'end': '2024-05-01'})
+        self.assertEqual(result['total_data_points'], 7)
+        self.assertAlmostEqual(result['cagr'], round(((126 / 100) ** (365.25 / 1157) - 1) * 100, 2))
+
+    def test_many_symbols_match_single_symbol(self):
+        """El cálculo en lote da lo mismo que símbolo a símbolo"""
+        rng = np.random.default_rng(1)
+        histories = {
+            symbol: HistorySeries(pd.bdate_range(start, periods=periods), 100 + rng.random(periods))
+            for symbol, start, periods in (('A', '2001-05-01', 2000), ('B', '2015-01-01', 300), ('C', '2020-12-31', 1))
+        }
+        histories['EMPTY'] = None
+        batch = returns.annual_returns_many(histories)
+
+        self.assertIsNone(batch['EMPTY'])
+        self.assertIsNone(batch['C']['cagr'])
+        for symbol in ('A', 'B', 'C'):
+            self.assertEqual(batch[symbol], returns.annual_returns(histories[symbol]))
+        self.assertEqual(YFinanceService.calculateAnnualReturns(histories['A']), batch['A'])
+
+    def test_invalid_prices_are_skipped(self):
+        hist = {'dates': ['2020-01-02', '2020-12-31', '2021-01-04', '2021-12-31'], 'prices': [0.0, 10.0, 10.0, float('nan')]}
+        result = returns.annual_returns(hist)
+        self.assertEqual(result['annual_returns'], {})
+        self.assertIsNone(result['cagr'])
+
+    def test_benchmark_command(self):
+        from django.core.management import call_command
+        from io import StringIO
+        out, err = StringIO(), StringIO()
+        call_command('bench_returns', symbols=2, years=3, repeat=1, stdout=out, stderr=err)
+        self.assertIn('Vectorizado en lote', out.getvalue())
+        self.assertEqual(err.getvalue(), '')
+
+
+class TrailingReturnsTests(TestCase):
+    """Tests para la tabla de rentabilidades por periodo"""
+
+    def make_series(self, start, end):
+        dates = pd.date_range(start, end, freq='D')
+        return HistorySeries(dates, [100.0 * (1.0001 ** i) for i in range(len(dates))])
+
+    def test_anchors_by_calendar_period(self):
+        series = self.make_series('2018-01-01', '2024-03-31')
+        table = returns.trailing_returns(series)
+
+        self.assertEqual(table['as_of'], '2024-03-31')
+        periods = table['periods']
+        self.assertEqual(list(periods), list(returns.TRAILING_PERIODS))
+        self.assertEqual(periods['1M']['start_date'], '2024-02-29')  # Fin de mes recortado
+        self.assertEqual(periods['YTD']['start_date'], '2023-12-31')
+        self.assertEqual(periods['5Y']['start_date'], '2019-03-31')
+        self.assertAlmostEqual(periods['1Y']['return'], (1.0001 ** 366 - 1) * 100)
+        self.assertIsNone(periods['6M']['annualized'])
+        self.assertAlmostEqual(periods['5Y']['annualized'], (1.0001 ** 365.25 - 1) * 100, places=2)
+        self.assertIsNone(periods['10Y'])  # La serie no cubre el periodo
+
+    def test_many_symbols_and_cutoff(self):
+        """Varios símbolos a la vez; con 'now' se ignoran los datos posteriores"""
+        histories = {
+            'OLD': self.make_series('2010-01-01', '2024-01-01'),
+            'NEW': self.make_series('2023-06-01', '2024-01-01'),
+            'NONE': None,
+        }
+        tables = returns.trailing_returns_many(histories, now='2023-12-01')
+
+        self.assertEqual(tables['OLD']['as_of'], '2023-12-01')
+        self.assertIsNotNone(tables['OLD']['periods']['10Y'])
+        self.assertIsNone(tables['NEW']['periods']['1Y'])
+        self.assertEqual(tables['NEW']['periods']['6M']['start_date'], '2023-06-01')  # Dentro de la tolerancia
+        self.assertIsNone(tables['NONE'])
+        self.assertEqual(tables['OLD'], returns.trailing_returns(histories['OLD'], now='2023-12-01'))
+        self.assertIsNone(returns.trailing_returns(histories['NEW'], now='2020-01-01'))
+
+    def test_fund_metrics_use_trailing_table(self):
+        series = self.make_series('2021-01-01', '2024-01-01')
+        metrics = compute_fund_metrics(series, now=pd.Timestamp('2024-01-01'))
+        self.assertEqual(metrics['growth_last_year'], metrics['trailing_returns']['periods']['1Y']['return'])
+        self.assertIsNone(metrics['growth_5y_avg'])  # Sin 5 años de historia no hay CAGR a 5 años
+
+
+@override_settings(RISK_FREE_RATE=0.0, RISK_VAR_CONFIDENCE=0.95, RISK_LOOKBACK_YEARS=3)
+class RiskMetricsTests(TestCase):
+    """Tests para las métricas de riesgo vectorizadas"""
+
+    PRICES = [100.0, 110.0, 99.0, 88.0, 95.0, 121.0]
+
+    def test_metrics_match_reference_formulas(self):
+        series = HistorySeries(pd.date_range('2024-01-01', periods=6), self.PRICES)
+        result = risk.risk_metrics(series)
+        daily = np.diff(self.PRICES) / np.array(self.PRICES[:-1])
+
+        self.assertAlmostEqual(result['daily_volatility'], daily.std(ddof=1) * 100)
+        self.assertAlmostEqual(result['volatility'], daily.std(ddof=1) * np.sqrt(252) * 100)
+        self.assertAlmostEqual(result['sharpe'], daily.mean() / daily.std(ddof=1) * np.sqrt(252))
+        downside = np.sqrt(np.mean(np.minimum(daily, 0) ** 2))
+        self.assertAlmostEqual(result['sortino'], daily.mean() / downside * np.sqrt(252))
+        self.assertAlmostEqual(result['max_drawdown'], (88 / 110 - 1) * 100)
+        self.assertEqual(result['max_drawdown_days'], 3)
+        self.assertAlmostEqual(result['var_historical'], -np.percentile(daily, 5) * 100)
+        self.assertGreater(result['var_parametric'], 0)
+        self.assertEqual(result['observations'], 5)
+
+    def test_many_symbols_with_different_lengths(self):
+        """La matriz rellena con NaN da lo mismo que cada serie por separado"""
+        rng = np.random.default_rng(2)
+        histories = {
+            'LONG': HistorySeries(pd.bdate_range('2015-01-01', periods=3000), 100 * np.cumprod(1 + rng.normal(0, 0.01, 3000))),
+            'SHORT': HistorySeries(pd.bdate_range('2023-01-01', periods=40), self.PRICES * 6 + self.PRICES[:4]),
+            'TINY': HistorySeries(pd.bdate_range('2023-01-01', periods=2), [1.0, 2.0]),
+            'NONE': None,
+        }
+        batch = risk.risk_metrics_many(histories)
+
+        self.assertIsNone(batch['TINY'])
+        self.assertIsNone(batch['NONE'])
+        self.assertLessEqual(batch['LONG']['data_points'], 3 * 262)
+        for symbol in ('LONG', 'SHORT'):
+            self.assertEqual(batch[symbol], risk.risk_metrics(histories[symbol]))
+
+    @patch('apiControl.services.yfinance_service.YFinanceService.getHistoricalProfit')
+    def test_annual_volatility_uses_stored_history(self, mock_history):
+        mock_history.return_value = HistorySeries(pd.date_range('2022-01-01', periods=800), np.linspace(100, 200, 800))
+        result = YFinanceService.getAnualVolatility('VOO')
+        self.assertEqual(result['period'], '1y')
+        self.assertLessEqual(result['data_points'], 367)
+        self.assertGreater(result['volatility'], 0)
+
+
+@override_settings(ROLLING_WINDOW=30)
+class RollingStatsTests(TestCase):
+    """Tests para las estadísticas móviles incrementales"""
+
+    def make_series(self, periods, seed=4):
+        rng = np.random.default_rng(seed)
+        prices = 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, periods))
+        return HistorySeries(pd.bdate_range('2023-01-02', periods=periods), prices)
+
+    def reference(self, series):
+        """Cálculo completo con pandas sobre toda la serie"""
+        prices = pd.Series(series.close)
+        changes = prices.pct_change()
+        window = changes.rolling(30, min_periods=rolling.MIN_PERIODS)
+        positions = np.arange(len(prices))
+        return {
+            'mean_return': window.mean() * 100,
+            'volatility': window.std() * np.sqrt(252) * 100,
+            'rolling_return': (prices / prices.values[positions - np.minimum(positions, 30)] - 1) * 100,
+            'drawdown': (prices / prices.cummax() - 1) * 100,
+        }
+
+    def assert_matches_reference(self, series):
+        expected = self.reference(series)
+        stored = rolling.chart_series('SYM')
+        offset = len(series) - len(stored['dates'])
+        self.assertEqual(offset, rolling.MIN_PERIODS)
+        for field, values in expected.items():
+            np.testing.assert_allclose(stored[field], values.values[offset:], rtol=1e-8, atol=1e-9)
+
+    def test_incremental_matches_full_recompute(self):
+        """Añadir las barras de una en una da lo mismo que calcularlo todo de golpe"""
+        series = self.make_series(80)
+        rolling.update('SYM', series.window(end=series.dates[59]))
+        for end in range(60, 80):
+            processed = rolling.update('SYM', series.window(end=series.dates[end]))
+            # La penúltima barra es el punto de control: se recalculan la última y la nueva
+            self.assertEqual(processed, 2)
+        self.assert_matches_reference(series)
+
+    def test_full_rebuild_after_price_adjustment(self):
+        """Si los precios anteriores cambian (split o dividendo) se recalcula todo"""
+        series = self.make_series(60)
+        rolling.update('SYM', series)
+        adjusted = HistorySeries(series.dates, series.close * 0.5)
+        self.assertEqual(rolling.update('SYM', adjusted), 60)
+        self.assert_matches_reference(adjusted)
+        self.assertEqual(RollingStat.objects.filter(symbol='SYM').count(), 60 - rolling.MIN_PERIODS)
+
+    def test_price_store_updates_rolling_stats(self):
+        """El almacén de precios actualiza las estadísticas al guardar barras nuevas"""
+        hist = pd.DataFrame({'Close': self.make_series(40).close}, index=pd.bdate_range('2023-01-02', periods=40))
+        price_store.get_history('sym', MagicMock(return_value=hist))
+
+        state = RollingState.objects.get(symbol='SYM')
+        self.assertEqual(state.last_date, hist.index[-2].date())
+        self.assertEqual(state.count, 30)
+        self.assertEqual(len(rolling.chart_series('sym')['dates']), 40 - rolling.MIN_PERIODS)
+
+    def test_chart_series_without_data(self):
+        self.assertIsNone(rolling.chart_series('NONE'))
+
+
+class PricePanelTests(TestCase):
+    """Tests para el panel de precios alineado por fecha"""
+
+    def test_alignment_and_forward_fill(self):
+        """Los festivos de cada bolsa se rellenan con el último cierre; antes del primero, NaN"""
+        histories = {
+            'US': HistorySeries(['2024-01-02', '2024-01-03', '2024-01-05'], [10.0, 11.0, 12.0]),
+            'EU': HistorySeries(['2024-01-03', '2024-01-04'], [20.0, 21.0]),
+            'NONE': None,
+        }
+        result = panel.build_panel(histories)
+
+        self.assertEqual(result.symbols, ['US', 'EU'])
+        self.assertEqual(result.date_strings(), ['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'])
+        np.testing.assert_array_equal(result.column('US'), [10.0, 11.0, 11.0, 12.0])
+        np.testing.assert_array_equal(result.column('EU'), [np.nan, 20.0, 21.0, 21.0])
+        self.assertEqual(result.common().date_strings(), ['2024-01-03', '2024-01-04', '2024-01-05'])
+
+    def test_stale_series_stop_after_gap(self):
+        """Una serie que deja de cotizar no se arrastra más de PANEL_FFILL_MAX_DAYS días"""
+        histories = {
+            'LIVE': HistorySeries(pd.date_range('2024-01-01', periods=30), np.arange(30.0) + 1),
+            'DEAD': HistorySeries(pd.date_range('2024-01-01', periods=10), np.ones(10)),
+        }
+        result = panel.build_panel(histories, max_gap_days=5)
+        dead = result.column('DEAD')
+        self.assertEqual(int(np.count_nonzero(~np.isnan(dead))), 15)
+
+    def test_common_period_metrics_match_pandas(self):
+        rng = np.random.default_rng(5)
+        histories = {
+            'A': HistorySeries(pd.bdate_range('2020-01-01', periods=800), 100 * np.cumprod(1 + rng.normal(0, 0.01, 800))),
+            'B': HistorySeries(pd.bdate_range('2021-01-01', periods=400), 50 * np.cumprod(1 + rng.normal(0, 0.02, 400))),
+        }
+        built = panel.build_panel(histories)
+        metrics = panel.common_period_metrics(built)
+        frame = built.common().to_frame()
+
+        self.assertEqual(metrics['A']['start_date'], '2021-01-01')
+        for symbol in ('A', 'B'):
+            prices = frame[symbol]
+            self.assertAlmostEqual(metrics[symbol]['return'], (prices.iloc[-1] / prices.iloc[0] - 1) * 100)
+            self.assertAlmostEqual(metrics[symbol]['volatility'], prices.pct_change().std() * np.sqrt(252) * 100)
+            self.assertAlmostEqual(metrics[symbol]['max_drawdown'], (prices / prices.cummax() - 1).min() * 100)
+
+
+@override_settings(API_CACHE_ALIAS='default')
+class CorrelationTests(TestCase):
+    """Tests para las matrices de correlación y covarianza con caché incremental"""
+
+    def setUp(self):
+        cache.clear()
+        rng = np.random.default_rng(6)
+        common = rng.normal(0, 0.01, 500)
+        self.dates = pd.bdate_range('2022-01-03', periods=500)
+        self.prices = {
+            'A': 100 * np.cumprod(1 + common + rng.normal(0, 0.005, 500)),
+            'B': 50 * np.cumprod(1 - common + rng.normal(0, 0.005, 500)),
+            'C': 10 * np.cumprod(1 + rng.normal(0, 0.01, 500)),
+        }
+
+    def histories(self, bars=500, scale=1.0):
+        return {symbol: HistorySeries(self.dates[:bars], prices[:bars] * scale) for symbol, prices in self.prices.items()}
+
+    def expected(self, bars):
+        frame = pd.DataFrame({symbol: prices[:bars] for symbol, prices in self.prices.items()})
+        return frame.pct_change().dropna()
+
+    def test_matrix_matches_numpy(self):
+        result = correlation.correlation_matrix(self.histories())
+        returns = self.expected(500)
+
+        self.assertEqual(result['symbols'], ['A', 'B', 'C'])
+        self.assertEqual(result['observations'], 499)
+        np.testing.assert_allclose(result['correlation'], returns.corr().values, atol=1e-10)
+        np.testing.assert_allclose(result['covariance'], returns.cov().values * 252, atol=1e-12)
+        self.assertLess(result['correlation'][0][1], -0.5)
+
+    def test_new_bars_update_cached_sums(self):
+        """Con barras nuevas solo se procesan las sesiones posteriores a la guardada"""
+        correlation.correlation_matrix(self.histories(400))
+        with patch('apiControl.correlation._sums', wraps=correlation._sums) as sums:
+            result = correlation.correlation_matrix(self.histories(500))
+        self.assertEqual(len(sums.call_args.args[0]), 101)  # Última sesión guardada + 100 nuevas
+        np.testing.assert_allclose(result['correlation'], self.expected(500).corr().values, atol=1e-10)
+        self.assertEqual(result['observations'], 499)
+
+    def test_cache_keyed_by_symbol_set_and_range(self):
+        """El orden de los símbolos no cambia la entrada; el rango sí"""
+        correlation.correlation_matrix(self.histories())
+        histories = self.histories()
+        reordered = {symbol: histories[symbol] for symbol in ('C', 'A', 'B')}
+        with patch('apiControl.correlation._sums', wraps=correlation._sums) as sums:
+            result = correlation.correlation_matrix(reordered)
+            sums.assert_not_called()
+            ranged = correlation.correlation_matrix(reordered, start='2022-06-01')
+            sums.assert_called_once()
+        self.assertEqual(result['symbols'], ['C', 'A', 'B'])
+        self.assertEqual(ranged['start_date'], '2022-06-01')
+
+    def test_adjusted_prices_trigger_recompute(self):
+        correlation.correlation_matrix(self.histories(400))
+        with patch('apiControl.correlation._sums', wraps=correlation._sums) as sums:
+            correlation.correlation_matrix(self.histories(500, scale=0.5))
+        self.assertEqual(len(sums.call_args.args[0]), 500)
+
+    def test_missing_histories(self):
+        histories = self.histories()
+        result = correlation.correlation_matrix({'A': histories['A'], 'X': None, 'B': histories['B']})
+        self.assertEqual(result['symbols'], ['A', 'B'])
+        self.assertEqual(result['missing'], ['X'])
+        self.assertIsNone(correlation.correlation_matrix({'A': histories['A'], 'X': None}))
+
+
+class SimilarityTests(TestCase):
+    """Tests para el índice de fondos similares"""
+
+    def store(self, symbol, prices, end='2024-06-28'):
+        dates = pd.bdate_range(end=end, periods=len(prices))
+        PriceBar.objects.bulk_create([
+            PriceBar(symbol=symbol, date=day.date(), close=float(close)) for day, close in zip(dates, prices)
+        ])
+
+    def test_nearest_neighbours_match_brute_force(self):
+        matrix = np.random.default_rng(7).normal(size=(50, 4))
+        with patch('apiControl.similarity._BLOCK', 16):
+            indices, distances = similarity.nearest_neighbours(matrix, 3)
+
+        full = np.linalg.norm(matrix[:, None] - matrix[None, :], axis=2)
+        np.fill_diagonal(full, np.inf)
+        np.testing.assert_array_equal(indices, np.argsort(full, axis=1)[:, :3])
+        np.testing.assert_allclose(distances, np.sort(full, axis=1)[:, :3])
+
+    def test_build_index_from_stored_histories(self):
+        """Los fondos con perfiles parecidos quedan como vecinos; los que no tienen un año, fuera"""
+        rng = np.random.default_rng(8)
+        steady = lambda: 100 * np.cumprod(1 + 0.0006 + rng.normal(0, 0.003, 400))
+        falling = lambda: 100 * np.cumprod(1 - 0.001 + rng.normal(0, 0.03, 400))
+        for symbol, prices in (('CALM1', steady()), ('CALM2', steady()), ('WILD1', falling()),
+                               ('WILD2', falling()), ('NEW', steady()[:100]), ('GONE', steady())):
+            self.store(symbol, prices)
+        catalog.upsert('US', [{'Code': code} for code in ('CALM1', 'CALM2', 'WILD1', 'WILD2', 'NEW')])
+
+        count = similarity.build_index(neighbours=2, now='2024-06-28')
+
+        self.assertEqual(count, 4)
+        self.assertFalse(FundProfile.objects.filter(symbol='NEW').exists())
+        self.assertFalse(FundProfile.objects.filter(symbol='GONE').exists())  # Fuera del catálogo
+        self.assertEqual(similarity.similar_funds('calm1')[0]['symbol'], 'CALM2')
+        self.assertEqual(similarity.similar_funds('WILD2')[0]['symbol'], 'WILD1')
+        nearest = similarity.similar_funds('CALM2', limit=1)
+        self.assertEqual(len(nearest), 1)
+        self.assertIsNotNone(nearest[0]['return1y'])
+        self.assertEqual(similarity.similar_funds('NEW'), [])
+
+    @patch('apiControl.similarity.price_store.get_history')
+    def test_backfill_downloads_missing_catalog_histories(self, mock_history):
+        """Solo se descargan los fondos del catálogo sin histórico almacenado, por lotes"""
+        catalog.upsert('US', [{'Code': code} for code in ('VOO', 'VTI', 'BND')])
+        PriceSeriesState.objects.create(symbol='VOO', first_date='2024-01-02', last_date='2024-06-28',
+                                        last_refresh=timezone.now())
+        fetch = MagicMock()
+        mock_history.side_effect = lambda symbol, fetcher: None if symbol == 'BND' else HistorySeries(
+            pd.date_range('2024-01-01', periods=3), [1.0, 2.0, 3.0])
+
+        self.assertEqual(similarity.backfill_histories(fetch, batch_size=1), 1)
+        self.assertEqual(sorted(call.args for call in mock_history.call_args_list), [('BND', fetch), ('VTI', fetch)])
+
+    @patch('apiControl.similarity.build_index', return_value=2)
+    @patch('apiControl.similarity.backfill_histories', return_value=3)
+    def test_build_similarity_command_reports_catalog_coverage(self, mock_backfill, mock_build):
+        from django.core.management import call_command
+        from io import StringIO
+        catalog.upsert('US', [{'Code': code} for code in ('VOO', 'VTI', 'BND', 'QQQ')])
+        out = StringIO()
+        call_command('build_similarity', stdout=out)
+
+        mock_backfill.assert_called_once_with(YFinanceService.downloadHistory)
+        self.assertIn("2 de 4 fondos del catálogo indexados", out.getvalue())
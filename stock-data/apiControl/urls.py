@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("cache-stats/", views.cache_stats_view, name="cache_stats"),
+]
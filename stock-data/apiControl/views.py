@@ -1,3 +1,12 @@
-from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 
-# Create your views here.
+from . import cache
+
+
+@staff_member_required
+def cache_stats_view(request):
+    """
+    Contadores de aciertos/fallos de la caché de perform_api_call de este proceso
+    """
+    return JsonResponse(cache.cache_stats())
@@ -1,10 +1,16 @@
 from django.test import TestCase
 from django.urls import reverse
+from datetime import date
 from unittest.mock import patch, MagicMock
 
+from apiControl import symbols
+
 class CompareViewTest(TestCase):
+    def setUp(self):
+        symbols.clear()
+
     @patch('compareFund.views.compare_fund')
-    @patch('compareFund.views.YFinanceService.getSearchData')
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
     def test_compare_view_success(self, mock_getSearchData, mock_compare_fund):
         # Simula que ambos fondos existen
         mock_getSearchData.side_effect = [True, True]
@@ -20,7 +26,7 @@ class CompareViewTest(TestCase):
         self.assertIn('comparison_table', response.context)
         self.assertIsNone(response.context['error'])
 
-    @patch('compareFund.views.YFinanceService.getSearchData')
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
     def test_compare_view_fund_not_found(self, mock_getSearchData):
         # Simula que el primer fondo no existe
         mock_getSearchData.side_effect = [None, True]
@@ -28,4 +34,129 @@ class CompareViewTest(TestCase):
         response = self.client.get('/compareFund/', {'fund1': 'F1', 'fund2': 'F2'})
         self.assertEqual(response.status_code, 200)
         self.assertIn('error', response.context)
-        self.assertIn("No se encontró el fondo", response.context['error'])
\ No newline at end of file
+        self.assertIn("No se encontró el fondo", response.context['error'])
+
+    @patch('compareFund.views.compare_fund')
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
+    def test_compare_view_catalog_symbols_skip_provider(self, mock_getSearchData, mock_compare_fund):
+        # Los fondos del catálogo local se validan sin llamar a yfinance
+        from apiControl import catalog
+        catalog.upsert('US', [{'Code': 'F1', 'Name': 'Fondo 1'}, {'Code': 'F2', 'Name': 'Fondo 2'}])
+        mock_df = MagicMock()
+        mock_df.empty = False
+        mock_df.to_html.return_value = "<table></table>"
+        mock_compare_fund.return_value = (mock_df, {}, {}, {'F1': 10, 'F2': 20}, {'F1': 5, 'F2': 7})
+
+        response = self.client.get('/compareFund/', {'fund1': 'F1', 'fund2': 'F2'})
+        self.assertIsNone(response.context['error'])
+        mock_getSearchData.assert_not_called()
+
+    @patch('compareFund.views.compare_fund')
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
+    def test_compare_view_many_funds(self, mock_getSearchData, mock_compare_fund):
+        # fund1/fund2 más la lista 'funds', sin repetidos y en el mismo orden
+        mock_getSearchData.return_value = True
+        mock_df = MagicMock()
+        mock_df.empty = False
+        mock_df.to_html.return_value = "<table></table>"
+        mock_compare_fund.return_value = (mock_df, {}, {}, {'F1': 10, 'F3': 30}, {})
+
+        response = self.client.get('/compareFund/', {'fund1': 'f1', 'fund2': 'F2', 'funds': 'F3, f4 F1'})
+        self.assertIsNone(response.context['error'])
+        mock_compare_fund.assert_called_once_with('F1', 'F2', 'F3', 'F4')
+        self.assertEqual(mock_getSearchData.call_count, 4)
+        self.assertEqual(response.context['growth_rows'][2], ('F3', 30, None))
+
+    @patch('apiControl.symbols.YFinanceService.getSearchData')
+    def test_compare_view_reports_all_missing_funds(self, mock_getSearchData):
+        mock_getSearchData.side_effect = lambda symbol: symbol == 'F1'
+        response = self.client.get('/compareFund/', {'funds': 'F1,F2,F3'})
+        self.assertEqual(response.context['error'], "No se encontraron los fondos: F2, F3")
+
+    def test_compare_view_limits_number_of_funds(self):
+        funds = ','.join(f'F{i}' for i in range(31))
+        with self.settings(COMPARE_MAX_FUNDS=30):
+            response = self.client.get('/compareFund/', {'funds': funds})
+        self.assertIn("como máximo 30", response.context['error'])
+
+class CorrelationViewTest(TestCase):
+    @patch('compareFund.views.correlate_funds')
+    def test_correlation_heatmap(self, mock_correlate):
+        mock_correlate.return_value = {
+            'symbols': ['F1', 'F2'], 'missing': [], 'start_date': '2024-01-02', 'end_date': '2024-06-28',
+            'observations': 120, 'correlation': [[1.0, 0.4], [0.4, 1.0]], 'covariance': [[0.04, 0.01], [0.01, 0.03]],
+        }
+        response = self.client.get('/compareFund/correlation/', {'funds': 'f1, f2', 'start': '2024-01-01'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['error'])
+        mock_correlate.assert_called_once_with(['F1', 'F2'], date(2024, 1, 1), None)
+        self.assertContains(response, 'correlationChart')
+
+    def test_correlation_needs_two_funds_and_valid_dates(self):
+        response = self.client.get('/compareFund/correlation/', {'funds': 'F1'})
+        self.assertIn("al menos dos", response.context['error'])
+        response = self.client.get('/compareFund/correlation/', {'funds': 'F1,F2', 'end': '28/06/2024'})
+        self.assertIn("AAAA-MM-DD", response.context['error'])
+
+class CompareFundTest(TestCase):
+    @patch('compareFund.utils.perform_api_call')
+    def test_compare_fund_single_history_fetch(self, mock_perform_api_call):
+        # Un único histórico por fondo: el resto de métricas se derivan de él
+        import pandas as pd
+        dates = pd.date_range(end=pd.Timestamp.now(), periods=400, freq='D')
+        hist = {'dates': list(dates), 'prices': [100.0 + i for i in range(400)]}
+
+        def fake_call(action, symbol, field=None):
+            return hist if field == 'historicalProfit' else None
+        mock_perform_api_call.side_effect = fake_call
+
+        from .utils import compare_fund
+        df, price_series, annual_returns_series, growth_last_year, growth_5y_avg = compare_fund('F1', 'F2')
+
+        fields = [call.args[2] for call in mock_perform_api_call.call_args_list]
+        self.assertEqual(fields.count('historicalProfit'), 2)
+        self.assertNotIn('annualReturns', fields)
+        self.assertNotIn('anualVolatility', fields)
+        self.assertIn('F1', price_series)
+        self.assertIn('F2', annual_returns_series)
+        self.assertNotEqual(df.loc['F1', 'anualVolatility'], 'N/A')
+        # Tabla de rentabilidades por periodo en la comparación
+        self.assertTrue(df.loc['F1', 'return1Y'].endswith('%'))
+        self.assertEqual(df.loc['F2', 'return5Y'], 'N/A')
+        # Métricas de riesgo sin llamadas adicionales
+        self.assertEqual(df.loc['F1', 'maxDrawdown'], '0.00%')
+        self.assertIn('sharpe', df.columns)
+
+    def test_rating_uses_numeric_volatility(self):
+        from .utils import calculate_fund_rating
+        data = {'historicalProfit': {'dates': ['2020-01-01', '2024-01-01'], 'prices': [100.0, 150.0]}}
+        self.assertEqual(calculate_fund_rating(data, 20.0), "★★★★★")
+        self.assertEqual(calculate_fund_rating(dict(data, anualVolatility="20.00%")), "★★★★★")
+        self.assertEqual(calculate_fund_rating(data), "☆☆☆☆☆")
+
+    @patch('compareFund.utils.perform_api_call')
+    def test_compare_many_funds_common_period(self, mock_perform_api_call):
+        # Varios fondos con calendarios distintos: una fila por fondo y métricas sobre el tramo común
+        import pandas as pd
+        end = pd.Timestamp.now().normalize()
+        histories = {
+            'F1': {'dates': list(pd.bdate_range(end=end, periods=600)), 'prices': [100.0 + i for i in range(600)]},
+            'F2': {'dates': list(pd.date_range(end=end, periods=300)), 'prices': [50.0 + i for i in range(300)]},
+            'F3': {'dates': list(pd.bdate_range(end=end, periods=200)), 'prices': [10.0] * 200},
+        }
+
+        def fake_call(action, symbol, field=None):
+            return histories.get(symbol) if field == 'historicalProfit' else None
+        mock_perform_api_call.side_effect = fake_call
+
+        from .utils import compare_fund
+        df, price_series, *_ = compare_fund('F1', 'F2', 'F3', 'F4')
+
+        self.assertEqual(list(df.index), ['F1', 'F2', 'F3', 'F4'])
+        self.assertEqual(set(price_series), {'F1', 'F2', 'F3'})
+        # El tramo común empieza con la serie más corta
+        start = pd.bdate_range(end=end, periods=200)[0].date().isoformat()
+        self.assertTrue(df.loc['F1', 'commonPeriod'].startswith(start))
+        self.assertEqual(df.loc['F3', 'commonReturn'], '0.00%')
+        self.assertEqual(df.loc['F4', 'commonReturn'], 'N/A')
@@ -5,4 +5,5 @@ from . import views
 
 urlpatterns = [
     path("", views.compare_view, name="compare_view"),
+    path("correlation/", views.correlation_view, name="correlation_view"),
 ]
\ No newline at end of file
@@ -1,41 +1,76 @@
+import asyncio
+from datetime import date
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from .utils import compare_fund
-from apiControl.services.yfinance_service import YFinanceService
+from .utils import compare_fund, correlate_funds
+from apiControl import symbols
+from apiControl.concurrency import arun
 
 
+async def _resolved(value):
+    return value
 
-def compare_view(request):
+
+def _requested_symbols(request):
+    """
+    Símbolos pedidos: fund1 y fund2 (formulario clásico) seguidos de la lista 'funds'
+    separada por comas o espacios, en mayúsculas y sin repetir
+    """
+    raw = [request.GET.get('fund1', ''), request.GET.get('fund2', '')]
+    raw += request.GET.get('funds', '').replace(',', ' ').split()
+    return list(dict.fromkeys(s.strip().upper() for s in raw if s.strip()))
+
+
+async def compare_view(request):
     f1 = request.GET.get('fund1', '').strip().upper()
     f2 = request.GET.get('fund2', '').strip().upper()
+    funds = _requested_symbols(request)
     
-    print(f"[DEBUG] Fondos recibidos: fund1={f1}, fund2={f2}")
+    print(f"[DEBUG] Fondos recibidos: {funds}")
     
     context = {
         'fund1': f1,
         'fund2': f2,
+        'funds': funds,
+        'extra_funds': ', '.join(s for s in funds if s not in (f1, f2)),
         'comparison_table': None,
         'error': None
     }
     
-    if not f1 and not f2:
-        return render(request, 'compareFund/compare.html', context)
+    if not funds:
+        return await sync_to_async(render)(request, 'compareFund/compare.html', context)
+
+    if len(funds) > settings.COMPARE_MAX_FUNDS:
+        context['error'] = f"Se pueden comparar como máximo {settings.COMPARE_MAX_FUNDS} fondos"
+        return await sync_to_async(render)(request, 'compareFund/compare.html', context)
     
     try:
-        # Verificar que ambos fondos existen
-        fund1_data = YFinanceService.getSearchData(f1)
-        fund2_data = YFinanceService.getSearchData(f2)
+        # Verificar que todos los fondos existen: primero catálogo y caché locales y solo
+        # los símbolos desconocidos se consultan al proveedor (en paralelo)
+        known = await sync_to_async(lambda: [symbols.lookup(s) for s in funds])()
+        found = await asyncio.wait_for(
+            asyncio.gather(*(
+                arun(symbols.confirm, symbol) if exists is None else _resolved(exists)
+                for symbol, exists in zip(funds, known)
+            )),
+            timeout=settings.COMPARE_DEADLINE_SECONDS,
+        )
         
-        if not fund1_data:
-            context['error'] = f"No se encontró el fondo: {f1}"
-            return render(request, 'compareFund/compare.html', context)
-            
-        if not fund2_data:
-            context['error'] = f"No se encontró el fondo: {f2}"
-            return render(request, 'compareFund/compare.html', context)
+        missing = [symbol for symbol, exists in zip(funds, found) if not exists]
+        if missing:
+            if len(missing) == 1:
+                context['error'] = f"No se encontró el fondo: {missing[0]}"
+            else:
+                context['error'] = f"No se encontraron los fondos: {', '.join(missing)}"
+            return await sync_to_async(render)(request, 'compareFund/compare.html', context)
         
-        # Si ambos fondos existen, proceder con la comparación
-        print(f"[DEBUG] Intentando comparar fondos: {f1} vs {f2}")
-        df, price_series, annual_returns_series, growth_last_year, growth_5y_avg = compare_fund(f1, f2)
+        # Si todos los fondos existen, proceder con la comparación
+        print(f"[DEBUG] Intentando comparar fondos: {' vs '.join(funds)}")
+        # Fuera del pool de apiControl para que compare_fund pueda repartir sus descargas en él
+        df, price_series, annual_returns_series, growth_last_year, growth_5y_avg = await sync_to_async(
+            compare_fund, thread_sensitive=False
+        )(*funds)
         
         if not df.empty:
             comparison_table = df.to_html(classes="table table-bordered table-striped")
@@ -45,6 +80,9 @@ def compare_view(request):
             context['growth_last_year'] = growth_last_year
             context['growth_5y_avg'] = growth_5y_avg
             # Pasar valores simples para el template
+            context['growth_rows'] = [
+                (symbol, growth_last_year.get(symbol), growth_5y_avg.get(symbol)) for symbol in funds
+            ]
             context['growth_last_year_fund1'] = growth_last_year.get(f1)
             context['growth_last_year_fund2'] = growth_last_year.get(f2)
             context['growth_5y_avg_fund1'] = growth_5y_avg.get(f1)
@@ -58,4 +96,51 @@ def compare_view(request):
         print(f"[DEBUG] Error en la comparación: {str(e)}")
         context['error'] = f"Error al realizar la comparación: {str(e)}"
     
-    return render(request, 'compareFund/compare.html', context)
\ No newline at end of file
+    return await sync_to_async(render)(request, 'compareFund/compare.html', context)
+
+
+async def correlation_view(request):
+    """
+    Mapa de calor de la correlación de rentabilidades diarias entre los fondos pedidos
+    """
+    funds = _requested_symbols(request)
+    context = {
+        'funds': funds,
+        'funds_query': ', '.join(funds),
+        'start': request.GET.get('start', '').strip(),
+        'end': request.GET.get('end', '').strip(),
+        'matrix': None,
+        'error': None,
+        'warning': None,
+    }
+    if not funds:
+        return await sync_to_async(render)(request, 'compareFund/correlation.html', context)
+
+    if len(funds) < 2:
+        context['error'] = "Introduce al menos dos fondos"
+    elif len(funds) > settings.COMPARE_MAX_FUNDS:
+        context['error'] = f"Se pueden comparar como máximo {settings.COMPARE_MAX_FUNDS} fondos"
+    if context['error']:
+        return await sync_to_async(render)(request, 'compareFund/correlation.html', context)
+
+    try:
+        start = date.fromisoformat(context['start']) if context['start'] else None
+        end = date.fromisoformat(context['end']) if context['end'] else None
+    except ValueError:
+        context['error'] = "Las fechas deben tener el formato AAAA-MM-DD"
+        return await sync_to_async(render)(request, 'compareFund/correlation.html', context)
+
+    try:
+        # Fuera del pool de apiControl para que las descargas se repartan en él
+        matrix = await sync_to_async(correlate_funds, thread_sensitive=False)(funds, start, end)
+        if matrix is None:
+            context['error'] = "No hay suficientes datos históricos comunes para calcular la correlación"
+        else:
+            context['matrix'] = matrix
+            if matrix['missing']:
+                context['warning'] = f"Sin histórico para: {', '.join(matrix['missing'])}"
+    except Exception as e:
+        print(f"[DEBUG] Error en la correlación: {str(e)}")
+        context['error'] = f"Error al calcular la correlación: {str(e)}"
+
+    return await sync_to_async(render)(request, 'compareFund/correlation.html', context)
@@ -40,7 +40,7 @@ class ClientUserModelTest(TestCase):
         self.assertEqual(user.get_full_name(), 'Juan Pérez')
 
 class GetMarketTrendsTest(TestCase):
-    @patch('home.views.requests.get')
+    @patch('home.views.http_client.get')
     def test_get_market_trends_success(self, mock_get):
         # Respuesta existosa
         mock_get.return_value.status_code = 200
@@ -51,7 +51,7 @@ class GetMarketTrendsTest(TestCase):
         self.assertIn('most_active', data)
         self.assertEqual(data['most_active'][0]['symbol'], 'AAPL')
 
-    @patch('home.views.requests.get')
+    @patch('home.views.http_client.get')
     def test_get_market_trends_api_error(self, mock_get):
         # Error
         mock_get.return_value.status_code = 500
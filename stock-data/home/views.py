@@ -1,5 +1,6 @@
-import requests
+import asyncio
 import pandas as pd
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout, authenticate
@@ -8,20 +9,25 @@ from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm
 from .models import ClientUser
+from apiControl.services import http_client
 
 
-def get_market_trends():
+def _market_trends_endpoints():
     api_key = settings.FMP_API_KEY
     base_url = 'https://financialmodelingprep.com/api/v3/stock/'
-    endpoints = {
+    return {
         'most_active': f'{base_url}actives?apikey={api_key}',
         'gainers': f'{base_url}gainers?apikey={api_key}',
         'losers': f'{base_url}losers?apikey={api_key}',
     }
+
+
+def get_market_trends():
+    endpoints = _market_trends_endpoints()
     data = {}
     for key, url in endpoints.items():
         try:
-            resp = requests.get(url, timeout=10)
+            resp = http_client.get('fmp', url)
             if resp.status_code == 200:
                 data[key] = resp.json().get('mostActiveStock', resp.json())
             else:
@@ -31,8 +37,26 @@ def get_market_trends():
     return data
 
 
-def home_view(request):
-    market_trends = get_market_trends()
+async def aget_market_trends():
+    """
+    Igual que get_market_trends, pero con las tres consultas a la vez sobre el cliente compartido
+    """
+    async def fetch(url):
+        try:
+            resp = await http_client.aget(url)
+            if resp.status_code == 200:
+                return resp.json().get('mostActiveStock', resp.json())
+            return []
+        except Exception as e:
+            return []
+
+    endpoints = _market_trends_endpoints()
+    results = await asyncio.gather(*(fetch(url) for url in endpoints.values()))
+    return dict(zip(endpoints, results))
+
+
+async def home_view(request):
+    market_trends = await aget_market_trends()
     sort = request.GET.get('sort')
     order = request.GET.get('order')
     tab = request.GET.get('tab', 'most_active')
@@ -64,7 +88,7 @@ def home_view(request):
                     df[sort_col] = df[sort_col].apply(format_change)
                 market_trends[tab] = df.to_dict(orient='records')
 
-    return render(request, 'home/home.html', {
+    return await sync_to_async(render)(request, 'home/home.html', {
         'market_trends': market_trends,
         'sort': sort,
         'order': order,
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class SearchfundConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'searchFund'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from . import autocomplete
+
+        # El índice de autocompletado se carga en segundo plano al arrancar el servidor
+        request_started.connect(autocomplete.warm_up)
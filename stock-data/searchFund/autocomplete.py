@@ -0,0 +1,273 @@
+# searchFund/autocomplete.py
+import heapq
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from apiControl.models import Fund
+
+_TOKEN_RE = re.compile(r"[a-z0-9&]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def _trigrams(token: str) -> List[str]:
+    padded = f"${token}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _within_distance(a: str, b: str, max_distance: int) -> bool:
+    """
+    Distancia de Levenshtein acotada: se abandona en cuanto la fila supera el máximo
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+
+def _prefix_range(sorted_keys: List[str], prefix: str) -> Tuple[int, int]:
+    start = bisect_left(sorted_keys, prefix)
+    end = bisect_left(sorted_keys, prefix + '\uffff', lo=start)
+    return start, end
+
+
+class AutocompleteIndex:
+    """
+    Índice en memoria para sugerencias mientras se escribe: prefijos de símbolo y de
+    palabras del nombre sobre arrays ordenados (búsqueda binaria) y trigramas de las
+    palabras para tolerar erratas. No hace consultas a la base de datos ni a proveedores.
+
+    Los registros se numeran por prioridad (bolsa preferida, símbolo más corto), así que
+    las listas de ids ordenadas ya están en orden de relevancia y cada consulta se
+    detiene en cuanto tiene 'limit' resultados.
+    """
+
+    # Con más palabras que esto para un prefijo, es más barato recorrer los registros en orden
+    MAX_MERGED_WORDS = 256
+
+    def __init__(self, rows):
+        preferred = [e.upper() for e in settings.SEARCH_PREFERRED_EXCHANGES]
+
+        # Un registro por símbolo, el de la bolsa preferida
+        best: Dict[str, Tuple[int, str, str, str]] = {}
+        for symbol, name, exchange, fund_type in rows:
+            symbol = (symbol or '').upper()
+            if not symbol:
+                continue
+            rank = preferred.index(exchange.upper()) if exchange and exchange.upper() in preferred else len(preferred)
+            current = best.get(symbol)
+            if current is None or rank < current[0]:
+                best[symbol] = (rank, name or '', exchange or '', fund_type or '')
+
+        ordered = sorted(best.items(), key=lambda item: (item[1][0], len(item[0]), item[0]))
+        self.entries = [
+            {'symbol': symbol, 'name': name, 'exchange': exchange, 'type': fund_type}
+            for symbol, (rank, name, exchange, fund_type) in ordered
+        ]
+        self.entry_words = [tuple(_tokens(entry['name'])) for entry in self.entries]
+
+        self.symbols = sorted((entry['symbol'], i) for i, entry in enumerate(self.entries))
+        self.symbol_keys = [symbol for symbol, _ in self.symbols]
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for i, words in enumerate(self.entry_words):
+            for word in set(words):
+                postings[word].append(i)
+        self.words = sorted(postings)
+        self.postings = {word: array('i', ids) for word, ids in postings.items()}
+
+        self.trigrams: Dict[str, List[str]] = defaultdict(list)
+        for word in self.words:
+            for gram in set(_trigrams(word)):
+                self.trigrams[gram].append(word)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _fuzzy_words(self, token: str) -> List[str]:
+        """
+        Palabras del índice a distancia de edición 1 (2 para palabras largas) del término
+        """
+        max_distance = 1 if len(token) <= 5 else 2
+        grams = _trigrams(token)
+        counts = Counter(word for gram in set(grams) for word in self.trigrams.get(gram, ()))
+        minimum = max(len(grams) - 3 * max_distance, 1)
+        candidates = [word for word, shared in counts.most_common(200) if shared >= minimum]
+        return [word for word in candidates if _within_distance(token, word, max_distance)]
+
+    def _candidates(self, words: List[str]) -> Iterator[int]:
+        """
+        Ids (en orden de prioridad y sin repetir) de los registros con alguna de las palabras
+        """
+        if len(words) > self.MAX_MERGED_WORDS:
+            wanted = set(words)
+            return (i for i, entry_words in enumerate(self.entry_words) if wanted.intersection(entry_words))
+        merged = heapq.merge(*(self.postings[word] for word in words))
+        return (i for i, _ in groupby(merged))
+
+    def _selectivity(self, words: List[str]) -> int:
+        if len(words) > self.MAX_MERGED_WORDS:
+            return len(self.entries)
+        return sum(len(self.postings[word]) for word in words)
+
+    def _collect(self, matchers, limit: int, seen: set) -> List[int]:
+        """
+        Recorre los candidatos del criterio más selectivo y se queda con los que cumplen todos
+        """
+        matchers = sorted(matchers, key=lambda matcher: self._selectivity(matcher[0]))
+        words, _ = matchers[0]
+        found = []
+        for i in self._candidates(words):
+            if i in seen:
+                continue
+            entry_words = self.entry_words[i]
+            if all(any(accepts(word) for word in entry_words) for _, accepts in matchers[1:]):
+                found.append(i)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def _prefix_matcher(self, token: str):
+        start, end = _prefix_range(self.words, token)
+        return self.words[start:end], lambda word: word.startswith(token)
+
+    def _fuzzy_matcher(self, token: str):
+        start, end = _prefix_range(self.words, token)
+        words = set(self.words[start:end])
+        if len(token) >= 3:
+            words.update(self._fuzzy_words(token))
+        return sorted(words), words.__contains__
+
+    def suggest(self, query: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        limit = limit or settings.AUTOCOMPLETE_MAX_RESULTS
+        query = (query or '').strip()
+        if not query or not self.entries:
+            return []
+
+        # 1. Símbolo exacto y prefijo de símbolo
+        symbol_query = query.upper()
+        start, end = _prefix_range(self.symbol_keys, symbol_query)
+        exact = [i for symbol, i in self.symbols[start:end] if symbol == symbol_query]
+        prefixed = heapq.nsmallest(limit, (i for symbol, i in self.symbols[start:end] if symbol != symbol_query))
+        ranked = exact + prefixed
+        seen = set(ranked)
+
+        # 2. Todas las palabras del término como prefijos de palabras del nombre
+        tokens = list(dict.fromkeys(_tokens(query)))
+        if tokens and len(ranked) < limit:
+            found = self._collect([self._prefix_matcher(t) for t in tokens], limit - len(ranked), seen)
+            ranked += found
+            seen.update(found)
+
+        # 3. Si faltan resultados, palabras parecidas (erratas)
+        if tokens and len(ranked) < limit:
+            ranked += self._collect([self._fuzzy_matcher(t) for t in tokens], limit - len(ranked), seen)
+
+        return [dict(self.entries[i]) for i in ranked[:limit]]
+
+
+_index: Optional[AutocompleteIndex] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def build_index() -> AutocompleteIndex:
+    try:
+        rows = list(Fund.objects.values_list('symbol', 'name', 'exchange', 'type'))
+    except DatabaseError as e:
+        print(f"[DEBUG] Catálogo no disponible para el autocompletado: {e}")
+        rows = []
+    return AutocompleteIndex(rows)
+
+
+def refresh() -> AutocompleteIndex:
+    """
+    Reconstruye el índice desde el catálogo y lo sustituye de forma atómica
+    """
+    global _index, _loaded_at
+    started = time.monotonic()
+    index = build_index()
+    with _lock:
+        _index, _loaded_at = index, time.monotonic()
+    print(f"[DEBUG] Índice de autocompletado cargado: {len(index)} símbolos en {time.monotonic() - started:.2f}s")
+    return index
+
+
+def _refresh_in_background() -> None:
+    try:
+        refresh()
+    finally:
+        connections.close_all()
+        _refreshing.clear()
+
+
+def refresh_async() -> None:
+    """
+    Lanza una recarga en segundo plano (como mucho una a la vez)
+    """
+    with _lock:
+        if _refreshing.is_set():
+            return
+        _refreshing.set()
+    threading.Thread(target=_refresh_in_background, name='autocomplete-refresh', daemon=True).start()
+
+
+def get_index() -> AutocompleteIndex:
+    """
+    Índice actual. La primera vez se carga en el momento; después, si ha caducado,
+    se sigue sirviendo el actual mientras se recarga en segundo plano
+    """
+    index = _index
+    if index is None:
+        with _lock:
+            index = _index
+        if index is None:
+            return refresh()
+    if time.monotonic() - _loaded_at > settings.AUTOCOMPLETE_REFRESH_SECONDS:
+        refresh_async()
+    return index
+
+
+def warm_up(**kwargs) -> None:
+    """
+    Receptor de request_started: carga el índice en segundo plano con la primera
+    petición que recibe el proceso, antes de que nadie escriba en el buscador
+    """
+    from django.core.signals import request_started
+
+    request_started.disconnect(warm_up)
+    if _index is None:
+        refresh_async()
+
+
+def suggest(query: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    return get_index().suggest(query, limit)
+
+
+def clear() -> None:
+    global _index, _loaded_at
+    with _lock:
+        _index, _loaded_at = None, 0.0
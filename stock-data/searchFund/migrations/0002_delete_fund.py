@@ -0,0 +1,16 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("searchFund", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="Fund",
+        ),
+    ]
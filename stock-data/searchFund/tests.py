@@ -1,6 +1,14 @@
-from django.test import TestCase
-from unittest.mock import patch, MagicMock
-from .utils import search_fund_data
+import asyncio
+import time
+from django.test import TestCase, override_settings
+from unittest.mock import patch, MagicMock, AsyncMock
+from .utils import search_fund_data, get_recommended_funds, get_recommended_funds_by_sector
+from .views import enrich_search_results
+from . import autocomplete
+from datetime import date
+from apiControl import catalog
+from apiControl.models import FundProfile, RollingStat
+from django.utils import timezone
 
 class SearchViewTest(TestCase):
     @patch('searchFund.views.search_fund_data')
@@ -34,7 +42,7 @@ class SearchViewTest(TestCase):
         self.assertIn('Por favor, introduce', response.context['error'])
 
 class FundDetailsViewTest(TestCase):
-    @patch('searchFund.views.perform_api_call')
+    @patch('searchFund.views.aperform_api_call', new_callable=AsyncMock)
     def test_fund_details_view_success(self, mock_perform_api_call):
         # Datos de un fondo
         mock_details = {'symbol': 'AMZN', 'name': 'Amazon'}
@@ -55,6 +63,20 @@ class FundDetailsViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('details', response.context)
         self.assertIn('line_data', response.context)
+        self.assertIsNone(response.context['rolling_data'])
+
+    @patch('searchFund.views.aperform_api_call', new_callable=AsyncMock)
+    def test_fund_details_view_rolling_chart(self, mock_perform_api_call):
+        # Las estadísticas móviles guardadas se pasan a la plantilla para el gráfico
+        RollingStat.objects.create(symbol='AMZN', date=date(2024, 1, 2), mean_return=0.1,
+                                   volatility=20.0, rolling_return=5.0, drawdown=-3.0)
+        mock_perform_api_call.side_effect = [{'symbol': 'AMZN'}, None, None]
+
+        response = self.client.get('/searchFund/details/AMZN/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['rolling_data']['dates'], ['2024-01-02'])
+        self.assertEqual(response.context['rolling_data']['volatility'], [20.0])
+        self.assertContains(response, 'rolling-chart')
 
 class SearchFundDataTest(TestCase):
     @patch('searchFund.utils.perform_api_call')
@@ -72,4 +94,185 @@ class SearchFundDataTest(TestCase):
         # Respuesta sin resultados
         mock_perform_api_call.return_value = None
         result = search_fund_data('INVALID')
-        self.assertIsNone(result)
\ No newline at end of file
+        self.assertIsNone(result)
+
+class SearchPipelineTest(TestCase):
+    @patch('searchFund.utils.perform_api_call')
+    def test_only_top_k_are_enriched(self, mock_perform_api_call):
+        # Solo se buscan los detalles de los mejores resultados de la página pedida
+        basic = [
+            {'symbol': f'F{i}', 'exchange': 'LSE' if i % 2 else 'US', 'score': i}
+            for i in range(20)
+        ]
+
+        def fake_call(action, symbol, field=None):
+            if symbol == 'vanguard':
+                return basic
+            return [{'symbol': symbol, 'name': symbol, 'price': 1.0}]
+
+        mock_perform_api_call.side_effect = fake_call
+        page = search_fund_data('vanguard', page=1, page_size=3)
+
+        # 1 búsqueda por nombre + 3 detalles, primero los de EE. UU. con mayor score
+        self.assertEqual(mock_perform_api_call.call_count, 4)
+        self.assertEqual([r['symbol'] for r in page], ['F18', 'F16', 'F14'])
+        self.assertTrue(page.has_next)
+        self.assertEqual(page.total, 20)
+
+        mock_perform_api_call.reset_mock()
+        last = search_fund_data('vanguard', page=7, page_size=3)
+        self.assertEqual([r['symbol'] for r in last], ['F3', 'F1'])
+        self.assertFalse(last.has_next)
+
+
+class EnrichSearchResultsTest(TestCase):
+    @patch('searchFund.views.get_recommended_funds')
+    @patch('searchFund.views.aperform_api_call', new_callable=AsyncMock)
+    def test_enrichment_runs_concurrently(self, mock_call, mock_recommended):
+        # Detalles y sectores de todas las filas se piden a la vez
+        async def slow_call(action, symbol, field=None):
+            await asyncio.sleep(0.2)
+            if field == 'categorySector':
+                return {'category': 'Technology'}
+            return [{'symbol': symbol, 'name': symbol.title(), 'price': 1.0}]
+
+        mock_call.side_effect = slow_call
+        mock_recommended.return_value = [{'symbol': 'XLK'}]
+        basic = [{'symbol': s, 'longname': s, 'exchange': 'US', 'score': 1} for s in ('VOO', 'VTI', 'VGT')]
+
+        started = time.monotonic()
+        results, recommended, timed_out = asyncio.run(enrich_search_results(basic))
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(mock_call.await_count, 6)
+        self.assertEqual([r['price'] for r in results], [1.0, 1.0, 1.0])
+        self.assertEqual(results[0]['sector'], 'Technology')
+        self.assertEqual(recommended, [{'symbol': 'XLK'}])
+        self.assertFalse(timed_out)
+
+    @override_settings(SEARCH_ENRICH_DEADLINE_SECONDS=0.1)
+    @patch('searchFund.views.aperform_api_call', new_callable=AsyncMock)
+    def test_rows_past_deadline_get_placeholders(self, mock_call):
+        # Las filas que no terminan a tiempo se muestran con marcadores
+        async def call(action, symbol, field=None):
+            if symbol == 'SLOW':
+                await asyncio.sleep(5)
+            return {'category': 'Technology'} if field else [{'symbol': symbol, 'price': 1.0}]
+
+        mock_call.side_effect = call
+        basic = [{'symbol': 'SLOW', 'longname': 'Slow Fund'}, {'symbol': 'FAST', 'longname': 'Fast Fund'}]
+
+        started = time.monotonic()
+        results, recommended, timed_out = asyncio.run(enrich_search_results(basic))
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(timed_out)
+        self.assertTrue(results[0]['enrichment_pending'])
+        self.assertEqual(results[0]['name'], 'Slow Fund')
+        self.assertEqual(results[1]['price'], 1.0)
+        self.assertIsNone(recommended)
+
+
+class RecommendedFundsTest(TestCase):
+    @patch('searchFund.utils.perform_batch_api_call')
+    def test_recommended_funds_single_batch(self, mock_batch):
+        # Los fondos recomendados se piden en una sola llamada por lotes
+        mock_batch.return_value = {
+            'XLK': {'symbol': 'XLK', 'name': 'Technology Select'},
+            'VGT': {'symbol': 'VGT', 'name': 'Vanguard IT'},
+        }
+        funds = get_recommended_funds_by_sector('Technology', exclude_symbol='QQQ', max_results=3)
+        mock_batch.assert_called_once_with("search", ['XLK', 'VGT', 'SMH'])
+        self.assertEqual([f['symbol'] for f in funds], ['XLK', 'VGT'])
+        self.assertTrue(all(f['is_recommended'] for f in funds))
+
+
+    @patch('searchFund.utils.perform_batch_api_call')
+    def test_recommended_funds_from_similarity_index(self, mock_batch):
+        # Con el símbolo indexado no se llama a los proveedores: nombres desde el catálogo
+        catalog.upsert('US', [{'Code': 'VOO', 'Name': 'Vanguard S&P 500 ETF', 'Type': 'ETF'}])
+        FundProfile.objects.create(symbol='SPY', features=[0.0], neighbours=['VOO', 'IVV'],
+                                   distances=[0.1, 0.3], built_at=timezone.now())
+        FundProfile.objects.create(symbol='VOO', features=[0.1], return1y=12.5, volatility=15.0,
+                                   neighbours=['SPY'], distances=[0.1], built_at=timezone.now())
+
+        funds = get_recommended_funds('spy', sector='Technology')
+
+        mock_batch.assert_not_called()
+        self.assertEqual([f['symbol'] for f in funds], ['VOO', 'IVV'])
+        self.assertEqual(funds[0]['name'], 'Vanguard S&P 500 ETF')
+        self.assertEqual(funds[0]['return1y'], 12.5)
+        self.assertEqual(funds[1]['name'], 'IVV')
+        self.assertTrue(all(f['is_recommended'] for f in funds))
+
+    @patch('searchFund.utils.perform_batch_api_call')
+    def test_recommended_funds_fall_back_to_sector(self, mock_batch):
+        # Un símbolo sin perfil (sin histórico almacenado) recibe los fondos de su sector
+        mock_batch.return_value = {'XLK': {'symbol': 'XLK', 'name': 'Technology Select'}}
+        funds = get_recommended_funds('QQQ', sector='Technology', max_results=2)
+        mock_batch.assert_called_once_with("search", ['XLK', 'VGT'])
+        self.assertEqual([f['symbol'] for f in funds], ['XLK'])
+
+
+    def test_recommended_table_shows_similarity_columns(self):
+        # Rentabilidad, volatilidad y similitud en la tabla de recomendados, no en la de resultados
+        from django.template.loader import render_to_string
+        html = render_to_string('searchFund/search.html', {
+            'results': [{'symbol': 'SPY', 'name': 'SPDR', 'return1y': 0.15, 'change_percent': '1.2%'}],
+            'recommended_funds': [
+                {'symbol': 'VOO', 'name': 'Vanguard', 'return1y': 12.5, 'volatility': 15.0, 'similarity': 0.8},
+                {'symbol': 'XLK', 'name': 'Tech', 'return1y': 0.2, 'volume': 1000},
+            ],
+        })
+        results, recommended = html.split('Fondos Recomendados', 1)
+        self.assertIn('1.2%', results)
+        self.assertNotIn('0.15', results)
+        self.assertIn('12.50%', recommended)
+        self.assertIn('15.00%', recommended)
+        self.assertIn('80%', recommended)
+        self.assertNotIn('0.20%', recommended)
+
+
+class AutocompleteTest(TestCase):
+    ROWS = [
+        ('VOO', 'Vanguard S&P 500 ETF', 'US', 'ETF'),
+        ('VTI', 'Vanguard Total Stock Market ETF', 'US', 'ETF'),
+        ('VT', 'Vanguard Total World Stock ETF', 'US', 'ETF'),
+        ('QQQ', 'Invesco QQQ Trust', 'US', 'ETF'),
+        ('VOO', 'Vanguard S&P 500 (Londres)', 'LSE', 'ETF'),
+    ]
+
+    def setUp(self):
+        autocomplete.clear()
+
+    def tearDown(self):
+        autocomplete.clear()
+
+    def test_symbol_prefix_first(self):
+        # El símbolo exacto va primero y cada símbolo aparece una vez (bolsa preferida)
+        index = autocomplete.AutocompleteIndex(self.ROWS)
+        suggestions = index.suggest('vt')
+        self.assertEqual([s['symbol'] for s in suggestions], ['VT', 'VTI'])
+        self.assertEqual([s['exchange'] for s in index.suggest('VOO')], ['US'])
+
+    def test_name_word_prefixes(self):
+        # Todas las palabras deben coincidir con el inicio de alguna palabra del nombre
+        index = autocomplete.AutocompleteIndex(self.ROWS)
+        symbols = [s['symbol'] for s in index.suggest('vanguard tot')]
+        self.assertEqual(sorted(symbols), ['VT', 'VTI'])
+
+    def test_typo_tolerance(self):
+        # Las erratas se toleran cuando no hay coincidencias exactas suficientes
+        index = autocomplete.AutocompleteIndex(self.ROWS)
+        self.assertEqual(index.suggest('invesko')[0]['symbol'], 'QQQ')
+        self.assertIn('VTI', [s['symbol'] for s in index.suggest('vangaurd total')])
+
+    def test_suggest_endpoint(self):
+        # El endpoint responde desde el índice cargado del catálogo
+        catalog.upsert('US', [{'Code': code, 'Name': name} for code, name, _, _ in self.ROWS[:4]])
+        response = self.client.get('/searchFund/suggest/', {'q': 'invesco'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['suggestions'][0]['symbol'], 'QQQ')
+
+        response = self.client.get('/searchFund/suggest/')
+        self.assertEqual(response.json()['suggestions'], [])
@@ -5,4 +5,5 @@ from . import views
 urlpatterns = [
     path("", views.search_view, name="search_view"),
     path("details/<str:symbol>/", views.fund_details_view, name="fund_details"),
+    path("suggest/", views.suggest_view, name="suggest"),
 ]
\ No newline at end of file
@@ -1,8 +1,10 @@
 import yfinance as yf
 import pandas as pd
-from apiControl.control import perform_api_call
+from django.conf import settings
+from apiControl.control import perform_api_call, perform_batch_api_call
 import requests
-from .models import Fund
+from apiControl.models import Fund
+from apiControl import catalog, similarity
 
 
 def is_basic_fund_info(fund):
@@ -112,24 +114,22 @@ def get_recommended_funds_by_sector(sector, exclude_symbol=None, max_results=5):
         if exclude_symbol:
             recommended_symbols = [s for s in recommended_symbols if s.upper() != exclude_symbol.upper()]
         
-        # Obtener datos de los fondos recomendados
+        # Obtener datos de los fondos recomendados (una sola petición para todos)
+        symbols = recommended_symbols[:max_results]
+        batch_data = perform_batch_api_call("search", symbols)
         recommended_funds = []
-        for symbol in recommended_symbols[:max_results]:
-            try:
-                fund_data = perform_api_call("search", symbol)
-                if fund_data:
-                    if isinstance(fund_data, list):
-                        fund_data = fund_data[0] if fund_data else None
-                    
-                    if fund_data and isinstance(fund_data, dict):
-                        # Añadir información adicional
-                        fund_data['is_recommended'] = True
-                        fund_data['recommendation_reason'] = f"Fondo del sector {sector}"
-                        recommended_funds.append(fund_data)
-                        
-            except Exception as e:
-                print(f"[DEBUG] Error obteniendo datos para {symbol}: {str(e)}")
-                continue
+        for symbol in symbols:
+            fund_data = batch_data.get(symbol.upper())
+            if isinstance(fund_data, list):
+                fund_data = fund_data[0] if fund_data else None
+
+            if fund_data and isinstance(fund_data, dict):
+                # Añadir información adicional
+                fund_data['is_recommended'] = True
+                fund_data['recommendation_reason'] = f"Fondo del sector {sector}"
+                recommended_funds.append(fund_data)
+            else:
+                print(f"[DEBUG] No se obtuvieron datos para {symbol}")
         
         print(f"[DEBUG] Fondos recomendados encontrados: {len(recommended_funds)}")
         return recommended_funds
@@ -138,15 +138,93 @@ def get_recommended_funds_by_sector(sector, exclude_symbol=None, max_results=5):
         print(f"[DEBUG] Error obteniendo fondos recomendados: {str(e)}")
         return []
 
-def search_fund_data(symbol):
+def get_similar_funds(symbol, max_results=5):
+    """
+    Fondos con el perfil de rentabilidad/riesgo más parecido según el índice de similitud,
+    completados con el catálogo local (sin llamadas a proveedores)
+    """
+    neighbours = similarity.similar_funds(symbol, max_results)
+    if not neighbours:
+        return []
+    funds = catalog.resolve_many(n['symbol'] for n in neighbours)
+    recommended_funds = []
+    for neighbour in neighbours:
+        fund = funds.get(neighbour['symbol'])
+        recommended_funds.append({
+            'symbol': neighbour['symbol'],
+            'name': fund.name if fund else neighbour['symbol'],
+            'exchange': fund.exchange if fund else None,
+            'sector': (fund.sector or fund.type) if fund else None,
+            'return1y': neighbour['return1y'],
+            'volatility': neighbour['volatility'],
+            'similarity': neighbour['similarity'],
+            'is_recommended': True,
+            'recommendation_reason': f"Perfil de rentabilidad y riesgo similar a {symbol.upper()}",
+        })
+    return recommended_funds
+
+def get_recommended_funds(symbol, sector=None, max_results=5):
+    """
+    Fondos recomendados para un símbolo: los más parecidos del índice de similitud y,
+    si el símbolo aún no está indexado (sin histórico almacenado), los de su sector
+    """
+    recommended_funds = get_similar_funds(symbol, max_results) if symbol else []
+    if recommended_funds:
+        return recommended_funds
+    return get_recommended_funds_by_sector(sector, exclude_symbol=symbol, max_results=max_results)
+
+class SearchPage(list):
+    """
+    Lista de resultados de una página de búsqueda, con la información de paginación
+    """
+
+    def __init__(self, results, page=1, has_next=False, total=None):
+        super().__init__(results)
+        self.page = page
+        self.has_next = has_next
+        self.total = total if total is not None else len(results)
+
+
+def rank_basic_results(results):
+    """
+    Ordena los resultados básicos de EODHD: primero las bolsas preferidas (en el orden
+    de SEARCH_PREFERRED_EXCHANGES) y, dentro de cada una, por 'score' descendente
+    """
+    preferred = [e.upper() for e in settings.SEARCH_PREFERRED_EXCHANGES]
+
+    def sort_key(fund):
+        exchange = (fund.get('exchange') or '').upper()
+        exchange_rank = preferred.index(exchange) if exchange in preferred else len(preferred)
+        try:
+            score = float(fund.get('score') or 0)
+        except (TypeError, ValueError):
+            score = 0.0
+        return (exchange_rank, -score)
+
+    return sorted(results, key=sort_key)
+
+
+def search_fund_data(symbol, page=1, page_size=None, enrich=True):
     print(f"[DEBUG] Iniciando búsqueda de {symbol}")
+    page_size = page_size or settings.SEARCH_PAGE_SIZE
+    page = max(int(page or 1), 1)
     result = perform_api_call("search", symbol)
     if result:
-        # Si el resultado es una lista de fondos básicos, haz la búsqueda detallada
+        # Si el resultado es una lista de fondos básicos, solo se buscan los detalles
+        # de la página pedida (las siguientes se completan cuando se piden)
         if isinstance(result, list) and all(is_basic_fund_info(f) for f in result if isinstance(f, dict)):
             print("[DEBUG] Resultado contiene solo información básica, se realizará búsqueda detallada por símbolo")
+            candidates = rank_basic_results([f for f in result if isinstance(f, dict)])
+            start = (page - 1) * page_size
+            page_funds = candidates[start:start + page_size]
+            has_next = start + page_size < len(candidates)
+            print(f"[DEBUG] Página {page}: {len(page_funds)} de {len(candidates)} candidatos")
+            if not enrich:
+                # Quien llama completa los detalles (search_view lo hace en paralelo)
+                return SearchPage(page_funds, page, has_next, len(candidates))
+
             detailed_results = []
-            for fund in result:
+            for fund in page_funds:
                 symbol_key = (fund.get('symbol') or fund.get('Code') or '').strip()
                 print(f"[DEBUG] Buscando detalles para símbolo: '{symbol_key}'")
                 if symbol_key:
@@ -167,14 +245,13 @@ def search_fund_data(symbol):
                 else:
                     print(f"[DEBUG] Fondo sin símbolo válido: {fund}")
             print(f"[DEBUG] Resultados detallados finales: {detailed_results}")
-            return detailed_results if detailed_results else result
+            return SearchPage(detailed_results or page_funds, page, has_next, len(candidates))
         else:
             return result
     else:
         print("[DEBUG] No se encontraron resultados para la búsqueda.")
         return None
 
-
 '''
 def search_fund_data(symbol):
     try:
@@ -1,6 +1,13 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponse, Http404
-from apiControl.control import perform_api_call
+from django.http import HttpResponse, Http404, JsonResponse
+from apiControl.control import perform_api_call, aperform_api_call
+from apiControl.concurrency import arun
+from apiControl import rolling
+from apiControl.metrics import compute_fund_metrics
+from apiControl.history import HistorySeries
 #from apiControl.control import DataCoordinator
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -14,7 +21,8 @@ import plotly.io as pio
 # Create your views here.
 from django.http import HttpResponse
 from django.shortcuts import render
-from .utils import search_fund_data, get_recommended_funds_by_sector
+from . import autocomplete
+from .utils import search_fund_data, get_recommended_funds, is_basic_fund_info
 
 def get_fund_sector(symbol):
     """
@@ -36,22 +44,122 @@ def get_fund_sector(symbol):
         print(f"Error obteniendo sector para {symbol}: {str(e)}")
         return None
 
-def search_view(request):
+async def aget_fund_sector(symbol):
+    """
+    Versión asíncrona de get_fund_sector
+    """
+    try:
+        sector_data = await aperform_api_call("compare", symbol, "categorySector")
+        if sector_data:
+            if isinstance(sector_data, dict):
+                return sector_data.get('category')
+            else:
+                return sector_data
+        else:
+            return None
+    except Exception as e:
+        print(f"Error obteniendo sector para {symbol}: {str(e)}")
+        return None
+
+def _main_sector(result):
+    return result.get('sector') or result.get('category') or result.get('benchmark')
+
+async def enrich_search_results(results):
+    """
+    Completa los resultados de una página de búsqueda lanzando a la vez los detalles
+    (solo para los resultados básicos de la búsqueda por nombre), el sector de cada fila
+    y los fondos recomendados del primer resultado. Todo comparte un plazo de
+    SEARCH_ENRICH_DEADLINE_SECONDS: lo que no termina a tiempo se cancela y la fila se
+    muestra con marcadores en lugar de bloquear la página.
+    Devuelve (resultados, recomendados o None, hubo_tiempo_agotado).
+    """
+    async def enrich_row(row):
+        symbol = row.get('symbol')
+        if not symbol:
+            return row
+        details_task = None
+        if is_basic_fund_info(row):
+            details_task = asyncio.ensure_future(aperform_api_call("search", symbol))
+        sector = await aget_fund_sector(symbol)
+        if details_task is not None:
+            details = await details_task
+            if isinstance(details, list):
+                details = next((d for d in details if isinstance(d, dict)), None)
+            if isinstance(details, dict):
+                row = details
+        row['sector'] = sector or None
+        return row
+
+    async def recommend(main_task):
+        main_result = await main_task
+        symbol = main_result.get('symbol')
+        sector = _main_sector(main_result)
+        if not symbol and not sector:
+            print("[DEBUG] Sin símbolo ni sector para buscar fondos recomendados")
+            return []
+        print(f"[DEBUG] Buscando fondos recomendados para {symbol} (sector: {sector})")
+        # Índice de similitud precalculado; el sector solo se usa si el símbolo no está indexado
+        recommended_funds = await arun(
+            get_recommended_funds,
+            symbol,
+            sector=sector,
+            max_results=5
+        )
+        print(f"[DEBUG] Fondos recomendados encontrados: {len(recommended_funds)}")
+        return recommended_funds
+
+    row_tasks = [asyncio.ensure_future(enrich_row(r)) for r in results]
+    recommend_task = asyncio.ensure_future(recommend(row_tasks[0]))
+    done, pending = await asyncio.wait(
+        row_tasks + [recommend_task], timeout=settings.SEARCH_ENRICH_DEADLINE_SECONDS
+    )
+    for task in pending:
+        task.cancel()
+
+    enriched = []
+    for original, task in zip(results, row_tasks):
+        if task in done and task.exception() is None:
+            enriched.append(task.result())
+        else:
+            if task in done:
+                print(f"Error completando {original.get('symbol')}: {task.exception()}")
+            # Marcador: la fila se muestra con lo que ya se tenía
+            original.setdefault('name', original.get('longname') or original.get('shortname'))
+            original['sector'] = None
+            original['enrichment_pending'] = True
+            enriched.append(original)
+
+    recommended_funds = None
+    if recommend_task in done and recommend_task.exception() is None:
+        recommended_funds = recommend_task.result()
+    return enriched, recommended_funds, bool(pending)
+
+async def search_view(request):
     context = {
         'query': None,
         'results': None,
         'error': None,
         'info': None,  # Nuevo campo para mensajes informativos
-        'recommended_funds': None  # Nuevo campo para fondos recomendados
+        'warning': None,
+        'recommended_funds': None,  # Nuevo campo para fondos recomendados
+        'page': 1,
+        'has_next': False,
     }
     
     if request.method == 'GET':
         query = request.GET.get('query', '').strip()
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
         if query:
             try:
-                results = search_fund_data(query)
+                results = await arun(search_fund_data, query, page, enrich=False)
                 
                 if results:
+                    context['page'] = getattr(results, 'page', page)
+                    context['has_next'] = getattr(results, 'has_next', False)
+
                     # Asegurarse de que results sea una lista
                     if not isinstance(results, list):
                         results = [results]
@@ -60,23 +168,16 @@ def search_view(request):
                     results = [r for r in results if r]
                     
                     if results:
-                        # Limitar a 5 resultados máximo
-                        results = results[:5]
-
-                        # Obtener sector para cada fondo
-                        for result in results:
-                            try:
-                                symbol = result.get('symbol')
-                                if symbol:
-                                    sector = get_fund_sector(symbol)
-                                    if sector:
-                                        result['sector'] = sector
-                                    else:
-                                        result['sector'] = None
-                            except Exception as e:
-                                print(f"Error obteniendo sector para {symbol}: {str(e)}")
-                                result['sector'] = None
-                        
+                        # Limitar al tamaño de página
+                        results = results[:settings.SEARCH_PAGE_SIZE]
+
+                        # Detalles, sectores y recomendados a la vez, con un plazo común
+                        results, recommended_funds, timed_out = await enrich_search_results(results)
+                        if recommended_funds is not None:
+                            context['recommended_funds'] = recommended_funds
+                        if timed_out:
+                            context['warning'] = 'Algunos datos no llegaron a tiempo y se muestran incompletos.'
+
                         # Si los resultados vienen de la búsqueda por nombre, mostrar mensaje informativo
                         if all('price' not in r and 'change_percent' not in r and 'volume' not in r for r in results):
                             context['info'] = 'Símbolo no encontrado, se muestran resultados por nombre.'
@@ -90,22 +191,6 @@ def search_view(request):
                         context['results'] = results
                         context['query'] = query
                         
-                        # Obtener fondos recomendados del mismo sector
-                        if results and len(results) > 0:
-                            main_result = results[0]  # Tomar el primer resultado como principal
-                            sector = main_result.get('sector') or main_result.get('category') or main_result.get('benchmark')
-                            
-                            if sector:
-                                print(f"[DEBUG] Buscando fondos recomendados para sector: {sector}")
-                                recommended_funds = get_recommended_funds_by_sector(
-                                    sector=sector, 
-                                    exclude_symbol=main_result.get('symbol'),
-                                    max_results=5
-                                )
-                                context['recommended_funds'] = recommended_funds
-                                print(f"[DEBUG] Fondos recomendados encontrados: {len(recommended_funds)}")
-                            else:
-                                print(f"[DEBUG] No se encontró información de sector para {query}")
                     else:
                         context['error'] = 'No se encontraron resultados válidos para la búsqueda.'
                 else:
@@ -116,81 +201,60 @@ def search_view(request):
         else:
             context['error'] = 'Por favor, introduce un término de búsqueda.'
     
-    return render(request, 'searchFund/search.html', context)
+    return await sync_to_async(render)(request, 'searchFund/search.html', context)
 
-def fund_details_view(request, symbol):
-    details = perform_api_call("search", symbol)
+async def fund_details_view(request, symbol):
+    # Detalles, sector e histórico se piden a la vez
+    details, sector, hist_data = await asyncio.gather(
+        aperform_api_call("search", symbol),
+        aget_fund_sector(symbol),
+        aperform_api_call("compare", symbol, "historicalProfit"),
+    )
+    # Estadísticas móviles guardadas al actualizar el histórico (ya incluyen la descarga anterior)
+    rolling_data = await sync_to_async(rolling.chart_series)(symbol)
     if isinstance(details, list):
         details = details[0] if details else {}
 
-    # Obtener sector del fondo
-    sector = get_fund_sector(symbol)
-
-    hist_data = perform_api_call("compare", symbol, "historicalProfit")
-    df = None
     candlestick_data = None
     line_data = None
     growth_last_year = None
     growth_5y_avg = None
+    trailing_returns = None
 
-    if hist_data and 'dates' in hist_data and 'prices' in hist_data:
-        df = pd.DataFrame({
-            'Fecha': pd.to_datetime(hist_data['dates']),
-            'Precio': hist_data['prices']
-        })
-        df = df.sort_values('Fecha')
-        df['Fecha'] = df['Fecha'].dt.tz_localize(None)  # Eliminar zona horaria
-        # Preparar datos para plotly.js en el frontend
-        line_data = {
-            'dates': df['Fecha'].dt.strftime('%Y-%m-%d').tolist(),
-            'prices': df['Precio'].tolist(),
-        }
+    # Serie para el gráfico y crecimiento (último año y CAGR 5 años) desde la misma descarga
+    metrics = compute_fund_metrics(hist_data)
+    if metrics:
+        line_data = metrics['price_series']
+        growth_last_year = metrics['growth_last_year']
+        growth_5y_avg = metrics['growth_5y_avg']
+        trailing_returns = metrics['trailing_returns']
 
         # Preparar datos OHLCV para plotly.js en el frontend
-        if all(k in hist_data for k in ['open', 'high', 'low', 'close', 'volumes']):
-            candlestick_data = {
-                'dates': pd.to_datetime(hist_data['dates']).strftime('%Y-%m-%d').tolist(),
-                'open': hist_data['open'],
-                'high': hist_data['high'],
-                'low': hist_data['low'],
-                'close': hist_data['close'],
-                'volume': hist_data['volumes'],
-            }
-
-        # Calcular crecimiento del último año
-        now = pd.Timestamp(datetime.now())
-        one_year_ago = now - pd.DateOffset(years=1)
-        df['diff'] = (df['Fecha'] - one_year_ago).abs()
-        row_last_year = df.loc[df['diff'].idxmin()]
-        price_last_year = row_last_year['Precio']
-        price_now = df.iloc[-1]['Precio']
-        if price_last_year != 0:
-            growth_last_year = ((price_now / price_last_year)-1) * 100
-        else:
-            growth_last_year = None
-
-        # Calcular crecimiento medio anual de los últimos 5 años (CAGR)
-        five_years_ago = now - pd.DateOffset(years=5)
-        df['diff_5y'] = (df['Fecha'] - five_years_ago).abs()
-        row_5y_ago = df.loc[df['diff_5y'].idxmin()]
-        price_5y_ago = row_5y_ago['Precio']
-        if price_5y_ago != 0 and len(df) > 1:
-            n_years = (df.iloc[-1]['Fecha'] - row_5y_ago['Fecha']).days / 365.25
-            if n_years > 0:
-                growth_5y_avg = ((price_now / price_5y_ago) ** (1/n_years) - 1) * 100
-            else:
-                growth_5y_avg = None
-        else:
-            growth_5y_avg = None
+        candlestick_data = HistorySeries.coerce(hist_data).to_candles()
 
     context = {
         'symbol': symbol,
         'details': details,
         'sector': sector,  # Agregar el sector al contexto
-        'df': df,
         'line_data': line_data,
         'candlestick_data': candlestick_data,
         'growth_last_year': growth_last_year,
         'growth_5y_avg': growth_5y_avg,
+        'trailing_returns': trailing_returns,
+        'rolling_data': rolling_data,
     }
-    return render(request, 'searchFund/fund_details.html', context)
\ No newline at end of file
+    return await sync_to_async(render)(request, 'searchFund/fund_details.html', context)
+
+def suggest_view(request):
+    """
+    Sugerencias para el buscador mientras se escribe, servidas desde el índice en memoria
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', settings.AUTOCOMPLETE_MAX_RESULTS)), 25)
+    except ValueError:
+        limit = settings.AUTOCOMPLETE_MAX_RESULTS
+    return JsonResponse({
+        'query': query,
+        'suggestions': autocomplete.suggest(query, limit) if query else [],
+    })
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from datetime import time
 import os
 from dotenv import load_dotenv
 
@@ -38,12 +39,14 @@ INSTALLED_APPS = [
     #'suggestedFund.apps.SuggestedfundConfig',
     #'graphicFund.apps.GraphicfundConfig',
     'compareFund.apps.ComparefundConfig',
+    'apiControl.apps.ApicontrolConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
@@ -54,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apiControl.middleware.TickerSnapshotMiddleware',
 ]
 
 ROOT_URLCONF = 'stockdata.urls'
@@ -98,6 +102,21 @@ DATABASES = {
 }
 
 
+# Caché
+# 'default' vive en memoria de cada proceso; 'api' es compartida por todos los workers a través de Postgres
+# (crear la tabla con: python manage.py createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'api_cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -144,4 +163,97 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # API Keys
 FMP_API_KEY = os.getenv('FMP_API_KEY')
 EODHD_API_KEY = os.getenv('EODHD_API_KEY')
-ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY')
\ No newline at end of file
+ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY')
+
+# Almacén local de precios: segundos durante los que una serie se sirve sin pedir barras nuevas
+PRICE_STORE_REFRESH_SECONDS = 15 * 60
+
+# Instantáneas de 'info' de yfinance compartidas entre peticiones (segundos, 0 para desactivar)
+TICKER_INFO_TTL = 10 * 60
+TICKER_INFO_MAX_ENTRIES = 2000
+
+# Caché de resultados de perform_api_call
+API_CACHE_ALIAS = 'api'
+API_CACHE_L1_MAX_BYTES = 64 * 1024 * 1024
+# TTL en segundos por campo (o por acción si no hay campo); 'market_close' caduca en el próximo cierre
+API_CACHE_TTLS = {
+    'search': 15 * 60,
+    'marketCap': 24 * 60 * 60,
+    'categorySector': 7 * 24 * 60 * 60,
+    'historicalProfit': 'market_close',
+    'annualReturns': 'market_close',
+    'anualVolatility': 'market_close',
+}
+API_CACHE_MARKET_TZ = 'America/New_York'
+API_CACHE_MARKET_CLOSE = time(16, 30)
+# Refresco anticipado probabilístico (1.0 = XFetch estándar; mayor = se renueva antes)
+API_CACHE_EARLY_REFRESH_BETA = 1.0
+# Tiempo máximo que un worker espera a que otro termine la misma llamada al proveedor
+API_CACHE_LEASE_SECONDS = 10
+
+# Llamadas concurrentes a proveedores: tamaño del pool compartido y límite por comparación (segundos).
+# Las llamadas que superan el límite no se interrumpen y retienen su hilo hasta su propio
+# tiempo de espera (HTTP_READ_TIMEOUT), así que el pool cubre las comparaciones simultáneas
+# esperadas por los fondos de cada una con ese margen
+API_MAX_WORKERS = 16
+COMPARE_DEADLINE_SECONDS = 20
+
+# Cliente HTTP de los proveedores: tiempos de espera (segundos) y conexiones del cliente asíncrono
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 10
+ASYNC_HTTP_MAX_CONNECTIONS = 50
+ASYNC_HTTP_MAX_KEEPALIVE = 20
+
+# Sesiones HTTP por proveedor: tamaño del pool y reintentos (429/5xx) con espera exponencial
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 16
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_BACKOFF_MAX = 8
+
+# Búsqueda por nombre: resultados por página (solo se completan los de la página pedida)
+# y bolsas preferidas al ordenar los resultados de EODHD
+SEARCH_PAGE_SIZE = 5
+SEARCH_PREFERRED_EXCHANGES = ['US', 'NYSE', 'NASDAQ', 'NYSE ARCA', 'AMEX', 'BATS']
+# Plazo común (segundos) para completar detalles, sectores y recomendados de una página
+SEARCH_ENRICH_DEADLINE_SECONDS = 8
+
+# Catálogo local de símbolos (python manage.py sync_catalog, programado con cron)
+CATALOG_EXCHANGES = ['US']
+CATALOG_REFRESH_SECONDS = 24 * 60 * 60
+CATALOG_BATCH_SIZE = 2000
+CATALOG_SEARCH_LIMIT = 50
+
+# Autocompletado del buscador (índice en memoria construido desde el catálogo)
+AUTOCOMPLETE_MAX_RESULTS = 8
+AUTOCOMPLETE_REFRESH_SECONDS = 15 * 60
+
+# Validación de símbolos: filtro de Bloom sobre el catálogo y caché de comprobaciones (segundos)
+SYMBOL_FILTER_ERROR_RATE = 0.01
+SYMBOL_FILTER_REFRESH_SECONDS = 15 * 60
+SYMBOL_NEGATIVE_TTL = 6 * 60 * 60
+SYMBOL_POSITIVE_TTL = 24 * 60 * 60
+SYMBOL_CHECKED_MAX_ENTRIES = 10000
+
+# Métricas de riesgo (apiControl.risk): ventana en años, tipo libre de riesgo anual
+# para Sharpe/Sortino y nivel de confianza del VaR diario
+RISK_LOOKBACK_YEARS = 3
+RISK_FREE_RATE = 0.02
+RISK_VAR_CONFIDENCE = 0.95
+
+# Ventana (en barras) de las estadísticas móviles que se guardan por símbolo
+ROLLING_WINDOW = 252
+
+# Comparación de varios fondos: máximo de símbolos por petición y días que se arrastra
+# el último cierre en el panel alineado (festivos de cada bolsa)
+COMPARE_MAX_FUNDS = 30
+PANEL_FFILL_MAX_DAYS = 7
+
+# Matrices de correlación/covarianza (apiControl.correlation): vida en la caché compartida
+# del estado incremental por conjunto de símbolos y rango de fechas (segundos)
+CORRELATION_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Fondos similares (apiControl.similarity): vecinos guardados por fondo al construir el índice
+SIMILARITY_NEIGHBOURS = 10
+# Históricos del catálogo que build_similarity descarga a la vez antes de construir el índice
+SIMILARITY_BACKFILL_BATCH = 50
@@ -23,6 +23,7 @@ from django.conf.urls.static import static
 urlpatterns = [
     path("searchFund/", include("searchFund.urls")),
     path("compareFund/", include("compareFund.urls")),
+    path("apiControl/", include("apiControl.urls")),
     #path("graphicFund/", include("graphicFund.urls")),
     #path("suggestedFund/", include("suggestedFund.urls")),
     path('admin/', admin.site.urls),